@@ -0,0 +1,219 @@
+"""
+Animated GIF and WebP output for video2video and video2video_color.
+
+Consecutive ASCII frames differ only where characters changed, so every frame after the first
+stores just the box of pixels that changed since the previous frame (the scripts take it from
+the char-index grid difference, see DeltaRenderer.changed) drawn over the previous frame, and
+frames with no change only lengthen the duration of the frame before them. All frames share
+one fixed 256-color palette derived from the background and glyph colors: a grayscale video
+is the background blended with the ink at every coverage level, so each pixel maps to its
+palette entry through a 256-entry table, and a color video uses a color cube with extra grays
+through a 32x32x32 table. Quantizing a frame is one table lookup, with no per-frame palette
+search.
+
+GIF frames are encoded with Pillow's GIF encoder and written after one global color table;
+WebP frames are encoded losslessly with the palette colors, which libwebp stores as an indexed
+image, and wrapped in the chunks of an animated WebP file.
+"""
+import io
+import os
+import struct
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+ANIMATION_EXTENSIONS = (".gif", ".webp")
+# 彩色调色板：6x6x6 颜色立方体加上立方体之外的灰阶，共 256 色
+_CUBE_LEVELS = np.arange(6) * 51
+_EXTRA_GRAYS = np.rint(np.linspace(0, 255, 42)[1:-1]).astype(np.uint8)
+# 颜色查找表每个通道取高 5 位
+_COLOR_BITS = 5
+# WebP 帧数据以外的块（元数据）不拷贝进动画帧
+_WEBP_FRAME_CHUNKS = (b"ALPH", b"VP8 ", b"VP8L")
+
+
+def blend_palette(bg_color, ink_color):
+    """
+    256 RGB entries from bg_color to ink_color: every color a glyph of one ink color blends to.
+    """
+    weights = np.arange(256, dtype=np.float64)[:, np.newaxis] / 255
+    bg_color, ink_color = np.array(bg_color, dtype=np.float64), np.array(ink_color, dtype=np.float64)
+    return np.rint(bg_color + (ink_color - bg_color) * weights).astype(np.uint8)
+
+
+def color_palette(bg_color):
+    """
+    256 RGB entries for color video: a 6x6x6 color cube, 40 more grays and the background,
+    which is entry 0 like in blend_palette.
+    """
+    red, green, blue = np.meshgrid(_CUBE_LEVELS, _CUBE_LEVELS, _CUBE_LEVELS, indexing="ij")
+    cube = np.stack([red.ravel(), green.ravel(), blue.ravel()], axis=1)
+    palette = np.concatenate([cube, np.repeat(_EXTRA_GRAYS[:, np.newaxis], 3, axis=1)]).astype(np.uint8)
+    bg_color = np.array(bg_color, dtype=np.uint8)
+    matches = np.flatnonzero((palette == bg_color).all(axis=1))
+    # 背景必须能精确表示，否则每帧的空白处都会带噪点；不在立方体中时替换最后一个灰阶
+    index = matches[0] if len(matches) else len(palette) - 1
+    palette[index] = palette[0]
+    palette[0] = bg_color
+    return palette
+
+
+def nearest_entries(colors, palette):
+    """
+    Index of the nearest palette entry of every RGB color (squared distance).
+    """
+    colors, palette = colors.astype(np.float32), palette.astype(np.float32)
+    distances = (palette ** 2).sum(axis=1) - 2 * colors @ palette.T
+    return distances.argmin(axis=1).astype(np.uint8)
+
+
+def union_box(box, other):
+    """
+    Smallest (left, top, right, bottom) box holding both boxes; either may be None.
+    """
+    if box is None or other is None:
+        return other if box is None else box
+    return min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])
+
+
+class AnimationWriter:
+    """
+    Stream frames of one size (2-D gray or BGR arrays, as for cv2.VideoWriter) into an animated
+    GIF or WebP with a fixed palette. write takes the (left, top, right, bottom) box of pixels
+    that changed since the previous frame, or None for an unchanged frame; the first frame is
+    always stored whole. loop is the number of repetitions, 0 repeats forever.
+    """
+
+    def __init__(self, path, size, fps, palette, loop=0, webp_method=0):
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in ANIMATION_EXTENSIONS:
+            raise ValueError("Unknown animation format {}".format(path))
+        self.width, self.height = size
+        self.frame_ms = 1000 / fps
+        self.palette = np.asarray(palette, dtype=np.uint8)
+        if self.palette.shape != (256, 3):
+            raise ValueError("Palette must have 256 RGB entries")
+        self.webp_method = webp_method
+        self.lut = None
+        self.key_table = None
+        self.pending = None
+        self.frames = 0
+        self.stored_frames = 0
+        self.stored_pixels = 0
+        self.bytes_written = 0
+        self.file = open(path, "wb")
+        if self.format == ".gif":
+            # 全局颜色表：256 色，之后每帧都不带局部颜色表
+            self._write(b"GIF89a" + struct.pack("<HHBBB", self.width, self.height, 0xF7, 0, 0)
+                        + self.palette.tobytes())
+            self._write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+        else:
+            # RIFF 长度在 close 时回填
+            self._write(b"RIFF\x00\x00\x00\x00WEBP")
+            self._write_chunk(b"VP8X", struct.pack("<B3x", 0x02) + _uint24(self.width - 1) + _uint24(self.height - 1))
+            self._write_chunk(b"ANIM", bytes(self.palette[0][::-1]) + b"\xff" + struct.pack("<H", loop))
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def _write_chunk(self, fourcc, payload):
+        self._write(fourcc + struct.pack("<I", len(payload)) + payload + b"\x00" * (len(payload) % 2))
+
+    def quantize(self, region):
+        """
+        Palette indices of a gray or BGR region, through a lookup table built on first use.
+        """
+        if region.ndim == 2:
+            if self.lut is None:
+                self.lut = nearest_entries(np.repeat(np.arange(256)[:, np.newaxis], 3, axis=1), self.palette)
+            return cv2.LUT(region, self.lut)
+        if self.lut is None:
+            levels = (np.arange(1 << _COLOR_BITS) << (8 - _COLOR_BITS)) + (1 << (7 - _COLOR_BITS))
+            red, green, blue = np.meshgrid(levels, levels, levels, indexing="ij")
+            self.lut = nearest_entries(np.stack([red.ravel(), green.ravel(), blue.ravel()], axis=1), self.palette)
+            # 每个通道的高 5 位移到查找表下标中各自的位置，三个通道相加即为下标
+            high = np.arange(256) >> (8 - _COLOR_BITS)
+            self.key_table = np.stack([high, high << _COLOR_BITS, high << (2 * _COLOR_BITS)], axis=1)[np.newaxis]
+            self.key_table = self.key_table.astype(np.uint16)
+            # 调色板中的颜色映射到自身，而不是所在格子中心最近的条目（黑色会变成灰阶 6）；
+            # 同一格子中有几个条目时下标小的优先，背景（第 0 项）总能精确表示
+            keys = self.key_table[0, self.palette, [2, 1, 0]].sum(axis=1)
+            for index in reversed(range(len(self.palette))):
+                self.lut[keys[index]] = index
+        key = cv2.transform(cv2.LUT(region, self.key_table), np.ones((1, 3), dtype=np.float32))
+        return np.take(self.lut, key)
+
+    def write(self, frame, box=None):
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError("Frame size {} does not match {}".format(frame.shape[:2], (self.height, self.width)))
+        if self.pending is None:
+            box = (0, 0, self.width, self.height)
+        elif box is None:
+            # 没有变化：上一帧多显示一帧的时间
+            self.frames += 1
+            return
+        else:
+            self._flush()
+        left, top, right, bottom = box
+        if self.format == ".webp":
+            # WebP 动画帧的偏移只能是偶数
+            left, top = left - left % 2, top - top % 2
+        self.pending = (self.quantize(frame[top:bottom, left:right]), left, top, self.frames)
+        self.frames += 1
+
+    def _flush(self):
+        indices, left, top, start = self.pending
+        # 时长按累计时间取整（GIF 以 10 ms 为单位），合并帧和取整的误差不会累积
+        unit = 10 if self.format == ".gif" else 1
+        duration = (round(self.frames * self.frame_ms / unit) - round(start * self.frame_ms / unit)) * unit
+        height, width = indices.shape
+        if self.format == ".gif":
+            chunks = GifImagePlugin.getdata(Image.fromarray(indices), offset=(left, top), duration=duration,
+                                            disposal=1)
+            self._write(b"".join(chunks))
+            # 旧版 Pillow 把数据收集在类属性列表中，写出后清空，下一帧才不会重复写入
+            del chunks[:]
+        else:
+            buffer = io.BytesIO()
+            Image.fromarray(self.palette[indices]).save(buffer, format="WEBP", lossless=True,
+                                                        method=self.webp_method)
+            data = buffer.getvalue()
+            frame_data = b""
+            offset = 12
+            while offset + 8 <= len(data):
+                fourcc, length = data[offset:offset + 4], struct.unpack_from("<I", data, offset + 4)[0]
+                end = offset + 8 + length + length % 2
+                if fourcc in _WEBP_FRAME_CHUNKS:
+                    frame_data += data[offset:end]
+                offset = end
+            # 帧标志 0x02：不与上一帧混合，直接覆盖该区域
+            header = (_uint24(left // 2) + _uint24(top // 2) + _uint24(width - 1) + _uint24(height - 1)
+                      + _uint24(duration) + b"\x02")
+            self._write_chunk(b"ANMF", header + frame_data)
+        self.stored_frames += 1
+        self.stored_pixels += width * height
+        self.pending = None
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.pending is not None:
+            self._flush()
+        if self.format == ".gif":
+            self._write(b";")
+        else:
+            self.file.seek(4)
+            self.file.write(struct.pack("<I", self.bytes_written - 8))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _uint24(value):
+    return struct.pack("<I", value)[:3]
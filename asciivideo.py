@@ -0,0 +1,277 @@
+"""
+Compact container for ASCII video (.asv): the per-frame char-index grid (and the per-cell
+colors for color video) instead of rendered pixels.
+
+Layout:
+    header   b"ASCV", version (uint16), JSON length (uint32), JSON metadata (ramp, font, grid, fps, ...)
+    records  one per frame: uint8 char indices (num_rows * num_cols), then uint8 colors
+             (num_rows * num_cols * 3) for color video, optionally zlib or RLE compressed.
+             Uncompressed records all have the same stride.
+    index    (offset uint64, length uint32) per frame
+    footer   index offset (uint64), frame count (uint64), b"ASCV"
+
+Convert a container back to a video, or play it in the terminal:
+
+    python asciivideo.py --input data/output.asv --output data/output.avi
+    python asciivideo.py --input data/output.asv --play
+"""
+import argparse
+import json
+import mmap
+import struct
+import zlib
+
+import cv2
+import numpy as np
+from PIL import ImageFont, ImageOps
+
+from renderer import GlyphAtlas
+from terminal import ansi_color_rows, play_capture
+
+MAGIC = b"ASCV"
+VERSION = 1
+CONTAINER_EXTENSION = ".asv"
+COMPRESSIONS = ("none", "zlib", "rle")
+_HEADER = struct.Struct("<4sHI")
+_FOOTER = struct.Struct("<QQ4s")
+_INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4")])
+
+
+def get_args():
+    parser = argparse.ArgumentParser("ASCII video container")
+    parser.add_argument("--input", type=str, default="data/output.asv", help="Path to input container")
+    parser.add_argument("--output", type=str, default="data/output.avi", help="Path to output video")
+    parser.add_argument("--fps", type=int, default=0, help="Frames per second (0 keeps the stored fps)")
+    parser.add_argument("--play", action="store_true", help="Play in the terminal instead of writing a video")
+    return parser.parse_args()
+
+
+def rle_encode(data):
+    """
+    Byte run-length encoding: (count, value) pairs with runs split at 255.
+    """
+    if not len(data):
+        return b""
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(data)) + 1))
+    lengths = np.diff(np.append(starts, len(data)))
+    pieces = (lengths + 254) // 255
+    counts = np.full(pieces.sum(), 255, dtype=np.uint8)
+    counts[np.cumsum(pieces) - 1] = lengths - 255 * (pieces - 1)
+    pairs = np.empty((len(counts), 2), dtype=np.uint8)
+    pairs[:, 0] = counts
+    pairs[:, 1] = np.repeat(data[starts], pieces)
+    return pairs.tobytes()
+
+
+def rle_decode(data):
+    pairs = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2)
+    return np.repeat(pairs[:, 1], pairs[:, 0])
+
+
+class AsciiVideoWriter:
+    """
+    Append frames (char-index grid, optional color grid) to a container file.
+    """
+
+    def __init__(self, path, char_list, num_rows, num_cols, fps, color=False, compression="zlib", **metadata):
+        if compression not in COMPRESSIONS:
+            raise ValueError("Unknown compression {}".format(compression))
+        self.num_rows, self.num_cols = num_rows, num_cols
+        self.color = color
+        self.compression = compression
+        self.records = []
+        self.bytes_written = 0
+        header = dict(metadata, char_list=char_list, num_rows=num_rows, num_cols=num_cols, fps=fps,
+                      color=color, compression=compression)
+        header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self.file = open(path, "wb")
+        self._write(_HEADER.pack(MAGIC, VERSION, len(header)) + header)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def write(self, char_indices, colors=None):
+        if char_indices.shape != (self.num_rows, self.num_cols):
+            raise ValueError("Frame grid {} does not match {}".format(char_indices.shape, (self.num_rows, self.num_cols)))
+        record = np.ascontiguousarray(char_indices, dtype=np.uint8).reshape(-1)
+        if self.color:
+            record = np.concatenate((record, np.clip(colors, 0, 255).astype(np.uint8).reshape(-1)))
+        if self.compression == "zlib":
+            data = zlib.compress(record.tobytes(), 1)
+        elif self.compression == "rle":
+            data = rle_encode(record)
+        else:
+            data = record.tobytes()
+        self.records.append((self.bytes_written, len(data)))
+        self._write(data)
+
+    def append(self, reader):
+        """
+        Copy every frame of a reader with the same grid, colors and compression without
+        decoding the records.
+        """
+        header = reader.header
+        if (header["num_rows"], header["num_cols"], header["color"], header["compression"]) != (
+                self.num_rows, self.num_cols, self.color, self.compression):
+            raise ValueError("Container layout does not match")
+        for offset, length in reader.index.tolist():
+            self.records.append((self.bytes_written, length))
+            self._write(reader.map[offset:offset + length])
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.bytes_written
+        self._write(np.array(self.records, dtype=_INDEX_DTYPE).tobytes())
+        self._write(_FOOTER.pack(index_offset, len(self.records), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsciiVideoReader:
+    """
+    Memory-mapped container reader. reader[i] returns (char_indices, colors or None) of frame i
+    in O(1) through the frame index; read()/grab() step through frames like cv2.VideoCapture.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = self.index = None
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._read_layout(path)
+        except Exception:
+            # 截断或损坏的文件：报错前释放索引视图，关闭内存映射和文件
+            self.index = None
+            if self.map is not None:
+                self.map.close()
+            self.file.close()
+            raise
+        self.num_rows, self.num_cols = self.header["num_rows"], self.header["num_cols"]
+        self.position = 0
+
+    def _read_layout(self, path):
+        """
+        Read the header and the frame index, checking that both are complete.
+        """
+        if len(self.map) < _HEADER.size + _FOOTER.size:
+            raise ValueError("{} is truncated".format(path))
+        magic, version, header_length = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not an ASCII video container".format(path))
+        self.header = json.loads(bytes(self.map[_HEADER.size:_HEADER.size + header_length]).decode("utf-8"))
+        index_offset, count, magic = _FOOTER.unpack_from(self.map, len(self.map) - _FOOTER.size)
+        if magic != MAGIC or index_offset + count * _INDEX_DTYPE.itemsize != len(self.map) - _FOOTER.size:
+            raise ValueError("{} has no frame index (incomplete write?)".format(path))
+        self.index = np.frombuffer(self.map, dtype=_INDEX_DTYPE, count=count, offset=index_offset)
+        if count and int((self.index["offset"].astype(np.uint64) + self.index["length"]).max()) > index_offset:
+            raise ValueError("{} has a frame index past its records".format(path))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, index):
+        offset, length = (int(value) for value in self.index[index])
+        compression = self.header["compression"]
+        if compression == "none":
+            record = np.frombuffer(self.map, dtype=np.uint8, count=length, offset=offset)
+        elif compression == "zlib":
+            try:
+                record = np.frombuffer(zlib.decompress(self.map[offset:offset + length]), dtype=np.uint8)
+            except zlib.error as error:
+                raise ValueError("Frame {} is corrupt: {}".format(index, error))
+        else:
+            record = rle_decode(self.map[offset:offset + length])
+        cells = self.num_rows * self.num_cols
+        if len(record) != cells * (4 if self.header["color"] else 1):
+            raise ValueError("Frame {} is corrupt: {} bytes instead of {}".format(
+                index, len(record), cells * (4 if self.header["color"] else 1)))
+        char_indices = record[:cells].reshape(self.num_rows, self.num_cols)
+        colors = record[cells:].reshape(self.num_rows, self.num_cols, 3) if self.header["color"] else None
+        return char_indices, colors
+
+    def read(self):
+        if self.position >= len(self):
+            return False, None
+        self.position += 1
+        return True, self[self.position - 1]
+
+    def grab(self):
+        if self.position >= len(self):
+            return False
+        self.position += 1
+        return True
+
+    def close(self):
+        del self.index
+        self.map.close()
+        self.file.close()
+
+
+def render_video(reader, output_path, fps=0):
+    """
+    Render a container back to a video the same way video2video/video2video_color draw frames
+    (without the original-frame overlay, which the container does not store).
+    """
+    header = reader.header
+    font = ImageFont.truetype(header["font"], size=header["font_size"])
+    atlas = GlyphAtlas(header["char_list"], font, "A")
+    background = header.get("background", "black")
+    char_width, char_height = font.getsize("A")
+    size = (char_width * reader.num_cols, 2 * char_height * reader.num_rows)
+    out = None
+    for index in range(len(reader)):
+        char_indices, colors = reader[index]
+        if colors is None:
+            bg_code = 255 if background == "white" else 0
+            image = atlas.render(char_indices, 255 - bg_code, bg_code)
+            frame = cv2.cvtColor(np.array(image.crop(image.getbbox())), cv2.COLOR_GRAY2BGR)
+        else:
+            # 颜色按 BGR 保存，与 video2video_color 一样直接交给 VideoWriter
+            bg_color = (255, 255, 255) if background == "white" else (0, 0, 0)
+            image = atlas.render_color(char_indices, colors, bg_color, size)
+            frame = np.array(image.crop((ImageOps.invert(image) if background == "white" else image).getbbox()))
+        if out is None:
+            out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"XVID"), fps or header["fps"],
+                                  (frame.shape[1], frame.shape[0]))
+        out.write(frame)
+    if out:
+        out.release()
+
+
+def record_to_text(reader):
+    """
+    Text for terminal playback of one (char_indices, colors) record.
+    """
+    chars_table = np.array(list(reader.header["char_list"]))
+
+    def to_text(record):
+        char_indices, colors = record
+        chars = chars_table[char_indices]
+        if colors is None:
+            return "\n".join("".join(row) for row in chars)
+        if reader.header.get("color_order") == "BGR":
+            colors = colors[:, :, ::-1]
+        return "\n".join(ansi_color_rows(chars, colors))
+
+    return to_text
+
+
+def main():
+    args = get_args()
+    reader = AsciiVideoReader(args.input)
+    if args.play:
+        play_capture(reader, args.fps or reader.header["fps"], record_to_text(reader))
+    else:
+        render_video(reader, args.output, args.fps)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
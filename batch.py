@@ -0,0 +1,130 @@
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+
+import numpy as np
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+# 只有这些扩展名的文件按换行分隔的文件列表读取，其他文件都当作单张图像交给解码器
+LIST_EXTENSIONS = {".txt", ".lst"}
+
+# 每个 worker 进程中只加载一次的字体、字符表等资源
+_worker_state = {}
+
+
+def is_batch_input(input_spec):
+    """
+    A directory, a glob pattern or a newline-delimited .txt/.lst list file means batch mode. An
+    existing file is never a glob, so names like photo[1].png are read as they are.
+    """
+    if os.path.isdir(input_spec):
+        return True
+    if os.path.isfile(input_spec):
+        return os.path.splitext(input_spec)[1].lower() in LIST_EXTENSIONS
+    return glob.has_magic(input_spec)
+
+
+def collect_inputs(input_spec):
+    """
+    Expand a directory, list file or glob pattern into (image paths, root), where root is the
+    directory the output tree mirrors.
+    """
+    if os.path.isdir(input_spec):
+        root = input_spec
+        paths = [os.path.join(dirpath, name)
+                 for dirpath, _, names in os.walk(input_spec) for name in names
+                 if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS]
+    elif os.path.isfile(input_spec):
+        with open(input_spec) as list_file:
+            paths = [line.strip() for line in list_file if line.strip()]
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else "."
+        paths = [os.path.abspath(path) for path in paths]
+    else:
+        paths = [path for path in glob.glob(input_spec, recursive=True) if os.path.isfile(path)]
+        # 通配符之前的部分作为镜像的根目录
+        prefix = []
+        for part in input_spec.split(os.sep):
+            if glob.has_magic(part):
+                break
+            prefix.append(part)
+        root = os.sep.join(prefix) or "."
+    return sorted(paths), root
+
+
+def mirror_path(path, root, output_dir, extension=None):
+    """
+    Output path for path under output_dir, keeping its location relative to root.
+    """
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+    if extension is not None:
+        relative = os.path.splitext(relative)[0] + extension
+    return os.path.join(output_dir, relative)
+
+
+def _init_worker(load, args):
+    _worker_state["resources"] = load(args)
+
+
+def _convert_one(convert, args, input_path, output_path):
+    """
+    Convert one file with the worker's resources, returning (input, output, seconds, error).
+    """
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        convert(input_path, output_path, args, _worker_state["resources"])
+        error = None
+    except Exception:
+        error = traceback.format_exc().rstrip().splitlines()[-1]
+    return input_path, output_path, time.perf_counter() - start, error
+
+
+def _convert_task(task):
+    return _convert_one(*task)
+
+
+def run_batch(input_spec, output_dir, load, convert, args, workers=None, extension=None):
+    """
+    Convert every image named by input_spec into a mirrored path under output_dir.
+
+    load(args) builds the per-process resources (font, ramp, atlas, lookup table) and runs once
+    in this process, so invalid settings fail before any worker starts, then once per worker; convert(input_path, output_path, args, resources) handles one file. A failing
+    file is reported and skipped. With workers == 0 everything runs in this process, with
+    None one worker per CPU is used. Returns the list of (input, output, seconds, error).
+    """
+    paths, root = collect_inputs(input_spec)
+    tasks = [(convert, args, path, mirror_path(path, root, output_dir, extension)) for path in paths]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    start = time.perf_counter()
+    # 先在主进程加载一次：初始化函数出错时进程池会不停地重启 worker，永远不会结束
+    _init_worker(load, args)
+    if workers > 0:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(load, args)) as pool:
+            results = list(pool.imap_unordered(_convert_task, tasks))
+    else:
+        results = [_convert_task(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+
+    report_batch(results, elapsed)
+    return results
+
+
+def report_batch(results, elapsed):
+    """
+    Print per-file failures, throughput and latency percentiles of a batch.
+    """
+    failures = [result for result in results if result[3] is not None]
+    for input_path, _, _, error in failures:
+        print("Failed: {}: {}".format(input_path, error))
+    converted = len(results) - len(failures)
+    print("Converted {}/{} images in {:.2f} s ({:.2f} images/s)".format(
+        converted, len(results), elapsed, converted / elapsed if elapsed else 0))
+    if results:
+        latencies = np.array([result[2] for result in results]) * 1000
+        print("Per-file latency: mean {:.1f} ms, p50 {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms".format(
+            latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 95), latencies.max()))
@@ -0,0 +1,168 @@
+"""
+Animated GIF/WebP output of video2video and video2video_color against the XVID (.mp4) path.
+Two synthetic clips are converted: "panning", a gradient shifted every frame so nearly every
+cell changes, and "static", a fixed gradient with a small moving disc, where only a few cells
+change. For every converter and clip the median conversion time and output size of .mp4, .gif
+and .webp are reported, with the size of a GIF storing every frame whole for comparison. Every
+decoded GIF and WebP frame is checked against the full render of that frame in the palette;
+the script exits with status 1 on a mismatch. Run from the repository root:
+
+    python benchmarks/animation.py --width 640 --height 360 --frames 60 --num_cols 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video2video
+import video2video_color
+from animation import AnimationWriter, blend_palette, color_palette
+from renderer import GlyphAtlas
+from suite import script_args, time_call
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Animated output benchmark")
+    parser.add_argument("--width", type=int, default=640, help="Width of the synthetic clips")
+    parser.add_argument("--height", type=int, default=360, help="Height of the synthetic clips")
+    parser.add_argument("--frames", type=int, default=60, help="Number of frames in each clip")
+    parser.add_argument("--fps", type=int, default=25, help="Frames per second of the clips")
+    parser.add_argument("--num_cols", type=int, default=100, help="Number of characters for output width")
+    parser.add_argument("--overlay_ratio", type=float, default=0.2,
+                        help="Overlay width ratio (the overlay changes every frame, so it is always stored)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions, the median is kept")
+    return parser.parse_args()
+
+
+def static_frame(width, height, index):
+    """
+    One frame of the static clip: the first synthetic frame with a small dark disc moving over it.
+    """
+    frame = make_frame(width, height)
+    center = (int(width * (0.5 + 0.3 * np.sin(index / 6))), int(height * (0.5 + 0.3 * np.cos(index / 4))))
+    cv2.circle(frame, center, height // 12, (0, 0, 0), -1)
+    return frame
+
+
+def write_clip(path, frames, fps):
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"XVID"), fps, (frames[0].shape[1], frames[0].shape[0]))
+    for frame in frames:
+        out.write(frame)
+    out.release()
+
+
+def read_clip(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def convert(module, args, clip, output_path):
+    """
+    Convert clip with a converter's own defaults into output_path.
+    """
+    if module is video2video:
+        char_list, font, bg_code, atlas, lut = video2video.load_resources(args)
+        video2video.process_video(clip, output_path, char_list, font, args.num_cols, args.scale, args.fps,
+                                  args.overlay_ratio, bg_code, atlas, lut, args.dither)
+    else:
+        char_list, font, bg_color, atlas, lut = video2video_color.load_resources(args)
+        video2video_color.process_video(clip, output_path, args.num_cols, char_list, font, bg_color, args.background,
+                                        args.overlay_ratio, args.fps, atlas, lut, args.dither)
+
+
+def full_renders(module, args, frames):
+    """
+    (frames, palette) of every frame rendered whole, as the animation path draws it.
+    """
+    if module is video2video:
+        char_list, font, bg_code, _, lut = video2video.load_resources(args)
+        atlas = GlyphAtlas(char_list, font, "A")
+        renders = []
+        for frame in frames:
+            char_idx = video2video.frame_char_indices(frame, char_list, args.num_cols, lut, args.dither)
+            image = np.array(atlas.render(char_idx, 255 - bg_code, bg_code))
+            if args.overlay_ratio:
+                height, width = image.shape
+                overlay = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                                     (int(width * args.overlay_ratio), int(height * args.overlay_ratio)))
+                image[height - overlay.shape[0]:, width - overlay.shape[1]:] = overlay
+            renders.append(image)
+        return renders, blend_palette((bg_code,) * 3, (255 - bg_code,) * 3)
+    char_list, font, bg_color, _, lut = video2video_color.load_resources(args)
+    processor = video2video_color.FrameProcessor(args.num_cols, char_list, font, bg_color, args.background,
+                                                 args.overlay_ratio, GlyphAtlas(char_list, font, "A"), lut,
+                                                 args.dither)
+    return [processor(frame).copy() for frame in frames], color_palette(bg_color[::-1])
+
+
+def check_output(path, renders, writer):
+    """
+    Whether every decoded frame of path equals the matching full render in the palette.
+    """
+    expected = []
+    for render in renders:
+        render = writer.palette[writer.quantize(render)]
+        # 没有变化的帧合并到上一帧的时长里，不单独解码出来
+        if not expected or (render != expected[-1]).any():
+            expected.append(render)
+    with Image.open(path) as image:
+        decoded = [np.array(frame.convert("RGB")) for frame in ImageSequence.Iterator(image)]
+    return len(decoded) == len(expected) and all((frame == render).all() for frame, render in zip(decoded, expected))
+
+
+def main():
+    args = get_args()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clips = {
+            "panning": [make_frame(args.width, args.height, index) for index in range(args.frames)],
+            "static": [static_frame(args.width, args.height, index) for index in range(args.frames)],
+        }
+        print("{}x{}, {} frames at {} fps, num_cols {}, overlay_ratio {}".format(
+            args.width, args.height, args.frames, args.fps, args.num_cols, args.overlay_ratio))
+        print("{:<18} {:<8} {:<6} {:>9} {:>11} {:>11} {:>10}".format(
+            "converter", "clip", "output", "ms", "KB", "whole KB", "identical"))
+        for name, frames in clips.items():
+            clip = os.path.join(tmp_dir, name + ".avi")
+            write_clip(clip, frames, args.fps)
+            # 比较的是解码后的帧，与转换器读到的帧一致
+            frames = read_clip(clip)
+            for module in (video2video, video2video_color):
+                script = script_args(module, ["--num_cols", str(args.num_cols), "--fps", str(args.fps),
+                                              "--overlay_ratio", str(args.overlay_ratio)])
+                renders, palette = full_renders(module, script, frames)
+                for extension in (".mp4", ".gif", ".webp"):
+                    output_path = os.path.join(tmp_dir, "{}_{}{}".format(module.__name__, name, extension))
+                    seconds = np.median(time_call(lambda: convert(module, script, clip, output_path), args.repeat))
+                    size = os.path.getsize(output_path) / 1024
+                    whole, same = "", ""
+                    if extension != ".mp4":
+                        # 同样的调色板，但每帧都完整保存
+                        whole_path = os.path.join(tmp_dir, "whole" + extension)
+                        with AnimationWriter(whole_path, renders[0].shape[1::-1], args.fps, palette) as writer:
+                            for render in renders:
+                                writer.write(render, (0, 0, render.shape[1], render.shape[0]))
+                        whole = "{:.1f}".format(os.path.getsize(whole_path) / 1024)
+                        same = check_output(output_path, renders, writer)
+                        ok = ok and same
+                    print("{:<18} {:<8} {:<6} {:>9.1f} {:>11.1f} {:>11} {:>10}".format(
+                        module.__name__, name, extension, seconds * 1e3, size, whole, str(same)))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
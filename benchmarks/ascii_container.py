@@ -0,0 +1,60 @@
+"""
+File size and write throughput of the .asv ASCII video container against the rendered XVID
+output, for video2video and video2video_color, on a synthetic clip. Run from the repository root:
+
+    python benchmarks/ascii_container.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video2video
+import video2video_color
+from asciivideo import COMPRESSIONS
+from renderer import GlyphAtlas
+from utils import build_char_lut
+from video_pipeline import make_clip
+
+
+def get_args():
+    parser = argparse.ArgumentParser("ASCII video container benchmark")
+    parser.add_argument("--width", type=int, default=1280, help="Width of the synthetic clip")
+    parser.add_argument("--height", type=int, default=720, help="Height of the synthetic clip")
+    parser.add_argument("--frames", type=int, default=60, help="Number of frames in the synthetic clip")
+    parser.add_argument("--num_cols", type=int, default=160, help="Number of characters for output width")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clip = os.path.join(tmp_dir, "clip.avi")
+        make_clip(clip, args.width, args.height, args.frames)
+        font = video2video.initialize_font(1)
+        char_list = video2video.get_char_list("complex")
+        atlas = GlyphAtlas(char_list, font, "A")
+        lut = build_char_lut(len(char_list))
+
+        print("{:<18} {:<10} {:>12} {:>8}".format("converter", "output", "bytes", "fps"))
+        for name in ("video2video", "video2video_color"):
+            for output_format in ["xvid"] + ["asv-" + compression for compression in COMPRESSIONS]:
+                extension = ".avi" if output_format == "xvid" else ".asv"
+                compression = output_format[4:] or "zlib"
+                output = os.path.join(tmp_dir, name + "_" + output_format + extension)
+                start = time.perf_counter()
+                if name == "video2video":
+                    video2video.process_video(clip, output, char_list, font, args.num_cols, 1, 0, 0.2, 0,
+                                              atlas, lut, False, 0, compression)
+                else:
+                    video2video_color.process_video(clip, output, args.num_cols, char_list, font, (0, 0, 0), "black",
+                                                    0.2, 0, atlas, lut, False, 0, compression)
+                fps = args.frames / (time.perf_counter() - start)
+                print("{:<18} {:<10} {:>12} {:>8.1f}".format(name, output_format, os.path.getsize(output), fps))
+
+
+if __name__ == "__main__":
+    main()
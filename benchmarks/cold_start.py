@@ -0,0 +1,120 @@
+"""
+Cold-start cost of every entry point, each run in a fresh interpreter: the cumulative import time
+of the script's module (python -X importtime), the wall time of --help and the wall time of a
+small conversion (a 320x240 image, or a 3-frame clip for the video converters). Results can be
+saved and compared against a saved baseline; the script exits with status 1 when a median wall
+time got slower than the baseline by more than the threshold. Run from the repository root:
+
+    python benchmarks/cold_start.py --output before.json
+    python benchmarks/cold_start.py --baseline before.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from video_pipeline import make_clip, make_frame
+
+ENTRY_POINTS = ("img2txt", "img2img", "img2img_color", "video2video", "video2video_color")
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Cold-start benchmark")
+    parser.add_argument("--entry_points", type=str, nargs="+", default=list(ENTRY_POINTS), choices=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=7, help="Fresh processes per measurement, the median is kept")
+    parser.add_argument("--output", type=str, default="", help="Path of the JSON results")
+    parser.add_argument("--baseline", type=str, default="", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown of a median wall time reported as a regression")
+    return parser.parse_args()
+
+
+def import_micros(module):
+    """
+    Cumulative import time of module in microseconds, from the last line of -X importtime.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-W", "ignore", "-c", "import " + module],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    for line in reversed(result.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise ValueError("No import time reported for {}".format(module))
+
+
+def wall_seconds(argv):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-W", "ignore"] + argv, cwd=ROOT, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def convert_argv(entry_point, tmp_dir):
+    if entry_point.startswith("video"):
+        return ["--input", os.path.join(tmp_dir, "input.avi"), "--output", os.path.join(tmp_dir, "output.avi"),
+                "--num_cols", "40"]
+    extension = ".txt" if entry_point == "img2txt" else ".png"
+    return ["--input", os.path.join(tmp_dir, "input.png"), "--output", os.path.join(tmp_dir, "output" + extension),
+            "--num_cols", "80"]
+
+
+def measure(entry_point, tmp_dir, repeat):
+    script = entry_point + ".py"
+    return {
+        "entry_point": entry_point,
+        "import_ms": statistics.median(import_micros(entry_point) for _ in range(repeat)) / 1e3,
+        "help_seconds": statistics.median(wall_seconds([script, "--help"]) for _ in range(repeat)),
+        "convert_seconds": statistics.median(wall_seconds([script] + convert_argv(entry_point, tmp_dir))
+                                             for _ in range(repeat)),
+    }
+
+
+def main():
+    args = get_args()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = {result["entry_point"]: result for result in json.load(baseline_file)["results"]}
+    results = []
+    regressions = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cv2.imwrite(os.path.join(tmp_dir, "input.png"), make_frame(320, 240))
+        make_clip(os.path.join(tmp_dir, "input.avi"), 320, 240, 3)
+        print("{:<18} {:>10} {:>10} {:>11}{}".format("entry point", "import ms", "--help ms", "convert ms",
+                                                     "   baseline (import / --help / convert)" if baseline else ""))
+        for entry_point in args.entry_points:
+            result = measure(entry_point, tmp_dir, args.repeat)
+            results.append(result)
+            line = "{:<18} {:>10.1f} {:>10.1f} {:>11.1f}".format(
+                entry_point, result["import_ms"], result["help_seconds"] * 1e3, result["convert_seconds"] * 1e3)
+            if entry_point in baseline:
+                before = baseline[entry_point]
+                line += "   {:.1f} / {:.1f} / {:.1f}".format(before["import_ms"], before["help_seconds"] * 1e3,
+                                                            before["convert_seconds"] * 1e3)
+                slower = [key for key in ("help_seconds", "convert_seconds")
+                          if result[key] > before[key] * (1 + args.threshold)]
+                if slower:
+                    line += "  REGRESSION ({})".format(", ".join(slower))
+                    regressions += 1
+            print(line)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, output_file,
+                      indent=2)
+        print("Results saved to {}".format(args.output))
+    if baseline:
+        print("{} regressions beyond {:.0%}".format(regressions, args.threshold))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Size and generation time of img2txt's colored outputs (--format ansi/ansi256/html) against a
+naive version that emits one escape (or <span>) per cell and writes row by row. Both get the same
+char grid and the same quantized colors; the time covers building the text and writing the file.
+Run from the repository root:
+
+    python benchmarks/color_text.py --num_cols 150 300
+"""
+import argparse
+import glob
+import html
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+import img2txt
+from colortext import COLOR_FORMATS, color_text, quantize_colors, rgb_to_xterm256
+from converter import Converter, cell_colors
+from suite import time_call
+from terminal import RESET
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Colored text output benchmark")
+    parser.add_argument("--images", type=str, nargs="+", default=sorted(glob.glob("demo/*input*.jpg") +
+                                                                        glob.glob("demo/demo_image_*.png")),
+                        help="Images to convert")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[150, 300], help="Sizes to convert")
+    parser.add_argument("--color_step", type=int, default=8, help="Quantization of 24-bit colors")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions, the fastest is kept")
+    return parser.parse_args()
+
+
+def naive_save(chars, colors, color_format, step, output_path):
+    """
+    One escape or <span> per cell, rows concatenated and written one at a time.
+    """
+    if color_format == "ansi256":
+        codes = rgb_to_xterm256(colors).tolist()
+    else:
+        codes = quantize_colors(colors, step).tolist()
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        if color_format == "html":
+            output_file.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><style>body{background:#000}"
+                              "pre{font-family:monospace;line-height:1}</style></head><body><pre>")
+        for row_chars, row_codes in zip(chars.tolist(), codes):
+            line = ""
+            for char, code in zip(row_chars, row_codes):
+                if color_format == "html":
+                    line += '<span style="color:#{:02x}{:02x}{:02x}">{}</span>'.format(*code, html.escape(char))
+                elif color_format == "ansi256":
+                    line += "\x1b[38;5;{}m{}".format(code, char)
+                else:
+                    line += "\x1b[38;2;{};{};{}m{}".format(*code, char)
+            output_file.write(line + "\n")
+        output_file.write("</pre></body></html>\n" if color_format == "html" else RESET)
+
+
+def merged_save(chars, colors, color_format, step, output_path):
+    img2txt.save_text(color_text(chars, colors, color_format, step), output_path)
+
+
+def main():
+    args = get_args()
+    converter = Converter("general", "complex")
+    print("{:<28} {:>8} {:<8} {:>10} {:>10} {:>7} {:>10} {:>10} {:>7}".format(
+        "image", "num_cols", "format", "naive B", "merged B", "ratio", "naive ms", "merged ms", "speedup"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "output.txt")
+        for image_path in args.images:
+            image = cv2.imread(image_path)
+            gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            for num_cols in args.num_cols:
+                chars, cell_width, cell_height = converter.to_chars(gray_image, num_cols)
+                colors = cell_colors(image, chars.shape[0], chars.shape[1], cell_width, cell_height)
+                for color_format in COLOR_FORMATS:
+                    results = []
+                    for save in (naive_save, merged_save):
+                        run = lambda: save(chars, colors, color_format, args.color_step, output_path)
+                        seconds = min(time_call(run, args.repeat))
+                        results.append((os.path.getsize(output_path), seconds))
+                    (naive_bytes, naive_seconds), (merged_bytes, merged_seconds) = results
+                    print("{:<28} {:>8} {:<8} {:>10} {:>10} {:>7.1%} {:>10.2f} {:>10.2f} {:>6.1f}x".format(
+                        os.path.basename(image_path), num_cols, color_format, naive_bytes, merged_bytes,
+                        merged_bytes / naive_bytes, naive_seconds * 1e3, merged_seconds * 1e3,
+                        naive_seconds / merged_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Allocation check for video2video_color's FrameProcessor. After a few warm-up frames, tracemalloc
+measures the memory allocated while each frame is converted (peak above the memory in use before
+the frame, so temporaries count too) and the memory still held afterwards. The steady state must
+stay under --budget_kb per frame, and what is held must not grow by more than that over all the
+measured frames; the script exits with status 1 otherwise.
+
+The previous per-frame path (process_frame, PIL crop, new overlay) is measured the same way for
+comparison, and every FrameProcessor frame is compared with it (cropped to the same box).
+Run from the repository root:
+
+    python benchmarks/frame_alloc.py --sizes 640x360 1280x720 1920x1080
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video2video_color
+from rawpipe import parse_size
+from strips import grid_ink_box
+from suite import script_args
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Frame allocation check")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(640, 360), (1280, 720), (1920, 1080)],
+                        help="Frame sizes (WxH)")
+    parser.add_argument("--num_cols", type=int, default=100, help="Number of columns")
+    parser.add_argument("--frames", type=int, default=20, help="Measured frames per size")
+    parser.add_argument("--warmup", type=int, default=3, help="Frames converted before measuring")
+    parser.add_argument("--budget_kb", type=float, default=16, help="Largest allowed allocation per steady-state frame")
+    parser.add_argument("--dither", action="store_true", help="Use ordered dithering")
+    return parser.parse_args()
+
+
+def previous_convert(frame, opt, resources, box):
+    """
+    The per-frame path FrameProcessor replaces: a new PIL image, crop and overlay every frame.
+    """
+    char_list, font, bg_color, atlas, lut = resources
+    image = video2video_color.process_frame(frame, opt.num_cols, char_list, font, bg_color, atlas, lut, opt.dither)
+    out_image = np.array(image.crop(box))
+    height, width, _ = out_image.shape
+    overlay = cv2.resize(frame, (int(width * opt.overlay_ratio), int(height * opt.overlay_ratio)))
+    out_image[height - overlay.shape[0]:, width - overlay.shape[1]:] = overlay
+    return out_image
+
+
+def measure(convert, frames, warmup):
+    """
+    (allocated per frame, held after each frame, seconds per frame) lists for frames after warmup.
+    """
+    for frame in frames[:warmup]:
+        convert(frame)
+    allocated, held, seconds = [], [], []
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    for frame in frames[warmup:]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        convert(frame)
+        seconds.append(time.perf_counter() - start)
+        current, peak = tracemalloc.get_traced_memory()
+        allocated.append(peak - before)
+        held.append(current - start_memory)
+    tracemalloc.stop()
+    return allocated, held, seconds
+
+
+def main():
+    args = get_args()
+    opt = script_args(video2video_color, ["--num_cols", str(args.num_cols)] + (["--dither"] if args.dither else []))
+    resources = video2video_color.load_resources(opt)
+    char_list, font, bg_color, atlas, lut = resources
+    failures = 0
+    print("{:<10} {:<10} {:>14} {:>14} {:>10} {:>10}".format(
+        "size", "path", "alloc/frame KB", "held KB", "ms/frame", "identical"))
+    for width, height in args.sizes:
+        frames = [make_frame(width, height, index) for index in range(args.warmup + args.frames)]
+        processor = video2video_color.FrameProcessor(opt.num_cols, char_list, font, bg_color, opt.background,
+                                                     opt.overlay_ratio, atlas, lut, opt.dither)
+        processor(frames[0])
+        char_width, char_height = font.getsize("A")
+        num_rows, num_cols = processor.char_indices.shape
+        box = grid_ink_box(atlas, (num_rows, num_cols), (char_width * num_cols, 2 * char_height * num_rows))
+        same = all(np.array_equal(processor(frame), previous_convert(frame, opt, resources, box)) for frame in frames)
+        for name, convert in (("previous", lambda frame: previous_convert(frame, opt, resources, box)),
+                              ("processor", processor)):
+            allocated, held, seconds = measure(convert, frames, args.warmup)
+            print("{:<10} {:<10} {:>14.1f} {:>14.1f} {:>10.2f} {:>10}".format(
+                "{}x{}".format(width, height), name, max(allocated) / 1024, held[-1] / 1024,
+                np.median(seconds) * 1e3, "" if name == "previous" else str(same)))
+        failures += not same
+        failures += max(allocated) > args.budget_kb * 1024 or held[-1] - held[0] > args.budget_kb * 1024
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
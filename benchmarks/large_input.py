@@ -0,0 +1,78 @@
+"""
+Load latency, total time and peak RSS of img2txt/img2img on very large synthetic inputs, decoded
+at full size (--decode_scale 1) and with the reduction picked from the grid (--decode_scale 0),
+plus how many characters of the text output differ. Every run is a fresh process so peak RSS is
+its own. Run from the repository root:
+
+    python benchmarks/large_input.py --width 12000 --height 9000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Large input benchmark")
+    parser.add_argument("--width", type=int, default=12000, help="Width of the synthetic image")
+    parser.add_argument("--height", type=int, default=9000, help="Height of the synthetic image")
+    parser.add_argument("--num_cols", type=int, default=300, help="Number of characters for output width")
+    parser.add_argument("--formats", type=str, nargs="+", default=["jpg", "png"], help="Input formats to test")
+    return parser.parse_args()
+
+
+def run(script, input_path, output_path, num_cols, decode_scale, tmp_dir):
+    """
+    Run one converter with --profile in a new process and return its profile report.
+    """
+    report_path = os.path.join(tmp_dir, "profile.json")
+    subprocess.run([sys.executable, "-W", "ignore", script, "--input", input_path, "--output", output_path,
+                    "--num_cols", str(num_cols), "--decode_scale", str(decode_scale), "--profile", report_path],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(report_path) as report_file:
+        return json.load(report_file)
+
+
+def main():
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("{:<6} {:<12} {:>6} {:>9} {:>9} {:>10} {:>12}".format(
+            "format", "converter", "decode", "read ms", "total ms", "peak MB", "chars diff"))
+        for image_format in args.formats:
+            input_path = os.path.join(tmp_dir, "input." + image_format)
+            # 加一点噪声，让 JPEG/PNG 的大小接近真实照片
+            frame = make_frame(args.width, args.height)
+            frame += np.random.default_rng(0).integers(0, 16, frame.shape, dtype=np.uint8)
+            cv2.imwrite(input_path, frame)
+            del frame
+            for script in ("img2txt.py", "img2img.py"):
+                extension = ".txt" if script == "img2txt.py" else ".png"
+                texts = {}
+                for decode_scale in (1, 0):
+                    output_path = os.path.join(tmp_dir, "output{}{}".format(decode_scale, extension))
+                    report = run(script, input_path, output_path, args.num_cols, decode_scale, tmp_dir)
+                    if extension == ".txt":
+                        with open(output_path) as text_file:
+                            texts[decode_scale] = text_file.read()
+                    diff = ""
+                    if decode_scale == 0 and texts:
+                        full, reduced = texts[1], texts[0]
+                        diff = "{:.2%}".format(sum(a != b for a, b in zip(full, reduced)) / len(full))
+                    total = sum(stage["total_seconds"] for stage in report["stages"].values())
+                    print("{:<6} {:<12} {:>6} {:>9.1f} {:>9.1f} {:>10.1f} {:>12}".format(
+                        image_format, script[:-3], "full" if decode_scale == 1 else "auto",
+                        report["stages"]["read"]["total_seconds"] * 1000, total * 1000, report["peak_rss_mb"], diff))
+
+
+if __name__ == "__main__":
+    main()
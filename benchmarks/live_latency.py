@@ -0,0 +1,83 @@
+"""
+Check that live mode holds its latency budget: video2video/video2video_color convert a synthetic
+camera at --fps, first on an idle machine, then with --load busy processes competing for the CPU.
+After the first second (while the controller settles) the p95 latency must stay within one frame
+interval; the script exits with status 1 otherwise. Run from the repository root:
+
+    python benchmarks/live_latency.py --fps 15 --num_cols 300
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video2video
+import video2video_color
+from live import LatencyController, SyntheticCapture, VideoOutput, format_metrics, run_live
+from renderer import GlyphAtlas
+from utils import build_char_lut
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Live latency check")
+    parser.add_argument("--width", type=int, default=1280, help="Width of the synthetic camera")
+    parser.add_argument("--height", type=int, default=720, help="Height of the synthetic camera")
+    parser.add_argument("--fps", type=float, default=15, help="Target frame rate")
+    parser.add_argument("--num_cols", type=int, default=300, help="Starting (and largest) number of columns")
+    parser.add_argument("--seconds", type=float, default=8, help="Duration of every run")
+    parser.add_argument("--load", type=int, default=os.cpu_count(),
+                        help="Busy processes started for the loaded run (default: one per CPU)")
+    return parser.parse_args()
+
+
+def spin():
+    while True:
+        pass
+
+
+def converters():
+    """
+    (name, convert(frame, num_cols)) for both video converters, with their default settings.
+    """
+    font = video2video.initialize_font(1)
+    gray_chars = video2video.get_char_list("simple")
+    gray_atlas, gray_lut = GlyphAtlas(gray_chars, font, "A"), build_char_lut(len(gray_chars))
+    color_chars = video2video_color.get_char_list("complex")
+    color_atlas, color_lut = GlyphAtlas(color_chars, font, "A"), build_char_lut(len(color_chars))
+    yield "video2video", lambda frame, num_cols: video2video.convert_frame(
+        frame, gray_chars, font, num_cols, 0.2, 255, gray_atlas, gray_lut)
+    # 与 --live 相同：一个 FrameProcessor 在列数变化时才重新分配缓冲区
+    yield "video2video_color", video2video_color.FrameProcessor(300, color_chars, font, (0, 0, 0), "black", 0.2,
+                                                                color_atlas, color_lut)
+
+
+def main():
+    args = get_args()
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for load in (0, args.load):
+            workers = [multiprocessing.Process(target=spin, daemon=True) for _ in range(load)]
+            for worker in workers:
+                worker.start()
+            try:
+                for name, convert in converters():
+                    cap = SyntheticCapture(args.width, args.height, args.fps)
+                    output = VideoOutput(os.path.join(tmp_dir, name + ".avi"), args.fps, (args.width, args.height))
+                    metrics = run_live(cap, convert, output.write, LatencyController(args.fps, args.num_cols),
+                                       duration=args.seconds, settle=int(args.fps))
+                    output.release()
+                    held = metrics["latency_ms"]["p95"] <= metrics["budget_ms"]
+                    failures += not held
+                    print("== {} with {} busy processes: {}".format(name, load, "budget held" if held else "OVER BUDGET"))
+                    print(format_metrics(metrics))
+            finally:
+                for worker in workers:
+                    worker.terminate()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Load test of server.py. The server is started on a Unix socket in a temporary directory (or
+--socket/--port name a running one), then --requests conversions of the same image are sent by
+N concurrent keep-alive clients at every --concurrency level. Each level reports p50/p99
+latency, throughput and the requests answered 503 (backpressure) or 504 (timeout), and the
+server's /metrics follow. The first response is checked against the script's own output file,
+and spawning the script once per request, which the server replaces, is timed for comparison.
+Run from the repository root:
+
+    python benchmarks/load_test.py --converter img2img --num_cols 100 --concurrency 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Conversion server load test")
+    parser.add_argument("--converter", type=str, default="img2img", choices=["img2txt", "img2img", "img2img_color"])
+    parser.add_argument("--num_cols", type=int, default=100, help="Number of columns")
+    parser.add_argument("--width", type=int, default=1280, help="Width of the synthetic JPEG")
+    parser.add_argument("--height", type=int, default=720, help="Height of the synthetic JPEG")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Workers of the started server")
+    parser.add_argument("--max_queue", type=int, default=None, help="--max_queue of the started server")
+    parser.add_argument("--socket", type=str, default=None, help="Unix socket of a running server")
+    parser.add_argument("--port", type=int, default=None, help="Port of a running server on 127.0.0.1")
+    parser.add_argument("--spawn_runs", type=int, default=5, help="Script runs for the process-per-request comparison")
+    return parser.parse_args()
+
+
+async def connect(args):
+    if args.port:
+        return await asyncio.open_connection("127.0.0.1", args.port)
+    return await asyncio.open_unix_connection(args.socket)
+
+
+async def request(reader, writer, method, path, body=b""):
+    """
+    (status, body) of one request on a keep-alive connection.
+    """
+    writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n".format(
+        method, path, len(body)).encode("latin-1") + body)
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split(" ", 2)[1])
+    length = 0
+    for line in head.split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def fetch(args, method, path, body=b""):
+    reader, writer = await connect(args)
+    try:
+        return await request(reader, writer, method, path, body)
+    finally:
+        writer.close()
+
+
+async def client(args, path, body, count, results):
+    reader, writer = await connect(args)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", path, body)
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+
+async def run_level(args, path, body, concurrency):
+    """
+    (statuses, latencies of the 200 responses, elapsed seconds) of one concurrency level.
+    """
+    results = []
+    counts = [args.requests // concurrency + (index < args.requests % concurrency) for index in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args, path, body, count, results) for count in counts if count))
+    elapsed = time.perf_counter() - start
+    return [status for status, _ in results], [seconds for status, seconds in results if status == 200], elapsed
+
+
+async def wait_ready(args, process, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("server.py exited with status {}".format(process.returncode))
+        try:
+            if (await fetch(args, "GET", "/health"))[0] == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server.py did not start within {} s".format(timeout))
+
+
+def spawn_seconds(args, input_path, output_path):
+    """
+    Median wall time of running the converter script once per request.
+    """
+    seconds = []
+    for _ in range(args.spawn_runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-W", "ignore", args.converter + ".py", "--input", input_path, "--output",
+                        output_path, "--num_cols", str(args.num_cols)], cwd=ROOT, stdout=subprocess.DEVNULL,
+                       check=True)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+async def run(args, tmp_dir):
+    input_path = os.path.join(tmp_dir, "input.jpg")
+    cv2.imwrite(input_path, make_frame(args.width, args.height))
+    with open(input_path, "rb") as input_file:
+        body = input_file.read()
+    output_path = os.path.join(tmp_dir, "output" + (".txt" if args.converter == "img2txt" else ".png"))
+    path = "/convert/{}?num_cols={}".format(args.converter, args.num_cols)
+
+    process = None
+    if not args.socket and not args.port:
+        args.socket = os.path.join(tmp_dir, "server.sock")
+        command = [sys.executable, "-W", "ignore", "server.py", "--socket", args.socket, "--workers", str(args.workers)]
+        if args.max_queue is not None:
+            command += ["--max_queue", str(args.max_queue)]
+        process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        await wait_ready(args, process)
+        status, first = await fetch(args, "POST", path, body)
+        spawn = spawn_seconds(args, input_path, output_path)
+        with open(output_path, "rb") as output_file:
+            same = status == 200 and first == output_file.read()
+        print("{} num_cols {} on {}x{} JPEG, server output identical to the script: {}".format(
+            args.converter, args.num_cols, args.width, args.height, same))
+        print("process per request: {:.1f} ms ({:.2f} req/s)".format(spawn * 1e3, 1 / spawn))
+        print("{:>11} {:>8} {:>8} {:>8} {:>9} {:>9} {:>9}".format(
+            "concurrency", "ok", "503", "504", "p50 ms", "p99 ms", "req/s"))
+        for concurrency in args.concurrency:
+            statuses, latencies, elapsed = await run_level(args, path, body, concurrency)
+            latencies = np.array(latencies or [np.nan]) * 1e3
+            print("{:>11} {:>8} {:>8} {:>8} {:>9.1f} {:>9.1f} {:>9.2f}".format(
+                concurrency, statuses.count(200), statuses.count(503), statuses.count(504),
+                np.percentile(latencies, 50), np.percentile(latencies, 99), statuses.count(200) / elapsed))
+        print(json.dumps(json.loads((await fetch(args, "GET", "/metrics"))[1]), indent=2))
+        return same
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        same = asyncio.run(run(args, tmp_dir))
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cost of producing several num_cols values from one decode. For every converter, each size is
+timed on its own (its own decode and cell averaging), then all sizes are produced by a single
+invocation, which shares the decode and one summed-area table, and the profiler stages give each
+size's share. Sizes run largest first, since the finest grid picks the decode reduction. "grid" is
+the decode and cell averaging part; the rest is rendering and writing the output, which still
+grows with every size. Run from the repository root:
+
+    python benchmarks/multi_size.py --width 3840 --height 2160 --num_cols 80 300 600
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import img2img
+import img2img_color
+import img2txt
+from profiler import profiler
+from suite import script_args, time_call
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Multi-size conversion benchmark")
+    parser.add_argument("--width", type=int, default=3840, help="Width of the synthetic image")
+    parser.add_argument("--height", type=int, default=2160, help="Height of the synthetic image")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[80, 300, 600], help="Sizes to produce")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions, the fastest is kept")
+    return parser.parse_args()
+
+
+GRID_STAGES = ("read", "grayscale", "color_convert", "integral", "cell_average", "char_map")
+
+
+def size_seconds(module, image_path, output_path, num_cols, repeat):
+    """
+    Median (total, grid) seconds spent on every size of one convert_file call producing all of
+    num_cols, from the profiler stages. Stages run before the first size (decode, integral image)
+    are counted in the first size.
+    """
+    args = script_args(module, ["--num_cols"] + [str(value) for value in num_cols])
+    resources = module.load_resources(args)
+    runs = []
+    for _ in range(repeat):
+        # 直接使用进程内的 profiler 收集阶段耗时，不注册退出时的报告
+        profiler.enabled, profiler.events = True, []
+        time_call(lambda: module.convert_file(image_path, output_path, args, resources), 1)
+        seconds = np.zeros((len(num_cols), 2))
+        size = -1
+        for name, _, duration, _ in profiler.events:
+            # 每个尺寸的阶段从它的 cell_average 开始
+            if name == "cell_average":
+                size += 1
+            seconds[max(size, 0)] += (duration / 1e9, duration / 1e9 if name in GRID_STAGES else 0)
+        runs.append(seconds)
+    profiler.enabled = False
+    return np.median(runs, axis=0)
+
+
+def main():
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = os.path.join(tmp_dir, "input.jpg")
+        cv2.imwrite(image_path, make_frame(args.width, args.height))
+        sizes = sorted(args.num_cols, reverse=True)
+        print("{:<14} {:>8} {:>10} {:>10} {:>7} {:>10} {:>10} {:>7}".format(
+            "converter", "num_cols", "alone s", "shared s", "ratio", "grid s", "shared s", "ratio"))
+        for module in (img2txt, img2img, img2img_color):
+            extension = ".txt" if module is img2txt else ".png"
+            output_path = os.path.join(tmp_dir, "output" + extension)
+            together = size_seconds(module, image_path, output_path, sizes, args.repeat)
+            for num_cols, added in zip(sizes, together):
+                alone = size_seconds(module, image_path, output_path, [num_cols], args.repeat)[0]
+                print("{:<14} {:>8} {:>10.4f} {:>10.4f} {:>7.0%} {:>10.4f} {:>10.4f} {:>7.0%}".format(
+                    module.__name__, num_cols, alone[0], added[0], added[0] / alone[0], alone[1], added[1],
+                    added[1] / alone[1]))
+
+
+if __name__ == "__main__":
+    main()
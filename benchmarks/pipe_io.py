@@ -0,0 +1,124 @@
+"""
+End-to-end check of raw-frame pipe I/O (--input - / --output -) without external binaries: a Y4M
+(and a bgr24 rawvideo) stream of synthetic frames is generated in memory and piped through
+video2video and video2video_color, and every output frame must equal the frame convert_frame
+produces for the same decoded input, placed on the same canvas. The time of the pipe run is
+compared with the same frames going through an AVI file and the XVID writer. The script exits
+with status 1 on a mismatch; tests/test_rawpipe.py runs the same check for every pixel format.
+Run from the repository root:
+
+    python benchmarks/pipe_io.py --frames 60 --width 640 --height 360
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import video2video
+import video2video_color
+from rawpipe import PipeWriter, pipe_io
+from suite import script_args
+from video_pipeline import make_frame
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Pipe I/O check")
+    parser.add_argument("--width", type=int, default=640, help="Width of the synthetic frames")
+    parser.add_argument("--height", type=int, default=360, help="Height of the synthetic frames")
+    parser.add_argument("--frames", type=int, default=60, help="Number of frames")
+    parser.add_argument("--fps", type=int, default=25, help="Frame rate of the stream")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2], help="Worker counts to check")
+    return parser.parse_args()
+
+
+def encode(frames, fps, output_format, pix_fmt="bgr24"):
+    stream = io.BytesIO()
+    writer = PipeWriter(stream, frames[0].shape, fps, output_format, pix_fmt)
+    for frame in frames:
+        writer.write(frame)
+    return stream.getvalue()
+
+
+def pipe_options(input_format, size, output_format, pix_fmt="bgr24", output_pix_fmt="bgr24"):
+    return ["--input", "-", "--output", "-", "--input_format", input_format, "--input_size", "{}x{}".format(*size),
+            "--output_format", output_format, "--pix_fmt", pix_fmt, "--output_pix_fmt", output_pix_fmt]
+
+
+def expected_output(module, stream, options):
+    """
+    The bytes the converter should write for stream with the command line options: decode
+    in-process, convert_frame, PipeWriter.
+    """
+    args = script_args(module, options)
+    resources = module.load_resources(args)
+    output = io.BytesIO()
+    with pipe_io(args, lambda shape: module.max_frame_shape(shape, resources[1], args.num_cols),
+                 background_fill(module, resources), io.BytesIO(stream), output) as (cap, out):
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            out.write(convert(module, args, resources, frame))
+    return output.getvalue()
+
+
+def background_fill(module, resources):
+    if module is video2video:
+        return (resources[2],) * 3
+    return resources[2]
+
+
+def convert(module, args, resources, frame):
+    char_list, font, background, atlas, lut = resources
+    if module is video2video:
+        return video2video.convert_frame(frame, char_list, font, args.num_cols, args.overlay_ratio, background,
+                                         atlas, lut, args.dither)
+    return video2video_color.convert_frame(frame, args.num_cols, char_list, font, background, args.background,
+                                           args.overlay_ratio, atlas, lut, args.dither)
+
+
+def run_script(module, argv, stream=None):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, module.__name__ + ".py"] + argv, input=stream, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return result.stdout, time.perf_counter() - start
+
+
+def main():
+    args = get_args()
+    frames = [make_frame(args.width, args.height, index) for index in range(args.frames)]
+    size = (args.width, args.height)
+    streams = {"y4m": encode(frames, args.fps, "y4m"), "rawvideo": encode(frames, args.fps, "rawvideo")}
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        avi_path = os.path.join(tmp_dir, "input.avi")
+        writer = cv2.VideoWriter(avi_path, cv2.VideoWriter_fourcc(*"MJPG"), args.fps, size)
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        for module in (video2video, video2video_color):
+            for input_format, output_format in (("y4m", "y4m"), ("rawvideo", "rawvideo")):
+                options = pipe_options(input_format, size, output_format)
+                expected = expected_output(module, streams[input_format], options)
+                for workers in args.workers:
+                    output, seconds = run_script(module, options + ["--workers", str(workers)], streams[input_format])
+                    same = output == expected
+                    failures += not same
+                    print("{:<18} {:>8} -> {:<8} workers {} {:>10} bytes {:>7.2f} s  {}".format(
+                        module.__name__, input_format, output_format, workers, len(output), seconds,
+                        "identical" if same else "MISMATCH"))
+            _, seconds = run_script(module, ["--input", avi_path, "--output", os.path.join(tmp_dir, "output.avi")])
+            print("{:<18} {:>8} -> {:<8} workers 0 {:>10} {:>7.2f} s".format(module.__name__, "avi", "xvid", "", seconds))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Checks and timings of the result cache (--cache_dir). For every converter a synthetic JPEG is
+converted without a cache, on a miss (which also stores the outputs) and on a hit, and the hit
+outputs are compared with the uncached ones. Then --processes processes convert --inputs
+different images in shuffled order, several times over, into one cache whose --cache_mb limit
+holds only part of the outputs, so entries are stored, hit and evicted concurrently; every
+output is compared with its uncached version and the cache's byte count with the entries on
+disk. Run from the repository root:
+
+    python benchmarks/result_cache.py --width 3840 --height 2160 --num_cols 80 300
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import img2img
+import img2img_color
+import img2txt
+from cache import open_cache
+from suite import script_args, time_call
+from utils import size_output_path
+from video_pipeline import make_frame
+
+MODULES = (img2txt, img2img, img2img_color)
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Result cache benchmark")
+    parser.add_argument("--width", type=int, default=3840, help="Width of the synthetic images")
+    parser.add_argument("--height", type=int, default=2160, help="Height of the synthetic images")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[80, 300], help="Sizes to produce")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions, the median is kept")
+    parser.add_argument("--processes", type=int, default=4, help="Concurrent processes sharing one cache")
+    parser.add_argument("--inputs", type=int, default=12, help="Different images of the concurrency check")
+    parser.add_argument("--rounds", type=int, default=3, help="Times every process converts every image")
+    parser.add_argument("--cache_mb", type=float, default=None,
+                        help="Cache limit of the concurrency check (default: a third of its outputs)")
+    return parser.parse_args()
+
+
+def extension(module):
+    return ".txt" if module is img2txt else ".png"
+
+
+def read_outputs(output_path, num_cols):
+    outputs = []
+    for value in num_cols:
+        with open(size_output_path(output_path, value, len(num_cols)), "rb") as output_file:
+            outputs.append(output_file.read())
+    return outputs
+
+
+def setup(module, num_cols, cache_dir=None, cache_mb=512):
+    """
+    (args, resources) of a converter for num_cols, caching in cache_dir if given.
+    """
+    argv = ["--num_cols"] + [str(value) for value in num_cols]
+    if cache_dir:
+        argv += ["--cache_dir", cache_dir, "--cache_mb", str(cache_mb)]
+    args = script_args(module, argv)
+    return args, module.load_resources(args)
+
+
+def timings(module, input_path, tmp_dir, num_cols, repeat):
+    """
+    Median (uncached, miss, hit) seconds of convert_file, and whether the hit outputs equal the
+    uncached ones.
+    """
+    output_path = os.path.join(tmp_dir, module.__name__ + extension(module))
+    cache_dir = os.path.join(tmp_dir, "cache")
+    plain_args, resources = setup(module, num_cols)
+    cached_args, _ = setup(module, num_cols, cache_dir)
+    uncached = np.median(time_call(lambda: module.convert_file(input_path, output_path, plain_args, resources),
+                                   repeat))
+    expected = read_outputs(output_path, num_cols)
+    misses, hits = [], []
+    for _ in range(repeat):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        call = lambda: module.convert_file(input_path, output_path, cached_args, resources)
+        misses += time_call(call, 1)
+        hits += time_call(call, 1)
+    same = read_outputs(output_path, num_cols) == expected
+    return uncached, np.median(misses), np.median(hits), same
+
+
+def worker(task):
+    """
+    Convert the inputs of one process in shuffled order; returns the (input, outputs) it saw.
+    """
+    module_name, input_paths, tmp_dir, num_cols, cache_dir, cache_mb, rounds, seed = task
+    module = sys.modules[module_name]
+    args, resources = setup(module, num_cols, cache_dir, cache_mb)
+    order = [index for _ in range(rounds) for index in range(len(input_paths))]
+    random.Random(seed).shuffle(order)
+    seen = []
+    for step, index in enumerate(order):
+        output_path = os.path.join(tmp_dir, "p{}_{}{}".format(seed, step, extension(module)))
+        time_call(lambda: module.convert_file(input_paths[index], output_path, args, resources), 1)
+        seen.append((index, read_outputs(output_path, num_cols)))
+    return seen
+
+
+def concurrency_check(module, input_paths, tmp_dir, args):
+    """
+    (ok, stats) of --processes processes sharing one size-limited cache.
+    """
+    expected = []
+    for index, input_path in enumerate(input_paths):
+        output_path = os.path.join(tmp_dir, "ref{}{}".format(index, extension(module)))
+        plain_args, resources = setup(module, args.num_cols)
+        time_call(lambda: module.convert_file(input_path, output_path, plain_args, resources), 1)
+        expected.append(read_outputs(output_path, args.num_cols))
+    cache_mb = args.cache_mb
+    if cache_mb is None:
+        cache_mb = sum(len(output) for outputs in expected for output in outputs) / 3 / 2 ** 20
+    cache_dir = os.path.join(tmp_dir, "shared_cache_" + module.__name__)
+    tasks = [(module.__name__, input_paths, tmp_dir, args.num_cols, cache_dir, cache_mb, args.rounds, seed)
+             for seed in range(args.processes)]
+    with multiprocessing.get_context("fork").Pool(args.processes) as pool:
+        results = pool.map(worker, tasks)
+    ok = all(outputs == expected[index] for seen in results for index, outputs in seen)
+    cache = open_cache(script_args(module, ["--cache_dir", cache_dir, "--cache_mb", str(cache_mb)]))
+    stats = cache.stats()
+    on_disk = sum(size for _, size, _ in cache._entries())
+    lookups = args.processes * args.rounds * len(input_paths) * len(args.num_cols)
+    ok = ok and stats["bytes"] == on_disk <= cache.max_bytes and stats["hits"] + stats["misses"] == lookups
+    return ok, stats
+
+
+def main():
+    args = get_args()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "input.jpg")
+        cv2.imwrite(input_path, make_frame(args.width, args.height))
+        print("{}x{} JPEG, num_cols {}".format(args.width, args.height, " ".join(map(str, args.num_cols))))
+        print("{:<14} {:>12} {:>9} {:>9} {:>9} {:>10}".format(
+            "converter", "uncached ms", "miss ms", "hit ms", "speedup", "identical"))
+        for module in MODULES:
+            uncached, miss, hit, same = timings(module, input_path, tmp_dir, args.num_cols, args.repeat)
+            ok = ok and same
+            print("{:<14} {:>12.1f} {:>9.1f} {:>9.1f} {:>8.0f}x {:>10}".format(
+                module.__name__, uncached * 1e3, miss * 1e3, hit * 1e3, uncached / hit, str(same)))
+
+        input_paths = []
+        for index in range(args.inputs):
+            input_paths.append(os.path.join(tmp_dir, "input{}.jpg".format(index)))
+            cv2.imwrite(input_paths[-1], make_frame(args.width // 4, args.height // 4, index * 5))
+        print("\n{} processes x {} rounds x {} images".format(args.processes, args.rounds, args.inputs))
+        for module in MODULES:
+            correct, stats = concurrency_check(module, input_paths, tmp_dir, args)
+            ok = ok and correct
+            print("{:<14} correct {} hits {} misses {} stores {} evictions {} bytes {} / {}".format(
+                module.__name__, correct, stats["hits"], stats["misses"], stats["stores"], stats["evictions"],
+                stats["bytes"], stats["max_bytes"]))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cost of --match shape against brightness mode. For every converter data/input.jpg (or --input)
+is converted at --num_cols with each mode, and the median convert_file time and character
+selection time (the cell_average and char_map stages) are reported with the shape / brightness
+ratio. The batched selection is also checked against scoring the cells one at a time in a
+Python loop, which must pick the same glyphs, and the loop is timed. Run from the repository
+root:
+
+    python benchmarks/shape_match.py --num_cols 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import img2img
+import img2img_color
+import img2txt
+from profiler import profiler
+from suite import script_args, time_call
+
+SELECTION_STAGES = ("cell_average", "char_map")
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Shape matching benchmark")
+    parser.add_argument("--input", type=str, default=os.path.join(ROOT, "data", "input.jpg"), help="Input image")
+    parser.add_argument("--num_cols", type=int, default=300, help="Number of columns")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed repetitions, the median is kept")
+    return parser.parse_args()
+
+
+def mode_seconds(module, input_path, output_path, num_cols, match, repeat):
+    """
+    Median (convert_file, selection) seconds of one converter and --match mode.
+    """
+    args = script_args(module, ["--num_cols", str(num_cols), "--match", match])
+    resources = module.load_resources(args)
+    totals, selections = [], []
+    for _ in range(repeat):
+        profiler.enabled, profiler.events = True, []
+        totals += time_call(lambda: module.convert_file(input_path, output_path, args, resources), 1)
+        selections.append(sum(duration for name, _, duration, _ in profiler.events if name in SELECTION_STAGES) / 1e9)
+    profiler.enabled = False
+    return np.median(totals), np.median(selections)
+
+
+def loop_check(input_path, num_cols):
+    """
+    (same, batched seconds, loop seconds) of img2img's converter: the glyphs picked by the one
+    matrix product against scoring every cell on its own.
+    """
+    converter = img2img.load_resources(script_args(img2img, ["--num_cols", str(num_cols), "--match", "shape"]))
+    gray_image = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
+    num_rows, num_cols, cell_width, cell_height = converter.grid(gray_image.shape[1], gray_image.shape[0])
+    matcher = converter.matcher
+    start = time.perf_counter()
+    batched = matcher.match(gray_image, num_rows, num_cols, cell_width, cell_height)
+    batched_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    patch_size = matcher.patch_size(cell_width)
+    glyphs = matcher.glyph_set(patch_size)
+    patches = matcher.patches(gray_image, num_rows, num_cols, cell_width, cell_height, patch_size)
+    looped = np.array([[int(np.argmax(patches[row, :, col].ravel().astype(np.float32) @ glyphs[:-1] + glyphs[-1]))
+                        for col in range(num_cols)] for row in range(num_rows)])
+    loop_seconds = time.perf_counter() - start
+    return bool((batched == looped).all()), batched_seconds, loop_seconds
+
+
+def main():
+    args = get_args()
+    image = cv2.imread(args.input)
+    print("{} ({}x{}), num_cols {}".format(args.input, image.shape[1], image.shape[0], args.num_cols))
+    print("{:<14} {:>10} {:>10} {:>7} {:>12} {:>12} {:>7}".format(
+        "converter", "bright ms", "shape ms", "ratio", "select b ms", "select s ms", "ratio"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for module in (img2txt, img2img, img2img_color):
+            output_path = os.path.join(tmp_dir, "output" + (".txt" if module is img2txt else ".png"))
+            brightness = mode_seconds(module, args.input, output_path, args.num_cols, "brightness", args.repeat)
+            shape = mode_seconds(module, args.input, output_path, args.num_cols, "shape", args.repeat)
+            print("{:<14} {:>10.1f} {:>10.1f} {:>6.2f}x {:>12.2f} {:>12.2f} {:>6.1f}x".format(
+                module.__name__, brightness[0] * 1e3, shape[0] * 1e3, shape[0] / brightness[0],
+                brightness[1] * 1e3, shape[1] * 1e3, shape[1] / brightness[1]))
+    same, batched, looped = loop_check(args.input, args.num_cols)
+    print("one matrix product {:.2f} ms, per-cell loop {:.1f} ms, same glyphs: {}".format(
+        batched * 1e3, looped * 1e3, same))
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
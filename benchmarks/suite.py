@@ -0,0 +1,256 @@
+"""
+Benchmark every converter on synthetic images and clips generated locally, across input sizes,
+column counts, modes and the languages in alphabets.py, and compare runs against a baseline.
+Run from the repository root:
+
+    python benchmarks/suite.py run --output baseline.json
+    python benchmarks/suite.py run --quick --output current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 0.1
+
+compare exits with status 1 when a case got slower than the baseline by more than the threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alphabets
+import img2img
+import img2img_color
+import img2txt
+import video2video
+import video2video_color
+from renderer import GlyphAtlas
+from utils import build_char_lut
+from video_pipeline import make_clip, make_frame
+
+SIZES = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160), "8k": (7680, 4320)}
+CONVERTERS = ("img2txt", "img2img", "img2img_color", "video2video", "video2video_color")
+
+
+def get_args():
+    parser = argparse.ArgumentParser("ASCII generator benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark matrix")
+    run.add_argument("--output", type=str, default="", help="Path of the JSON results (printed only if empty)")
+    run.add_argument("--converters", type=str, nargs="+", default=list(CONVERTERS), choices=CONVERTERS)
+    run.add_argument("--sizes", type=str, nargs="+", default=list(SIZES), choices=list(SIZES))
+    run.add_argument("--num_cols", type=int, nargs="+", default=[50, 150, 300, 600])
+    run.add_argument("--languages", type=str, nargs="+", default=None,
+                     help="Languages for img2img/img2img_color (default: every language in alphabets.py)")
+    run.add_argument("--frames", type=int, default=5, help="Frames per synthetic clip")
+    run.add_argument("--repeat", type=int, default=3, help="Timed repetitions per case")
+    run.add_argument("--quick", action="store_true", help="Small matrix: 720p, 50/150 columns, english only")
+
+    compare = commands.add_parser("compare", help="Compare results against a baseline")
+    compare.add_argument("baseline", type=str, help="Baseline JSON results")
+    compare.add_argument("current", type=str, help="Current JSON results")
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="Relative slowdown of the median time reported as a regression")
+    return parser.parse_args()
+
+
+def alphabet_modes(languages=None):
+    """
+    (language, mode) pairs of alphabets.py, e.g. ("general", "complex") or ("japanese", "hiragana").
+    """
+    pairs = []
+    for name in dir(alphabets):
+        table = getattr(alphabets, name)
+        if name.isupper() and isinstance(table, dict):
+            language = name.lower()
+            if languages is None or language in languages:
+                pairs.extend((language, mode) for mode in table)
+    return sorted(pairs)
+
+
+def script_args(module, argv):
+    """
+    Parse argv with a converter's own get_args, so cases use its defaults.
+    """
+    saved = sys.argv
+    sys.argv = [module.__name__] + argv
+    try:
+        return module.get_args()
+    finally:
+        sys.argv = saved
+
+
+def time_call(function, repeat):
+    """
+    Seconds of every call of function(); converter messages are swallowed.
+    """
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def image_case(module, image_path, output_path, argv):
+    """
+    (setup, convert) for a converter with load_resources/convert_file.
+    """
+    args = script_args(module, argv)
+    state = {}
+
+    def setup():
+        state["resources"] = module.load_resources(args)
+
+    def convert():
+        module.convert_file(image_path, output_path, args, state["resources"])
+
+    return setup, convert
+
+
+def video_case(name, clip_path, output_path, num_cols, mode):
+    state = {}
+
+    def setup():
+        font = video2video.initialize_font(1)
+        char_list = video2video.get_char_list(mode)
+        state.update(font=font, char_list=char_list, atlas=GlyphAtlas(char_list, font, "A"),
+                     lut=build_char_lut(len(char_list)))
+
+    def convert():
+        if name == "video2video":
+            video2video.process_video(clip_path, output_path, state["char_list"], state["font"], num_cols, 1, 0,
+                                      0.2, 0, state["atlas"], state["lut"])
+        else:
+            video2video_color.process_video(clip_path, output_path, num_cols, state["char_list"], state["font"],
+                                            (0, 0, 0), "black", 0.2, 0, state["atlas"], state["lut"])
+
+    return setup, convert
+
+
+def cases(args, tmp_dir):
+    """
+    Yield (case description, setup, convert) over the requested matrix, writing inputs lazily.
+    """
+    modules = {"img2txt": img2txt, "img2img": img2img, "img2img_color": img2img_color}
+    for size in args.sizes:
+        width, height = SIZES[size]
+        image_path = os.path.join(tmp_dir, size + ".png")
+        clip_path = os.path.join(tmp_dir, size + ".avi")
+        for converter in args.converters:
+            if converter in modules and not os.path.exists(image_path):
+                cv2.imwrite(image_path, make_frame(width, height))
+            if converter.startswith("video") and not os.path.exists(clip_path):
+                make_clip(clip_path, width, height, args.frames)
+            if converter in ("img2img", "img2img_color"):
+                variants = alphabet_modes(args.languages)
+            else:
+                variants = [(None, "simple"), (None, "complex")]
+            for num_cols in args.num_cols:
+                for language, mode in variants:
+                    case = {"converter": converter, "size": size, "num_cols": num_cols, "language": language,
+                            "mode": mode}
+                    if converter in modules:
+                        argv = ["--num_cols", str(num_cols), "--mode", mode]
+                        if language is not None:
+                            argv += ["--language", language]
+                        output_path = os.path.join(tmp_dir, "out." + ("txt" if converter == "img2txt" else "png"))
+                        setup, convert = image_case(modules[converter], image_path, output_path, argv)
+                    else:
+                        case["frames"] = args.frames
+                        setup, convert = video_case(converter, clip_path, os.path.join(tmp_dir, "out.avi"),
+                                                    num_cols, mode)
+                    yield case, setup, convert
+
+
+def case_key(case):
+    return "{converter}/{size}/{num_cols}/{language}/{mode}".format(**case)
+
+
+def run(args):
+    if args.quick:
+        args.sizes, args.num_cols, args.languages = ["720p"], [50, 150], ["english", "general"]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("{:<48} {:>9} {:>10} {:>10}".format("case", "setup s", "median s", "min s"))
+        for case, setup, convert in cases(args, tmp_dir):
+            try:
+                case["setup_seconds"] = time_call(setup, 1)[0]
+                timings = time_call(convert, args.repeat)
+            except Exception as error:
+                # 例如缺少字体文件的语言，记录下来继续运行
+                case["error"] = "{}: {}".format(type(error).__name__, error)
+                print("{:<48} skipped ({})".format(case_key(case), case["error"]))
+                results.append(case)
+                continue
+            case["seconds"] = timings
+            case["median_seconds"] = statistics.median(timings)
+            case["min_seconds"] = min(timings)
+            if "frames" in case:
+                case["fps"] = case["frames"] / case["median_seconds"]
+            results.append(case)
+            print("{:<48} {:>9.3f} {:>10.4f} {:>10.4f}".format(case_key(case), case["setup_seconds"],
+                                                               case["median_seconds"], case["min_seconds"]))
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print("Results saved to {}".format(args.output))
+
+
+def compare(args):
+    with open(args.baseline) as baseline_file:
+        baseline = {case_key(case): case for case in json.load(baseline_file)["results"] if "median_seconds" in case}
+    with open(args.current) as current_file:
+        current = {case_key(case): case for case in json.load(current_file)["results"] if "median_seconds" in case}
+
+    regressions = 0
+    print("{:<48} {:>10} {:>10} {:>8}".format("case", "base s", "now s", "change"))
+    for key in sorted(set(baseline) & set(current)):
+        before, after = baseline[key]["median_seconds"], current[key]["median_seconds"]
+        change = after / before - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  faster"
+        print("{:<48} {:>10.4f} {:>10.4f} {:>+7.1%}{}".format(key, before, after, change, flag))
+    missing = sorted(set(baseline) - set(current))
+    if missing:
+        print("{} baseline cases missing from the current run".format(len(missing)))
+    print("{} regressions beyond {:.0%}".format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+
+def main():
+    args = get_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
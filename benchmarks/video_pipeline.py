@@ -0,0 +1,87 @@
+"""
+Frames-per-second of video2video/video2video_color for 0 (in-process) to N pipeline workers,
+measured on a synthetic clip generated locally. Run from the repository root:
+
+    python benchmarks/video_pipeline.py --max_workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video2video
+import video2video_color
+from renderer import GlyphAtlas
+from utils import build_char_lut
+
+
+def get_args():
+    parser = argparse.ArgumentParser("Video pipeline benchmark")
+    parser.add_argument("--width", type=int, default=1280, help="Width of the synthetic clip")
+    parser.add_argument("--height", type=int, default=720, help="Height of the synthetic clip")
+    parser.add_argument("--frames", type=int, default=60, help="Number of frames in the synthetic clip")
+    parser.add_argument("--num_cols", type=int, default=160, help="Number of characters for output width")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count(), help="Largest worker count to try")
+    return parser.parse_args()
+
+
+def make_frame(width, height, index=0):
+    """
+    One synthetic BGR frame: a gradient shifted by index with a disc whose position depends on index.
+    """
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = (x + index * 4) % 256
+    frame[..., 1] = (y + index * 2) % 256
+    frame[..., 2] = ((x + y) / 2 + index * 3) % 256
+    center = (int(width * (0.5 + 0.4 * np.sin(index / 7))), int(height * (0.5 + 0.4 * np.cos(index / 5))))
+    cv2.circle(frame, center, height // 6, (255, 255, 255), -1)
+    return frame
+
+
+def make_clip(path, width, height, frames, fps=25):
+    """
+    Write a synthetic clip: a moving gradient with a bouncing disc, so every cell changes.
+    """
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"XVID"), fps, (width, height))
+    for index in range(frames):
+        out.write(make_frame(width, height, index))
+    out.release()
+
+
+def main():
+    args = get_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clip = os.path.join(tmp_dir, "clip.avi")
+        make_clip(clip, args.width, args.height, args.frames)
+        font = video2video.initialize_font(1)
+
+        print("{:<18} {:>7} {:>8} {:>8}".format("converter", "workers", "fps", "speedup"))
+        for name in ("video2video", "video2video_color"):
+            char_list = video2video.get_char_list("complex")
+            atlas = GlyphAtlas(char_list, font, "A")
+            lut = build_char_lut(len(char_list))
+            baseline = None
+            for workers in range(args.max_workers + 1):
+                output = os.path.join(tmp_dir, "{}_{}.avi".format(name, workers))
+                start = time.perf_counter()
+                if name == "video2video":
+                    video2video.process_video(clip, output, char_list, font, args.num_cols, 1, 0, 0.2, 0,
+                                              atlas, lut, False, workers)
+                else:
+                    video2video_color.process_video(clip, output, args.num_cols, char_list, font, (0, 0, 0), "black",
+                                                    0.2, 0, atlas, lut, False, workers)
+                fps = args.frames / (time.perf_counter() - start)
+                baseline = baseline or fps
+                print("{:<18} {:>7} {:>8.1f} {:>7.2f}x".format(name, workers, fps, fps / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Content-addressed cache of finished outputs for img2txt, img2img and img2img_color.
+
+An output is keyed by the SHA-256 of the input file's bytes together with everything that
+changes the result: the converter, num_cols, the other output options, the output extension,
+the ramp and the hash of the font. When every requested size is cached the input is only read
+and hashed, never decoded, and the cached files are copied into place. Misses are decoded from
+the bytes already read.
+
+Entries are plain files under the cache directory; a hit refreshes the entry's mtime, and when
+the cache grows past its size limit the least recently used entries are removed until it is at
+90% of the limit. Entries and outputs are written to a temporary file and renamed into place,
+and the shared size and hit/miss/eviction counters in stats.json are only changed under an
+flock, so several processes (batch workers, concurrent runs) can share one cache directory:
+
+    python img2img.py --input data/input.jpg --output data/output.png --cache_dir ~/.cache/ascii-generator/results
+    python cache.py --cache_dir ~/.cache/ascii-generator/results
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# 只依赖标准库，脚本在解析参数前导入 add_cache_args 不会加载 numpy
+
+# 缓存内容的格式或转换结果改变时加一，旧条目自然失效
+CACHE_FORMAT = 1
+# 超出上限时淘汰到上限的这一比例，避免每次写入都扫描目录
+LOW_WATER = 0.9
+# 这些参数不影响单个输出的内容
+_IGNORED_ARGS = {"input", "output", "num_cols", "workers", "profile", "trace", "cache_dir", "cache_mb",
+                 "rebuild_cache"}
+_COUNTERS = ("hits", "misses", "stores", "evictions")
+
+
+def add_cache_args(parser):
+    """
+    Result cache options shared by img2txt, img2img and img2img_color.
+    """
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Reuse outputs stored in this directory for identical inputs and options (off if not given)")
+    parser.add_argument("--cache_mb", type=float, default=512, help="Size limit of the result cache in MB")
+
+
+def open_cache(args):
+    """
+    The ResultCache of --cache_dir, None when caching is off.
+    """
+    if not args.cache_dir:
+        return None
+    return ResultCache(args.cache_dir, int(args.cache_mb * 1024 * 1024))
+
+
+def output_params(script, args, converter, num_cols, output_path):
+    """
+    Everything besides the input bytes that determines one output file.
+    """
+    from utils import font_hash
+
+    params = {name: value for name, value in vars(args).items() if name not in _IGNORED_ARGS}
+    params.update(script=script, format_version=CACHE_FORMAT, num_cols=num_cols,
+                  extension=os.path.splitext(output_path)[1].lower(), ramp=converter.char_list,
+                  font=font_hash(converter.font.path), font_size=converter.font.size)
+    return params
+
+
+def lookup_outputs(script, input_path, output_paths, args, converter):
+    """
+    (cache, source, misses) for the convert_file of a script: the ResultCache or None, what to
+    decode (the input bytes, or input_path without a cache) and {index: key} of the outputs
+    still to convert, with key None without a cache. Cached outputs are already in place.
+    """
+    from profiler import profiler
+
+    cache = open_cache(args)
+    if cache is None:
+        return None, input_path, dict.fromkeys(range(len(output_paths)))
+    params = [output_params(script, args, converter, num_cols, path)
+              for num_cols, path in zip(args.num_cols, output_paths)]
+    with profiler.stage("cache"):
+        data, misses = cache.lookup(input_path, params, output_paths)
+    return cache, data, misses
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of output files, safe to share between processes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats_path = os.path.join(directory, "stats.json")
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, data_hash, params):
+        text = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256((data_hash + text).encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    @contextlib.contextmanager
+    def _locked_stats(self):
+        """
+        The shared counters, loaded under an exclusive lock and written back atomically.
+        """
+        with open(os.path.join(self.directory, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.stats_path) as stats_file:
+                    stats = json.load(stats_file)
+            except (OSError, ValueError):
+                # 第一次使用或统计文件损坏：从目录内容重新计算大小
+                stats = dict.fromkeys(_COUNTERS, 0)
+                stats["bytes"] = sum(size for _, size, _ in self._entries())
+            yield stats
+            _atomic_write(self.stats_path, json.dumps(stats).encode("utf-8"), self.directory)
+
+    def _entries(self):
+        """
+        (path, size, mtime) of every entry.
+        """
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def fetch(self, key, output_path):
+        """
+        Copy the entry of key to output_path and return True, or return False on a miss.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                data = entry_file.read()
+            # 命中时刷新修改时间，淘汰按最近使用时间进行
+            os.utime(path)
+        except FileNotFoundError:
+            with self._locked_stats() as stats:
+                stats["misses"] += 1
+            return False
+        _atomic_write(output_path, data)
+        with self._locked_stats() as stats:
+            stats["hits"] += 1
+        return True
+
+    def store(self, key, output_path):
+        """
+        Store a copy of output_path under key, then evict least recently used entries if the
+        cache is over its limit.
+        """
+        with open(output_path, "rb") as output_file:
+            data = output_file.read()
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._locked_stats() as stats:
+            try:
+                stats["bytes"] -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            _atomic_write(path, data)
+            stats["bytes"] += len(data)
+            stats["stores"] += 1
+            if stats["bytes"] > self.max_bytes:
+                self._evict(stats)
+
+    def _evict(self, stats):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes * LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            stats["evictions"] += 1
+        stats["bytes"] = total
+
+    def lookup(self, input_path, keyed_params, output_paths):
+        """
+        Read input_path once and copy every cached output into place. Returns (data, misses):
+        the input bytes, to decode from, and {index: key} of the outputs still to convert.
+        """
+        try:
+            with open(input_path, "rb") as input_file:
+                data = input_file.read()
+        except OSError:
+            # 读不了的输入不查缓存，交给解码报告原来的错误
+            return input_path, dict.fromkeys(range(len(output_paths)))
+        data_hash = hashlib.sha256(data).hexdigest()
+        misses = {}
+        for index, (params, output_path) in enumerate(zip(keyed_params, output_paths)):
+            key = self.key(data_hash, params)
+            if not self.fetch(key, output_path):
+                misses[index] = key
+        return data, misses
+
+    def stats(self):
+        with self._locked_stats() as stats:
+            stats = dict(stats)
+        stats["entries"] = len(self._entries())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def clear(self):
+        with self._locked_stats() as stats:
+            for entry in os.scandir(self.directory):
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            stats.update(dict.fromkeys(_COUNTERS, 0), bytes=0)
+
+
+def _atomic_write(path, data, directory=None):
+    """
+    Write data to a temporary file next to path (or in directory) and rename it over path.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory or os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser("Result cache statistics")
+    parser.add_argument("--cache_dir", type=str, required=True, help="Cache directory")
+    parser.add_argument("--cache_mb", type=float, default=512, help="Size limit used for the report")
+    parser.add_argument("--clear", action="store_true", help="Remove every entry and reset the counters")
+    args = parser.parse_args()
+    cache = open_cache(args)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Colored text output for img2txt: 24-bit ANSI, 256-color ANSI and HTML.
+
+Cells are taken in reading order (the newline after a row belongs to the row's last cell) and
+neighbours with the same quantized color form one run, so an escape or a <span> is only emitted
+where the color changes, also across line breaks. The whole document is built as one string.
+"""
+import html
+
+import numpy as np
+
+from terminal import RESET
+
+COLOR_FORMATS = ("ansi", "ansi256", "html")
+# xterm 256 色：16-231 为 6x6x6 色立方，232-255 为 24 级灰度
+_CUBE_LEVELS = np.array([0, 95, 135, 175, 215, 255])
+_CUBE_EDGES = (_CUBE_LEVELS[:-1] + _CUBE_LEVELS[1:]) / 2
+
+
+def quantize_colors(colors, step):
+    """
+    Round (..., 3) colors to multiples of step (clipped to 255), step 1 keeps them exact.
+    """
+    colors = np.asarray(colors, dtype=np.int32)
+    if step <= 1:
+        return colors
+    return np.minimum((colors + step // 2) // step * step, 255)
+
+
+def rgb_to_xterm256(colors):
+    """
+    Nearest xterm 256-color index (16-255) of every (..., 3) RGB color.
+    """
+    colors = np.asarray(colors, dtype=np.int32)
+    cube = np.digitize(colors, _CUBE_EDGES)
+    cube_codes = 16 + 36 * cube[..., 0] + 6 * cube[..., 1] + cube[..., 2]
+    cube_error = ((_CUBE_LEVELS[cube] - colors) ** 2).sum(axis=-1)
+    gray = np.clip(np.rint((colors.mean(axis=-1) - 8) / 10), 0, 23).astype(np.int32)
+    gray_error = ((8 + 10 * gray[..., None] - colors) ** 2).sum(axis=-1)
+    return np.where(gray_error < cube_error, 232 + gray, cube_codes)
+
+
+def color_runs(chars, codes):
+    """
+    Split a (num_rows, num_cols) char grid into runs of equal color codes.
+
+    Returns (text, offsets, run_codes): the grid as lines ending in "\\n", the start offset of
+    every run in text and the code of every run.
+    """
+    num_rows, num_cols = codes.shape
+    text = "".join("".join(row) + "\n" for row in chars.tolist())
+    flat = codes.reshape(-1)
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    # 第 i 个单元格在文本中的位置要加上它前面的换行符
+    offsets = starts + starts // num_cols
+    return text, np.append(offsets, len(text)).tolist(), flat[starts]
+
+
+def format_runs(text, offsets, run_codes, open_tags, close_tag=""):
+    """
+    Join the runs with open_tags[code] in front of each and close_tag after each.
+    """
+    tags = [open_tags[code] for code in run_codes.tolist()]
+    return "".join([tag + text[start:stop] + close_tag
+                    for tag, start, stop in zip(tags, offsets, offsets[1:])])
+
+
+def color_text(chars, colors, color_format, step=1):
+    """
+    Text of a char grid with (num_rows, num_cols, 3) RGB cell colors in color_format
+    ("ansi", "ansi256" or "html"); step quantizes 24-bit colors before runs are merged.
+    """
+    if color_format == "ansi256":
+        codes = rgb_to_xterm256(colors)
+    else:
+        rgb = quantize_colors(colors, step)
+        codes = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    text, offsets, run_codes = color_runs(chars, codes)
+    if color_format == "html":
+        return html_document(text, offsets, run_codes)
+    if color_format == "ansi256":
+        open_tags = {code: "\x1b[38;5;{}m".format(code) for code in np.unique(run_codes).tolist()}
+    else:
+        open_tags = {code: "\x1b[38;2;{};{};{}m".format(code >> 16, (code >> 8) & 255, code & 255)
+                     for code in np.unique(run_codes).tolist()}
+    return format_runs(text, offsets, run_codes, open_tags) + RESET
+
+
+def html_document(text, offsets, run_codes):
+    """
+    Standalone HTML page: one CSS class per color, one <span> per run inside a <pre>.
+    """
+    codes = np.unique(run_codes).tolist()
+    classes = {code: "c{:x}".format(index) for index, code in enumerate(codes)}
+    styles = "".join(".{}{{color:#{:06x}}}".format(classes[code], code) for code in codes)
+    open_tags = {code: '<span class="{}">'.format(name) for code, name in classes.items()}
+    # 转义每个颜色段中的 &、<、>，分段后再转义不会切断实体
+    body = "".join([open_tags[code] + html.escape(text[start:stop], quote=False) + "</span>"
+                    for code, start, stop in zip(run_codes.tolist(), offsets, offsets[1:])])
+    return ("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><style>"
+            "body{background:#000}pre{font-family:monospace;line-height:1}" + styles +
+            "</style></head><body><pre>" + body + "</pre></body></html>\n")
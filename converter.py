@@ -0,0 +1,279 @@
+"""
+Importable image to ASCII conversion. A Converter is built once from (language, mode, font,
+num_cols, background) and converts numpy images into text, grayscale ASCII images and color
+ASCII images, reusing its font, ramp, lookup table and glyph atlas across calls:
+
+    import cv2
+    from converter import Converter
+
+    converter = Converter(language="english", num_cols=120)
+    image = cv2.imread("data/input.jpg")
+    text = converter.to_text(image)
+    converter.to_image(image).save("data/output.png")
+    converter.to_color_image(image).save("data/output_color.png")
+
+Images are BGR arrays as cv2.imread returns them; to_text and to_image also take 2-D grayscale
+arrays. img2txt, img2img and img2img_color are command-line wrappers around this class. Only
+numpy is imported with this module; cv2, PIL and the renderer are loaded on first use.
+"""
+import numpy as np
+
+from profiler import profiler
+from utils import get_data, cell_means, cell_sums, build_char_lut, build_tone_curve, map_brightness
+
+
+def grayscale(image):
+    """
+    Grayscale version of a BGR image; 2-D images are returned unchanged.
+    """
+    if image.ndim == 2:
+        return image
+    import cv2
+
+    with profiler.stage("grayscale"):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def cell_colors(image, num_rows, num_cols, cell_width, cell_height, table=None):
+    """
+    Rounded mean RGB color (num_rows, num_cols, 3) of every cell of a BGR image.
+    """
+    if table is not None:
+        sums, counts = table.cell_sums(num_rows, num_cols, cell_width, cell_height)
+    else:
+        sums, counts = cell_sums(image, num_rows, num_cols, cell_width, cell_height)
+    return np.rint(sums[:, :, ::-1] / counts[:, :, None]).astype(np.int32)
+
+
+def crop_background(image, background):
+    """
+    Crop a PIL image to the bounding box of everything that differs from the background.
+    """
+    from PIL import ImageOps
+
+    if background == "white":
+        return image.crop(ImageOps.invert(image).getbbox())
+    return image.crop(image.getbbox())
+
+
+class Converter:
+    """
+    Image to ASCII converter holding everything that does not depend on the image.
+
+    The methods take the image and optionally num_cols (the converter's num_cols otherwise).
+    size, decode_scale and table are for images decoded at reduced size: size is the (width,
+    height) of the original, from which the grid is computed, decode_scale the reduction, and
+    table a SummedAreaTable of the image shared by several sizes.
+
+    match "brightness" picks characters from the mean brightness of each cell, "shape" from the
+    cell downsampled to a patch_width wide patch compared with the glyph bitmaps (see shapes);
+    dither only applies to brightness mode.
+    """
+
+    def __init__(self, language="english", mode="standard", font=None, num_cols=300, background="black",
+                 font_size=None, gamma=1.0, contrast=1.0, dither=False, renderer="atlas", rebuild_cache=False,
+                 match="brightness", patch_width=8):
+        char_list, self.font, self.sample_character, self.scale = get_data(language, mode, rebuild_cache, font,
+                                                                           font_size)
+        if char_list is None:
+            raise ValueError("Invalid language or mode: {} {}".format(language, mode))
+        if match not in ("brightness", "shape"):
+            raise ValueError("Invalid match: {}".format(match))
+        self.char_list = char_list
+        self.chars = np.array(list(char_list))
+        self.lut = build_char_lut(len(char_list), gamma, contrast)
+        self.gamma = gamma
+        self.contrast = contrast
+        self.num_cols = num_cols
+        self.background = background
+        self.bg_code = 255 if background == "white" else 0
+        self.bg_color = (self.bg_code,) * 3
+        self.dither = dither
+        self.renderer = renderer
+        self.atlas = None
+        self.match = match
+        self.patch_width = patch_width
+        self.matcher = None
+
+    def load_atlas(self):
+        """
+        GlyphAtlas of the ramp, built on the first call; None with the "pil" renderer.
+        """
+        if self.atlas is None and self.renderer == "atlas":
+            from renderer import GlyphAtlas
+
+            self.atlas = GlyphAtlas(self.char_list, self.font, self.sample_character)
+        return self.atlas
+
+    def load_matcher(self):
+        """
+        ShapeMatcher of the ramp's glyphs, built on the first call; None in brightness mode.
+        """
+        if self.matcher is None and self.match == "shape":
+            from renderer import GlyphAtlas
+            from shapes import ShapeMatcher
+
+            # 文本输出和 pil 渲染器没有字形图集，只为匹配栅格化一次
+            atlas = self.load_atlas() or GlyphAtlas(self.char_list, self.font, self.sample_character)
+            tone = None
+            if self.gamma != 1.0 or self.contrast != 1.0:
+                tone = build_tone_curve(self.gamma, self.contrast)
+            # 补丁与单元格同样是宽的 scale 倍高
+            self.matcher = ShapeMatcher(atlas, self.patch_width, self.scale, tone)
+        return self.matcher
+
+    def grid(self, width, height, num_cols=None):
+        """
+        (num_rows, num_cols, cell_width, cell_height) over a width x height image, with cells
+        scale times taller than wide. Too many columns or rows fall back to 6x12 pixel cells.
+        """
+        num_cols = num_cols or self.num_cols
+        cell_width = width / num_cols
+        cell_height = self.scale * cell_width
+        num_rows = int(height / cell_height)
+        if num_cols > width or num_rows > height:
+            print("Too many columns or rows. Using default settings.")
+            cell_width, cell_height = 6, 12
+            num_cols = int(width / cell_width)
+            num_rows = int(height / cell_height)
+        return num_rows, num_cols, cell_width, cell_height
+
+    def _cells(self, image, num_cols, size, decode_scale):
+        if size is None:
+            size = image.shape[1], image.shape[0]
+        num_rows, num_cols, cell_width, cell_height = self.grid(size[0], size[1], num_cols)
+        # 网格按原图计算，单元格尺寸换算到解码后的图像上
+        return num_rows, num_cols, cell_width / decode_scale, cell_height / decode_scale
+
+    def char_indices(self, image, num_cols=None, size=None, decode_scale=1, table=None):
+        """
+        (char_indices, cell_width, cell_height): the ramp index of every cell, from its mean
+        brightness, and the cell size on the image.
+        """
+        gray_image = grayscale(image)
+        num_rows, num_cols, cell_width, cell_height = self._cells(gray_image, num_cols, size, decode_scale)
+        if self.match == "shape":
+            matcher = self.load_matcher()
+            with profiler.stage("char_map"):
+                return matcher.match(gray_image, num_rows, num_cols, cell_width, cell_height), cell_width, cell_height
+        with profiler.stage("cell_average"):
+            if table is not None:
+                avg_brightness = table.cell_means(num_rows, num_cols, cell_width, cell_height)
+            else:
+                avg_brightness = cell_means(gray_image, num_rows, num_cols, cell_width, cell_height)
+        with profiler.stage("char_map"):
+            return map_brightness(avg_brightness, self.lut, self.dither), cell_width, cell_height
+
+    def color_cells(self, image, num_cols=None, size=None, decode_scale=1, table=None):
+        """
+        (char_indices, colors) of a BGR image: the ramp index of every cell from the mean of all
+        its channels (from its grayscale patch in shape mode), and its RGB color, the channel sums
+        divided by the nominal cell area.
+        """
+        num_rows, num_cols, cell_width, cell_height = self._cells(image, num_cols, size, decode_scale)
+        with profiler.stage("cell_average"):
+            if table is not None:
+                sums, counts = table.cell_sums(num_rows, num_cols, cell_width, cell_height)
+            else:
+                sums, counts = cell_sums(image, num_rows, num_cols, cell_width, cell_height)
+            # 通道倒序即为 RGB，亮度是三个通道之和，与通道顺序无关，不需要先转换整张图
+            colors = (sums[:, :, ::-1] / (cell_height * cell_width)).astype(np.int32)
+        if self.match == "shape":
+            matcher = self.load_matcher()
+            gray_image = grayscale(image)
+            with profiler.stage("char_map"):
+                return matcher.match(gray_image, num_rows, num_cols, cell_width, cell_height), colors
+        with profiler.stage("char_map"):
+            return map_brightness(sums.sum(axis=2) / (counts * 3), self.lut, self.dither), colors
+
+    def to_chars(self, image, num_cols=None, size=None, decode_scale=1, table=None):
+        """
+        (chars, cell_width, cell_height) with chars the (num_rows, num_cols) array of characters.
+        """
+        char_indices, cell_width, cell_height = self.char_indices(image, num_cols, size, decode_scale, table)
+        with profiler.stage("char_map"):
+            return self.chars[char_indices], cell_width, cell_height
+
+    def to_text(self, image, num_cols=None, color_format="text", color_step=8, size=None, decode_scale=1,
+                table=None, color_table=None, gray_image=None):
+        """
+        The ASCII art as one string of lines ending in "\\n". color_format "ansi", "ansi256" or
+        "html" colors every character with its cell's mean color, which needs a BGR image;
+        color_step quantizes 24-bit colors. gray_image is the image already in grayscale and
+        color_table a SummedAreaTable of the color image.
+        """
+        chars, cell_width, cell_height = self.to_chars(image if gray_image is None else gray_image, num_cols, size,
+                                                       decode_scale, table)
+        if color_format == "text":
+            return "".join("".join(row) + "\n" for row in chars.tolist())
+        from colortext import color_text
+
+        with profiler.stage("cell_color"):
+            colors = cell_colors(image, chars.shape[0], chars.shape[1], cell_width, cell_height, color_table)
+        with profiler.stage("format"):
+            return color_text(chars, colors, color_format, color_step)
+
+    def to_image(self, image, num_cols=None, size=None, decode_scale=1, table=None):
+        """
+        Grayscale ASCII art as a PIL image cropped to the drawn characters.
+        """
+        char_indices = self.char_indices(image, num_cols, size, decode_scale, table)[0]
+        with profiler.stage("draw"):
+            out_image = self.render(char_indices)
+        with profiler.stage("crop"):
+            return crop_background(out_image, self.background)
+
+    def to_color_image(self, image, num_cols=None, size=None, decode_scale=1, table=None):
+        """
+        Color ASCII art of a BGR image as an RGB PIL image cropped to the drawn characters.
+        """
+        char_indices, colors = self.color_cells(image, num_cols, size, decode_scale, table)
+        with profiler.stage("draw"):
+            out_image = self.render_color(char_indices, colors)
+        with profiler.stage("crop"):
+            return crop_background(out_image, self.background)
+
+    def output_size(self, grid_shape):
+        """
+        (width, height) of the color image of a (num_rows, num_cols) grid.
+        """
+        char_width, char_height = self.font.getsize(self.sample_character)
+        return char_width * grid_shape[1], self.scale * char_height * grid_shape[0]
+
+    def render(self, char_indices):
+        """
+        Uncropped grayscale image of a grid of ramp indices.
+        """
+        atlas = self.load_atlas()
+        if atlas is not None:
+            return atlas.render(char_indices, 255 - self.bg_code, self.bg_code)
+        from PIL import Image, ImageDraw
+
+        num_rows, num_cols = char_indices.shape
+        char_width, char_height = self.font.getsize(self.sample_character)
+        out_image = Image.new("L", (char_width * num_cols, char_height * num_rows), self.bg_code)
+        draw = ImageDraw.Draw(out_image)
+        chars = self.chars[char_indices]
+        for i in range(num_rows):
+            draw.text((0, i * char_height), "".join(chars[i]), fill=255 - self.bg_code, font=self.font)
+        return out_image
+
+    def render_color(self, char_indices, colors):
+        """
+        Uncropped RGB image of a grid of ramp indices drawn in (num_rows, num_cols, 3) colors.
+        """
+        size = self.output_size(char_indices.shape)
+        atlas = self.load_atlas()
+        if atlas is not None:
+            return atlas.render_color(char_indices, colors, self.bg_color, size)
+        from PIL import Image, ImageDraw
+
+        out_image = Image.new("RGB", size, self.bg_color)
+        draw = ImageDraw.Draw(out_image)
+        char_width, char_height = self.font.getsize(self.sample_character)
+        num_rows, num_cols = char_indices.shape
+        for i in range(num_rows):
+            for j in range(num_cols):
+                draw.text((j * char_width, i * char_height), self.char_list[char_indices[i, j]],
+                          fill=tuple(colors[i, j].tolist()), font=self.font)
+        return out_image
@@ -1,8 +1,9 @@
 import argparse
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageOps
-from utils import get_data
+import os
+
+from cache import add_cache_args
+
+# 转换用到的 numpy、cv2、PIL 等在解析完参数后才导入，--help 和参数错误时不加载
 
 
 def get_args():
@@ -10,104 +11,137 @@ def get_args():
     解析命令行参数
     """
     parser = argparse.ArgumentParser(description="Convert an image to ASCII art.")
-    parser.add_argument("--input", type=str, default="data/input.jpg", help="Path to input image")
-    parser.add_argument("--output", type=str, default="data/output.jpg", help="Path to output image file")
+    parser.add_argument("--input", type=str, default="data/input.jpg",
+                        help="Path to input image, or a directory, glob or .txt/.lst file list for batch mode")
+    parser.add_argument("--output", type=str, default="data/output.jpg",
+                        help="Path to output image file (output directory in batch mode)")
     parser.add_argument("--language", type=str, default="english", help="Language for ASCII characters")
     parser.add_argument("--mode", type=str, default="standard", help="Mode for ASCII conversion")
     parser.add_argument("--background", type=str, default="black", choices=["black", "white"],
                         help="Background color for the output image")
-    parser.add_argument("--num_cols", type=int, default=300, help="Number of characters for output's width")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[300],
+                        help="Number of characters for output's width; several values share one decode and "
+                             "write one file each, suffixed with _<num_cols>")
+    parser.add_argument("--renderer", type=str, default="atlas", choices=["atlas", "pil"],
+                        help="Glyph atlas compositing or per-line PIL text drawing")
+    parser.add_argument("--gamma", type=float, default=1.0, help="Gamma curve applied to cell brightness")
+    parser.add_argument("--contrast", type=float, default=1.0, help="Contrast stretch around mid-gray")
+    parser.add_argument("--dither", action="store_true", help="Ordered dithering between neighbouring characters")
+    parser.add_argument("--match", type=str, default="brightness", choices=["brightness", "shape"],
+                        help="Pick characters by cell brightness, or by comparing the cell's shape with the glyphs "
+                             "(sharper edges and lines)")
+    parser.add_argument("--rebuild_cache", action="store_true",
+                        help="Re-measure the character ramp instead of using the cached one")
+    parser.add_argument("--decode_scale", type=int, default=0, choices=[0, 1, 2, 4, 8],
+                        help="Decode large inputs reduced by this factor (0 picks it from the grid, 1 decodes at full size)")
+    parser.add_argument("--strip_rows", type=int, default=0,
+                        help="Stream PNG/TIFF output this many text rows at a time to bound memory (atlas renderer, 0 = off)")
+    add_cache_args(parser)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes in batch mode (default: one per CPU, 0 runs in this process)")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        help="Report per-stage timings and peak RSS, and write them to this JSON file")
+    parser.add_argument("--trace", type=str, default=None, help="Also write a Chrome trace-event file (with --profile)")
     return parser.parse_args()
 
 
-def preprocess_image(image_path, num_cols):
+def load_resources(args):
     """
-    读取和预处理图像，将其转换为灰度图像。
+    创建转换器（字符列表、字体、字形图集和查找表），批处理时每个进程只创建一次。
     """
-    image = cv2.imread(image_path)
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    height, width = gray_image.shape
-    cell_width = width / num_cols
-    return gray_image, cell_width, height, width
+    from converter import Converter
 
+    converter = Converter(args.language, args.mode, background=args.background, gamma=args.gamma,
+                          contrast=args.contrast, dither=args.dither, renderer=args.renderer,
+                          rebuild_cache=args.rebuild_cache, match=args.match)
+    converter.load_atlas()
+    converter.load_matcher()
+    return converter
 
-def calculate_num_rows(height, cell_width, scale):
-    """
-    根据图像高度和单元格宽度计算行数。
-    """
-    cell_height = scale * cell_width
-    num_rows = int(height / cell_height)
-    return num_rows, cell_height
 
-
-def create_output_image(char_list, font, sample_character, num_cols, num_rows, image, cell_width, cell_height, bg_code):
+def convert_file(input_path, output_path, args, resources):
     """
-    创建 ASCII 艺术图像。
+    将一张图像转换为 ASCII 艺术图像并保存，每个列数一张，返回输出路径列表。
     """
-    num_chars = len(char_list)
-    char_width, char_height = font.getsize(sample_character)
-    out_width = char_width * num_cols
-    out_height = char_height * num_rows
-    out_image = Image.new("L", (out_width, out_height), bg_code)
-    draw = ImageDraw.Draw(out_image)
-
-    for i in range(num_rows):
-        line = ""
-        for j in range(num_cols):
-            cell = image[int(i * cell_height):min(int((i + 1) * cell_height), image.shape[0]),
-                         int(j * cell_width):min(int((j + 1) * cell_width), image.shape[1])]
-            avg_brightness = np.mean(cell)
-            char_index = min(int(avg_brightness / 255 * num_chars), num_chars - 1)
-            line += char_list[char_index]
-        draw.text((0, i * char_height), line, fill=255 - bg_code, font=font)
-
-    return out_image
-
-
-def crop_output_image(out_image, background):
+    from profiler import profiler
+    from utils import load_image_for_grid, SummedAreaTable, size_output_path
+    from converter import grayscale
+    from cache import lookup_outputs
+
+    converter = resources
+    output_paths = [size_output_path(output_path, num_cols, len(args.num_cols)) for num_cols in args.num_cols]
+
+    # 结果缓存：命中的输出直接复制到位，全部命中时只读取输入求哈希，不解码
+    cache, source, misses = lookup_outputs("img2img", input_path, output_paths, args, converter)
+    if not misses:
+        return output_paths
+
+    # 读取图像并转换为灰度图像，解码的缩小倍数按最细的网格选择
+    with profiler.stage("read"):
+        image, (width, height), decode_scale = load_image_for_grid(
+            source, max(args.num_cols[index] for index in misses), converter.scale, args.decode_scale)
+    if image is None:
+        raise ValueError("Cannot read image {}".format(input_path))
+    gray_image = grayscale(image)
+
+    # 多个列数时只建一次积分图，之后每个尺寸的单元格平均值都是 O(1) 查表
+    table = None
+    if len(misses) > 1:
+        with profiler.stage("integral"):
+            table = SummedAreaTable(gray_image)
+    for index, key in misses.items():
+        convert_size(gray_image, width, height, decode_scale, args.num_cols[index], output_paths[index], args,
+                     converter, table)
+        if key is not None:
+            with profiler.stage("cache"):
+                cache.store(key, output_paths[index])
+    return output_paths
+
+
+def convert_size(gray_image, width, height, decode_scale, num_cols, output_path, args, converter, table=None):
     """
-    根据背景颜色裁剪输出图像。
+    按 num_cols 列生成一张 ASCII 艺术图像并保存。width 和 height 为原图尺寸。
     """
-    if background == "white":
-        cropped_image = ImageOps.invert(out_image).getbbox()
-    else:
-        cropped_image = out_image.getbbox()
-    return out_image.crop(cropped_image)
-
+    from profiler import profiler
 
-def main():
-    # 获取参数
-    args = get_args()
+    # 分条渲染：按行条直接写入 PNG/TIFF 编码器，裁剪范围由字形墨迹范围计算，不生成整张画布
+    if args.strip_rows > 0 and converter.load_atlas() is not None:
+        from strips import save_strips, STRIP_FORMATS
 
-    # 设置背景颜色代码
-    bg_code = 255 if args.background == "white" else 0
+        if os.path.splitext(output_path)[1].lower() not in STRIP_FORMATS:
+            raise ValueError("--strip_rows needs a .png or .tif output, got {}".format(output_path))
+        char_indices = converter.char_indices(gray_image, num_cols, (width, height), decode_scale, table)[0]
+        atlas = converter.atlas
+        size = (atlas.char_width * char_indices.shape[1], atlas.char_height * char_indices.shape[0])
+        with profiler.stage("draw"):
+            save_strips(output_path, atlas, char_indices, 255 - converter.bg_code, converter.bg_code, size,
+                        args.strip_rows)
+        return
 
-    # 获取字符列表、字体和缩放参数
-    char_list, font, sample_character, scale = get_data(args.language, args.mode)
+    # 创建并裁剪输出图像
+    out_image = converter.to_image(gray_image, num_cols, (width, height), decode_scale, table)
 
-    # 预处理图像
-    gray_image, cell_width, height, width = preprocess_image(args.input, args.num_cols)
+    # 保存输出图像
+    with profiler.stage("save"):
+        out_image.save(output_path)
 
-    # 计算行数
-    num_rows, cell_height = calculate_num_rows(height, cell_width, scale)
 
-    # 如果列数或行数超出图像尺寸，使用默认设置
-    if args.num_cols > width or num_rows > height:
-        print("Too many columns or rows. Using default settings.")
-        cell_width, cell_height = 6, 12
-        args.num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
+def main():
+    # 获取参数
+    args = get_args()
+    from profiler import profiler
+    from batch import is_batch_input, run_batch
 
-    # 创建输出图像
-    out_image = create_output_image(char_list, font, sample_character, args.num_cols, num_rows,
-                                    gray_image, cell_width, cell_height, bg_code)
+    if args.profile:
+        profiler.enable(args.profile, args.trace)
 
-    # 裁剪输出图像
-    cropped_image = crop_output_image(out_image, args.background)
+    # 目录、通配符或文件列表：批量转换，输出按相对路径镜像到输出目录
+    if is_batch_input(args.input):
+        run_batch(args.input, args.output, load_resources, convert_file, args, args.workers)
+        return
 
-    # 保存输出图像
-    cropped_image.save(args.output)
+    convert_file(args.input, args.output, args, load_resources(args))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
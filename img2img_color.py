@@ -1,95 +1,131 @@
 import argparse
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageOps
-from utils import get_data
+import os
+
+from cache import add_cache_args
+
+# 转换用到的 numpy、cv2、PIL 等在解析完参数后才导入，--help 和参数错误时不加载
 
 # 获取命令行参数
 def get_args():
     parser = argparse.ArgumentParser("Image to ASCII")
-    parser.add_argument("--input", type=str, default="data/input.jpg", help="Path to input image")
-    parser.add_argument("--output", type=str, default="data/output.jpg", help="Path to output text file")
+    parser.add_argument("--input", type=str, default="data/input.jpg",
+                        help="Path to input image, or a directory, glob or .txt/.lst file list for batch mode")
+    parser.add_argument("--output", type=str, default="data/output.jpg",
+                        help="Path to output text file (output directory in batch mode)")
     parser.add_argument("--language", type=str, default="english", help="Language for ASCII characters")
     parser.add_argument("--mode", type=str, default="standard", help="Mode for ASCII character set")
     parser.add_argument("--background", type=str, default="black", choices=["black", "white"], help="Background color")
-    parser.add_argument("--num_cols", type=int, default=300, help="Number of characters for output's width")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[300],
+                        help="Number of characters for output's width; several values share one decode and "
+                             "write one file each, suffixed with _<num_cols>")
     parser.add_argument("--scale", type=int, default=2, help="Upsize output")
+    parser.add_argument("--renderer", type=str, default="atlas", choices=["atlas", "pil"],
+                        help="Glyph atlas compositing or per-character PIL text drawing")
+    parser.add_argument("--gamma", type=float, default=1.0, help="Gamma curve applied to cell brightness")
+    parser.add_argument("--contrast", type=float, default=1.0, help="Contrast stretch around mid-gray")
+    parser.add_argument("--dither", action="store_true", help="Ordered dithering between neighbouring characters")
+    parser.add_argument("--match", type=str, default="brightness", choices=["brightness", "shape"],
+                        help="Pick characters by cell brightness, or by comparing the cell's shape with the glyphs "
+                             "(sharper edges and lines)")
+    parser.add_argument("--rebuild_cache", action="store_true",
+                        help="Re-measure the character ramp instead of using the cached one")
+    parser.add_argument("--decode_scale", type=int, default=0, choices=[0, 1, 2, 4, 8],
+                        help="Decode large inputs reduced by this factor (0 picks it from the grid, 1 decodes at full size)")
+    parser.add_argument("--strip_rows", type=int, default=0,
+                        help="Stream PNG/TIFF output this many text rows at a time to bound memory (atlas renderer, 0 = off)")
+    add_cache_args(parser)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes in batch mode (default: one per CPU, 0 runs in this process)")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        help="Report per-stage timings and peak RSS, and write them to this JSON file")
+    parser.add_argument("--trace", type=str, default=None, help="Also write a Chrome trace-event file (with --profile)")
     return parser.parse_args()
 
-# 获取背景颜色代码
-def get_background_code(background):
-    if background == "white":
-        return (255, 255, 255)
-    return (0, 0, 0)
-
-# 计算图像分块尺寸
-def calculate_cell_size(image_width, image_height, num_cols, scale):
-    cell_width = image_width / num_cols
-    cell_height = scale * cell_width
-    num_rows = int(image_height / cell_height)
-    return cell_width, cell_height, num_rows
-
-# 处理分块数量超出图像尺寸的情况
-def handle_excessive_cells(width, height, num_cols, num_rows):
-    if num_cols > width or num_rows > height:
-        print("Too many columns or rows. Using default settings.")
-        cell_width = 6
-        cell_height = 12
-        num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
-    return num_cols, num_rows
-
-# 绘制ASCII字符图像
-def draw_ascii_image(image, draw, char_list, num_chars, num_cols, num_rows, cell_width, cell_height, char_width, char_height, font):
-    for i in range(num_rows):
-        for j in range(num_cols):
-            partial_image = image[int(i * cell_height):min(int((i + 1) * cell_height), image.shape[0]),
-                                  int(j * cell_width):min(int((j + 1) * cell_width), image.shape[1]), :]
-            partial_avg_color = np.sum(np.sum(partial_image, axis=0), axis=0) / (cell_height * cell_width)
-            partial_avg_color = tuple(partial_avg_color.astype(np.int32).tolist())
-            char = char_list[min(int(np.mean(partial_image) * num_chars / 255), num_chars - 1)]
-            draw.text((j * char_width, i * char_height), char, fill=partial_avg_color, font=font)
+# 创建转换器（字符集、字体、字形图集和查找表），批处理时每个进程只创建一次
+def load_resources(opt):
+    from converter import Converter
+
+    converter = Converter(opt.language, opt.mode, background=opt.background, gamma=opt.gamma,
+                          contrast=opt.contrast, dither=opt.dither, renderer=opt.renderer,
+                          rebuild_cache=opt.rebuild_cache, match=opt.match)
+    converter.load_atlas()
+    converter.load_matcher()
+    return converter
+
+# 转换一张图像并保存，每个列数一张，返回输出路径列表
+def convert_file(input_path, output_path, opt, resources):
+    from profiler import profiler
+    from utils import load_image_for_grid, SummedAreaTable, size_output_path
+    from cache import lookup_outputs
+
+    converter = resources
+    output_paths = [size_output_path(output_path, num_cols, len(opt.num_cols)) for num_cols in opt.num_cols]
+
+    # 结果缓存：命中的输出直接复制到位，全部命中时只读取输入求哈希，不解码
+    cache, source, misses = lookup_outputs("img2img_color", input_path, output_paths, opt, converter)
+    if not misses:
+        return output_paths
+
+    # 读取图像，大图在解码时缩小（按最细的网格选择），网格仍按原图尺寸计算
+    # 颜色按 BGR 求和后再倒序为 RGB，不需要转换整张图像
+    with profiler.stage("read"):
+        image, (width, height), decode_scale = load_image_for_grid(
+            source, max(opt.num_cols[index] for index in misses), converter.scale, opt.decode_scale)
+    if image is None:
+        raise ValueError("Cannot read image {}".format(input_path))
+
+    # 多个列数时只建一次积分图，之后每个尺寸的单元格平均值都是 O(1) 查表
+    table = None
+    if len(misses) > 1:
+        with profiler.stage("integral"):
+            table = SummedAreaTable(image)
+    for index, key in misses.items():
+        convert_size(image, width, height, decode_scale, opt.num_cols[index], output_paths[index], opt, converter,
+                     table)
+        if key is not None:
+            with profiler.stage("cache"):
+                cache.store(key, output_paths[index])
+    return output_paths
+
+# 按 num_cols 列生成一张彩色 ASCII 图像并保存，width 和 height 为原图尺寸
+def convert_size(image, width, height, decode_scale, num_cols, output_path, opt, converter, table=None):
+    import numpy as np
+    from profiler import profiler
+
+    # 分条渲染：按行条直接写入 PNG/TIFF 编码器，颜色与背景相同的字符不计入裁剪范围
+    if opt.strip_rows > 0 and converter.load_atlas() is not None:
+        from strips import save_strips, STRIP_FORMATS
+
+        if os.path.splitext(output_path)[1].lower() not in STRIP_FORMATS:
+            raise ValueError("--strip_rows needs a .png or .tif output, got {}".format(output_path))
+        char_indices, avg_colors = converter.color_cells(image, num_cols, (width, height), decode_scale, table)
+        visible = (np.clip(avg_colors, 0, 255) != converter.bg_color).any(axis=2)
+        with profiler.stage("draw"):
+            save_strips(output_path, converter.atlas, char_indices, avg_colors, converter.bg_color,
+                        converter.output_size(char_indices.shape), opt.strip_rows, visible)
+        return
+
+    # 创建、剪裁输出图像并保存
+    out_image = converter.to_color_image(image, num_cols, (width, height), decode_scale, table)
+    with profiler.stage("save"):
+        out_image.save(output_path)
 
 # 主函数
 def main():
     # 获取参数
     opt = get_args()
+    from profiler import profiler
+    from batch import is_batch_input, run_batch
+
+    if opt.profile:
+        profiler.enable(opt.profile, opt.trace)
+
+    # 目录、通配符或文件列表：批量转换，输出按相对路径镜像到输出目录
+    if is_batch_input(opt.input):
+        run_batch(opt.input, opt.output, load_resources, convert_file, opt, opt.workers)
+        return
 
-    # 设置背景颜色代码
-    bg_code = get_background_code(opt.background)
-
-    # 获取字符集、字体等数据
-    char_list, font, sample_character, scale = get_data(opt.language, opt.mode)
-    num_chars = len(char_list)
-
-    # 读取图像并转换为RGB格式
-    image = cv2.imread(opt.input, cv2.IMREAD_COLOR)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    # 计算图像分块尺寸
-    cell_width, cell_height, num_rows = calculate_cell_size(image.shape[1], image.shape[0], opt.num_cols, scale)
-    num_cols = opt.num_cols
-
-    # 处理分块数量超出图像尺寸的情况
-    num_cols, num_rows = handle_excessive_cells(image.shape[1], image.shape[0], num_cols, num_rows)
-
-    # 计算输出图像尺寸
-    char_width, char_height = font.getsize(sample_character)
-    out_width = char_width * num_cols
-    out_height = scale * char_height * num_rows
-
-    # 创建输出图像并绘制ASCII字符
-    out_image = Image.new("RGB", (out_width, out_height), bg_code)
-    draw = ImageDraw.Draw(out_image)
-    draw_ascii_image(image, draw, char_list, num_chars, num_cols, num_rows, cell_width, cell_height, char_width, char_height, font)
-
-    # 剪裁输出图像并保存
-    if opt.background == "white":
-        cropped_image = ImageOps.invert(out_image).getbbox()
-    else:
-        cropped_image = out_image.getbbox()
-    out_image = out_image.crop(cropped_image)
-    out_image.save(opt.output)
+    convert_file(opt.input, opt.output, opt, load_resources(opt))
 
 # 启动程序
 if __name__ == '__main__':
@@ -1,92 +1,120 @@
 import argparse
-import cv2
-import numpy as np
+
+from cache import add_cache_args
+
+# 转换用到的 numpy、cv2、PIL 等在解析完参数后才导入，--help 和参数错误时不加载
 
 def get_args():
     """
     解析命令行参数
     """
     parser = argparse.ArgumentParser(description="将图像转换为 ASCII 字符画")
-    parser.add_argument("--input", type=str, default="data/input.jpg", help="输入图像的路径")
-    parser.add_argument("--output", type=str, default="data/output.txt", help="输出文本文件的路径")
+    parser.add_argument("--input", type=str, default="data/input.jpg",
+                        help="输入图像的路径，也可以是目录、通配符或 .txt/.lst 文件列表（批量模式）")
+    parser.add_argument("--output", type=str, default="data/output.txt", help="输出文本文件的路径（批量模式下为输出目录）")
     parser.add_argument("--mode", type=str, default="complex", choices=["simple", "complex"],
                         help="字符集模式：简单模式(10个字符)或复杂模式(70个字符)")
-    parser.add_argument("--num_cols", type=int, default=150, help="输出字符画的宽度(列数)")
+    parser.add_argument("--num_cols", type=int, nargs="+", default=[150],
+                        help="输出字符画的宽度(列数)，可以给出多个，共用一次解码，输出文件名加上 _列数 后缀")
+    parser.add_argument("--gamma", type=float, default=1.0, help="亮度的伽马曲线")
+    parser.add_argument("--contrast", type=float, default=1.0, help="以中灰为中心的对比度拉伸")
+    parser.add_argument("--dither", action="store_true", help="在相邻字符之间使用有序抖动")
+    parser.add_argument("--match", type=str, default="brightness", choices=["brightness", "shape"],
+                        help="字符选择方式：按单元格平均亮度，或按单元格缩小后的形状与字形比较（边缘和线条更清晰）")
+    parser.add_argument("--format", type=str, default="text", choices=["text", "ansi", "ansi256", "html"],
+                        help="输出格式：纯文本、24 位 ANSI 彩色、256 色 ANSI 或 HTML，颜色为单元格平均颜色")
+    parser.add_argument("--color_step", type=int, default=8,
+                        help="24 位颜色（ansi/html）的量化步长，相邻同色单元格合并为一个转义序列或 <span>，1 表示不量化")
+    parser.add_argument("--decode_scale", type=int, default=0, choices=[0, 1, 2, 4, 8],
+                        help="大图解码时的缩小倍数（0 表示根据网格自动选择，1 表示按原尺寸解码）")
+    add_cache_args(parser)
+    parser.add_argument("--workers", type=int, default=None, help="批量模式的进程数（默认每个 CPU 一个，0 表示在当前进程中运行）")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        help="统计各阶段耗时和峰值内存，并写入该 JSON 文件")
+    parser.add_argument("--trace", type=str, default=None, help="同时写出 Chrome trace-event 文件（需配合 --profile）")
     return parser.parse_args()
 
-def get_char_list(mode):
+def save_text(text, output_path):
     """
-    根据模式返回字符列表
+    一次写入整个文本
     """
-    if mode == "simple":
-        return '@%#*+=-:. '
-    else:
-        return "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\\|()1{}[]?-_+~<>i!lI;:,\"^`'. "
+    with open(output_path, 'w', encoding='utf-8') as output_file:
+        output_file.write(text)
 
-def convert_image_to_ascii(image, char_list, num_cols):
+def load_resources(args):
     """
-    将图像转换为 ASCII 字符画
+    创建转换器（字符列表、查找表和形状匹配的字形），批量模式下每个进程只创建一次
     """
-    # 将图像转换为灰度图像
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # 计算每个单元格的宽度和高度
-    height, width = gray_image.shape
-    cell_width = width / num_cols
-    cell_height = 2 * cell_width
-    num_rows = int(height / cell_height)
+    from converter import Converter
 
-    # 检查列数和行数是否合适
-    if num_cols > width or num_rows > height:
-        print("列数或行数过多，使用默认设置")
-        cell_width = 6
-        cell_height = 12
-        num_cols = int(width / cell_width)
-        num_rows = int(height / cell_height)
-    
-    # 将图像转换为 ASCII 字符
-    ascii_art = []
-    num_chars = len(char_list)
-    for i in range(num_rows):
-        row = ""
-        for j in range(num_cols):
-            # 计算当前单元格的平均灰度值
-            cell = gray_image[int(i * cell_height):min(int((i + 1) * cell_height), height),
-                              int(j * cell_width):min(int((j + 1) * cell_width), width)]
-            avg_brightness = np.mean(cell)
-            char_index = min(int(avg_brightness * num_chars / 255), num_chars - 1)
-            row += char_list[char_index]
-        ascii_art.append(row)
-    
-    return ascii_art
+    # 简单/复杂模式即 general 字母表中按手工顺序排列的字符
+    converter = Converter("general", args.mode, gamma=args.gamma, contrast=args.contrast, dither=args.dither,
+                          match=args.match)
+    converter.load_matcher()
+    return converter
 
-def save_ascii_art(ascii_art, output_path):
+def convert_file(input_path, output_path, args, resources):
     """
-    将 ASCII 字符画保存到文本文件
+    转换一张图像并保存为文本文件，每个列数一个文件，返回输出路径列表
     """
-    with open(output_path, 'w') as output_file:
-        for row in ascii_art:
-            output_file.write(row + "\n")
+    from profiler import profiler
+    from utils import load_image_for_grid, SummedAreaTable, size_output_path
+    from converter import grayscale
+    from cache import lookup_outputs
+
+    converter = resources
+    output_paths = [size_output_path(output_path, num_cols, len(args.num_cols)) for num_cols in args.num_cols]
+    # 结果缓存：命中的输出直接复制到位，全部命中时只读取输入求哈希，不解码
+    cache, source, misses = lookup_outputs("img2txt", input_path, output_paths, args, converter)
+    if not misses:
+        return output_paths
+    # 解码的缩小倍数按最细的网格选择
+    with profiler.stage("read"):
+        image, size, decode_scale = load_image_for_grid(source, max(args.num_cols[index] for index in misses),
+                                                        converter.scale, args.decode_scale)
+    if image is None:
+        raise ValueError(f"无法加载图像：{input_path}")
+    gray_image = grayscale(image)
+    # 多个列数时只建一次积分图，之后每个尺寸的单元格平均值都是 O(1) 查表
+    table = color_table = None
+    if len(misses) > 1:
+        with profiler.stage("integral"):
+            table = SummedAreaTable(gray_image)
+            if args.format != "text":
+                color_table = SummedAreaTable(image)
+    for index, key in misses.items():
+        text = converter.to_text(image, args.num_cols[index], args.format, args.color_step, size, decode_scale,
+                                 table, color_table, gray_image)
+        with profiler.stage("write"):
+            save_text(text, output_paths[index])
+        if key is not None:
+            with profiler.stage("cache"):
+                cache.store(key, output_paths[index])
+    return output_paths
 
 def main():
     # 获取命令行参数
     args = get_args()
-    
-    # 获取字符列表
-    char_list = get_char_list(args.mode)
-    
-    # 读取输入图像
-    image = cv2.imread(args.input)
-    if image is None:
-        print(f"无法加载图像：{args.input}")
-        return
+    from profiler import profiler
+    from batch import is_batch_input, run_batch
 
-    # 将图像转换为 ASCII 字符画
-    ascii_art = convert_image_to_ascii(image, char_list, args.num_cols)
+    if args.profile:
+        profiler.enable(args.profile, args.trace)
+
+    # 目录、通配符或文件列表：批量转换，输出按相对路径镜像到输出目录并改为 .txt 扩展名
+    if is_batch_input(args.input):
+        extension = ".html" if args.format == "html" else ".txt"
+        run_batch(args.input, args.output, load_resources, convert_file, args, args.workers, extension)
+        return
     
-    # 保存 ASCII 字符画到输出文件
-    save_ascii_art(ascii_art, args.output)
-    print(f"ASCII 字符画已保存到 {args.output}")
+    # 读取、转换并保存 ASCII 字符画
+    try:
+        output_paths = convert_file(args.input, args.output, args, load_resources(args))
+    except ValueError as error:
+        print(error)
+        return
+    for output_path in output_paths:
+        print(f"ASCII 字符画已保存到 {output_path}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
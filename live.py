@@ -0,0 +1,349 @@
+"""
+Low-latency conversion of live sources. The newest frame is always the one converted (older
+frames are skipped), and a controller keeps the per-frame latency inside the budget of the
+target frame rate by lowering or raising num_cols.
+
+Sources: a device index ("0"), "synthetic" or "synthetic:WIDTHxHEIGHT" (generated frames at the
+target frame rate), or anything cv2.VideoCapture opens (named pipe, RTSP URL, file). Files are
+paced at the target frame rate (or their own) so they can stand in for a camera.
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from profiler import profiler
+from terminal import HIDE_CURSOR, CLEAR_SCREEN, CURSOR_HOME, RESET, SHOW_CURSOR
+
+
+class SyntheticCapture:
+    """
+    Camera stand-in: a moving gradient with a bouncing disc, delivered at fps frames per second.
+    """
+
+    def __init__(self, width, height, fps):
+        self.width, self.height, self.fps = width, height, fps
+        self.index = 0
+        self.start = time.perf_counter()
+        # 只预先算一次梯度，每帧在 uint8 上加偏移（自然按 256 取模），生成帧几乎不占 CPU
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+        self.x, self.y = x.astype(np.uint8), y.astype(np.uint8)
+        self.diagonal = ((x + y) / 2).astype(np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        delay = self.start + self.index / self.fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[..., 0] = self.x + np.uint8(self.index * 4 % 256)
+        frame[..., 1] = self.y + np.uint8(self.index * 2 % 256)
+        frame[..., 2] = self.diagonal + np.uint8(self.index * 3 % 256)
+        center = (int(self.width * (0.5 + 0.4 * math.sin(self.index / 7))),
+                  int(self.height * (0.5 + 0.4 * math.cos(self.index / 5))))
+        cv2.circle(frame, center, self.height // 6, (255, 255, 255), -1)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_WIDTH: self.width,
+                cv2.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0)
+
+    def release(self):
+        pass
+
+
+class PacedCapture:
+    """
+    A capture that delivers its frames no faster than fps, like a camera would.
+    """
+
+    def __init__(self, cap, fps):
+        self.cap, self.fps = cap, fps
+        self.index = 0
+        self.start = time.perf_counter()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        delay = self.start + self.index / self.fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.index += 1
+        return self.cap.read(image)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+def open_source(spec, fps=0):
+    """
+    Open a live source and return (capture, fps); fps 0 uses the source frame rate (25 if unknown).
+    """
+    if spec.isdigit():
+        cap = cv2.VideoCapture(int(spec))
+    elif spec.startswith("synthetic"):
+        width, height = 640, 360
+        if ":" in spec:
+            width, height = (int(value) for value in spec.split(":", 1)[1].split("x"))
+        cap = SyntheticCapture(width, height, fps or 25)
+    else:
+        cap = cv2.VideoCapture(spec)
+        if os.path.isfile(spec):
+            cap = PacedCapture(cap, fps or cap.get(cv2.CAP_PROP_FPS) or 25)
+    if not cap.isOpened():
+        raise ValueError("Cannot open live source {}".format(spec))
+    return cap, fps or cap.get(cv2.CAP_PROP_FPS) or 25
+
+
+class LatestFrameReader:
+    """
+    Read a capture on a background thread and keep only the newest frame, so a consumer slower
+    than the source always converts the most recent frame. Frames it never took are counted in
+    skipped.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.condition = threading.Condition()
+        self.frame = None
+        self.captured = 0.0
+        self.sequence = 0
+        self.taken = 0
+        self.skipped = 0
+        self.ended = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped:
+            ok, frame = self.cap.read()
+            with self.condition:
+                if not ok:
+                    break
+                self.frame, self.captured = frame, time.perf_counter()
+                self.sequence += 1
+                self.condition.notify()
+        with self.condition:
+            self.ended = True
+            self.condition.notify()
+
+    def read(self):
+        """
+        (ok, frame, capture time) of the newest frame not returned yet; waits for one if needed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > self.taken or self.ended)
+            if self.sequence == self.taken:
+                return False, None, None
+            self.skipped += self.sequence - self.taken - 1
+            self.taken = self.sequence
+            return True, self.frame, self.captured
+
+    def stop(self):
+        self.stopped = True
+        # 摄像头的 read() 可能阻塞，线程是守护线程，不无限等待
+        self.thread.join(timeout=1)
+
+
+class LatencyController:
+    """
+    Chooses num_cols for the next frame from the measured latency of the previous ones.
+
+    The budget is one frame interval. Latency is smoothed with an exponential moving average,
+    restarted after every change; when it goes above headroom * budget, num_cols drops at once in
+    proportion to the overshoot (the work grows with the number of cells, num_cols squared, so by
+    the square root of it, between 5% and 50%), and after patience frames below low_water * budget
+    it grows by step, up to max_cols. Every change is kept in decisions.
+    """
+
+    def __init__(self, fps, num_cols, min_cols=20, max_cols=None, headroom=0.8, low_water=0.5, step=0.1,
+                 patience=15, smoothing=0.3):
+        self.fps = fps
+        self.budget = 1 / fps
+        self.num_cols = num_cols
+        self.initial_cols = num_cols
+        self.min_cols = min(min_cols, num_cols)
+        self.max_cols = max_cols or num_cols
+        self.headroom, self.low_water, self.step = headroom, low_water, step
+        self.patience, self.smoothing = patience, smoothing
+        self.smoothed = None
+        self.calm = 0
+        self.latencies = []
+        self.cols = []
+        self.decisions = []
+
+    def update(self, latency):
+        """
+        Record the latency (seconds) of a frame converted at the current num_cols and return the
+        num_cols for the next frame.
+        """
+        self.latencies.append(latency)
+        self.cols.append(self.num_cols)
+        if self.smoothed is None:
+            self.smoothed = latency
+        else:
+            self.smoothed += self.smoothing * (latency - self.smoothed)
+        self.calm = self.calm + 1 if self.smoothed < self.low_water * self.budget else 0
+
+        target = self.headroom * self.budget
+        new_cols = self.num_cols
+        if self.smoothed > target:
+            scale = min(max(math.sqrt(target / self.smoothed), 0.5), 0.95)
+            new_cols = max(self.min_cols, min(self.num_cols - 1, int(self.num_cols * scale)))
+            reason = "over"
+        elif self.calm >= self.patience:
+            new_cols = min(self.max_cols, max(self.num_cols + 1, int(self.num_cols * (1 + self.step))))
+            reason = "under"
+        if new_cols != self.num_cols:
+            self.decisions.append({"frame": len(self.latencies) - 1, "from": self.num_cols, "to": new_cols,
+                                   "reason": reason, "smoothed_ms": self.smoothed * 1000})
+            # 旧尺寸下的平均值不再有效，从新尺寸的第一帧重新开始平均
+            self.smoothed = None
+            self.calm = 0
+            self.num_cols = new_cols
+        return self.num_cols
+
+    def metrics(self, settle=0):
+        """
+        Latency percentiles, budget misses and num_cols statistics as a dict, ignoring the first
+        settle frames (while the controller finds its operating point) for the latency figures.
+        """
+        latencies = np.array(self.latencies[settle:] or [0.0]) * 1000
+        budget_ms = self.budget * 1000
+        return {
+            "target_fps": self.fps,
+            "budget_ms": budget_ms,
+            "frames": len(self.latencies),
+            "settle_frames": settle,
+            "over_budget": int((latencies > budget_ms).sum()),
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max()),
+            },
+            "num_cols": {
+                "initial": self.initial_cols,
+                "final": self.num_cols,
+                "min": min(self.cols, default=self.num_cols),
+                "max": max(self.cols, default=self.num_cols),
+            },
+            "decisions": self.decisions,
+        }
+
+
+def run_live(cap, convert, emit, controller, max_frames=0, duration=0, settle=0):
+    """
+    Convert the newest frame of cap with convert(frame, num_cols), pass the result to emit and
+    let the controller pick the next num_cols, until the source ends, max_frames frames were
+    shown or duration seconds passed. Latency runs from the moment the frame was captured to the
+    end of emit. Returns the controller metrics plus skipped frames and the achieved frame rate.
+    """
+    reader = LatestFrameReader(cap)
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while not (max_frames and frames >= max_frames) and not (duration and time.perf_counter() - start >= duration):
+            ok, frame, captured = reader.read()
+            if not ok:
+                break
+            with profiler.frame():
+                emit(convert(frame, controller.num_cols))
+            controller.update(time.perf_counter() - captured)
+            frames += 1
+    finally:
+        reader.stop()
+    elapsed = time.perf_counter() - start
+    metrics = controller.metrics(settle)
+    metrics.update(skipped=reader.skipped, elapsed_seconds=elapsed, achieved_fps=frames / elapsed if elapsed else 0)
+    return metrics
+
+
+class VideoOutput:
+    """
+    XVID output for live mode at a fixed size (width, height), usually the source size, so the
+    encoding cost does not depend on num_cols. ASCII frames are scaled to fit it.
+    """
+
+    def __init__(self, path, fps, size):
+        self.path, self.fps, self.size = path, fps, size
+        self.out = None
+
+    def write(self, frame):
+        if self.out is None:
+            self.out = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"XVID"), self.fps, self.size)
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            with profiler.stage("resize"):
+                frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        with profiler.stage("write"):
+            self.out.write(frame)
+
+    def release(self):
+        if self.out:
+            self.out.release()
+
+
+class TerminalOutput:
+    """
+    Terminal output for live mode: each frame overwrites the previous one in a single write.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.stream.write(HIDE_CURSOR + CLEAR_SCREEN)
+
+    def write(self, text):
+        self.stream.write(CURSOR_HOME + text)
+        self.stream.flush()
+
+    def release(self):
+        self.stream.write(RESET + SHOW_CURSOR + "\n")
+        self.stream.flush()
+
+
+def format_metrics(metrics):
+    return ("Live: {frames} frames at {achieved_fps:.1f} fps (target {target_fps:.1f}), {skipped} stale frames skipped\n"
+            "Latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {max:.1f} ms, budget {budget_ms:.1f} ms, "
+            "{over_budget} frames over budget\n"
+            "num_cols {initial} -> {final} (range {low}-{high}), {changes} controller decisions").format(
+        changes=len(metrics["decisions"]), low=metrics["num_cols"]["min"], high=metrics["num_cols"]["max"],
+        initial=metrics["num_cols"]["initial"], final=metrics["num_cols"]["final"], **metrics["latency_ms"],
+        **{key: value for key, value in metrics.items() if key not in ("latency_ms", "num_cols")})
+
+
+def run_live_source(args, frame_to_text, convert_frame):
+    """
+    Live mode of the video converters: --input is a device index, "synthetic[:WxH]", a pipe or
+    a stream. frame_to_text(frame, num_cols) is used with --play, convert_frame(frame, num_cols)
+    otherwise. Prints the metrics and writes them to --metrics.
+    """
+    cap, fps = open_source(args.input, args.fps)
+    controller = LatencyController(fps, args.num_cols, args.min_cols)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    output = TerminalOutput() if args.play else VideoOutput(args.output, fps, size)
+    try:
+        # 第一秒内控制器还在寻找合适的列数，不计入延迟统计
+        metrics = run_live(cap, frame_to_text if args.play else convert_frame, output.write, controller,
+                           args.max_frames, args.duration, int(fps))
+    finally:
+        output.release()
+        cap.release()
+    print(format_metrics(metrics))
+    if args.metrics:
+        with open(args.metrics, "w") as metrics_file:
+            json.dump(metrics, metrics_file, indent=2)
+    return metrics
@@ -0,0 +1,170 @@
+import heapq
+import multiprocessing
+import queue
+import threading
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 写出线程等待结果时每隔这么久检查一次 worker 是否已经异常退出
+POLL_SECONDS = 0.5
+
+
+def _worker(task_queue, done_queue, input_name, input_shape, output_name, output_shape, convert, args):
+    """
+    Worker process: convert frames read from the shared input slots into the shared output
+    slots, reporting (index, slot, shape, error) for every frame.
+    """
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    output_memory = shared_memory.SharedMemory(name=output_name)
+    inputs = np.ndarray(input_shape, dtype=np.uint8, buffer=input_memory.buf)
+    outputs = np.ndarray(output_shape, dtype=np.uint8, buffer=output_memory.buf)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            index, slot = task
+            try:
+                result = convert(inputs[slot], *args)
+                height, width = result.shape[:2]
+                outputs[slot, :height, :width] = result
+                done_queue.put((index, slot, result.shape, None))
+            except Exception:
+                done_queue.put((index, slot, None, traceback.format_exc()))
+    finally:
+        del inputs, outputs
+        input_memory.close()
+        output_memory.close()
+
+
+def run_pipeline(cap, convert, args, max_output_shape, write, workers, slots_per_worker=2):
+    """
+    Convert every frame of an opened cv2.VideoCapture with convert(frame, *args) on a pool of
+    worker processes and pass the results to write(frame) in their original order.
+
+    A decode thread reads frames straight into a ring of shared-memory slots, workers convert
+    them into matching output slots of max_output_shape(frame.shape), and a writer thread
+    reorders finished frames. The number of slots bounds how many frames are in flight, so
+    memory stays constant however long the video is. Returns the number of frames written.
+    """
+    ok, first_frame = cap.read()
+    if not ok:
+        return 0
+    num_slots = workers * slots_per_worker + 2
+    input_shape = (num_slots,) + first_frame.shape
+    output_shape = (num_slots,) + tuple(max_output_shape(first_frame.shape))
+    input_memory = shared_memory.SharedMemory(create=True, size=int(np.prod(input_shape)))
+    output_memory = shared_memory.SharedMemory(create=True, size=int(np.prod(output_shape)))
+    # 共享内存上的视图放在字典里，结束时清空字典即可释放，再关闭共享内存
+    views = {"inputs": np.ndarray(input_shape, dtype=np.uint8, buffer=input_memory.buf),
+             "outputs": np.ndarray(output_shape, dtype=np.uint8, buffer=output_memory.buf)}
+
+    task_queue = multiprocessing.Queue(maxsize=num_slots)
+    done_queue = multiprocessing.Queue()
+    free_slots = queue.Queue()
+    for slot in range(num_slots):
+        free_slots.put(slot)
+    processes = [multiprocessing.Process(target=_worker, daemon=True,
+                                         args=(task_queue, done_queue, input_memory.name, input_shape,
+                                               output_memory.name, output_shape, convert, args))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    stop = threading.Event()
+    errors = []
+    written = [0]
+
+    def submit(task):
+        # 带超时地提交任务，出错停止时解码线程不会卡在已满的队列上
+        while not stop.is_set():
+            try:
+                task_queue.put(task, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def decode():
+        inputs = views["inputs"]
+        index = 0
+        try:
+            while not stop.is_set():
+                slot = free_slots.get()
+                if slot is None:
+                    break
+                if index == 0:
+                    inputs[slot] = first_frame
+                else:
+                    # 直接解码到共享内存槽位中，尺寸不符时才额外复制一次
+                    ok, frame = cap.read(inputs[slot])
+                    if not ok:
+                        break
+                    if not np.shares_memory(frame, inputs[slot]):
+                        inputs[slot] = frame
+                submit((index, slot))
+                index += 1
+            for _ in processes:
+                submit(None)
+        except Exception:
+            # 读帧或复制到槽位出错（例如中途帧尺寸变化）：停止解码，写出线程收到 eof 后结束
+            errors.append(traceback.format_exc())
+            stop.set()
+        finally:
+            done_queue.put(("eof", index, None, None))
+
+    def next_result():
+        # worker 被杀死（内存不足、cv2 段错误）时不会再报告结果，轮询时发现后报错而不是一直等待
+        while True:
+            try:
+                return done_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                for process in processes:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError("Worker process {} exited with code {}".format(process.pid,
+                                                                                         process.exitcode))
+
+    def write_frames():
+        outputs = views["outputs"]
+        pending = []
+        total = None
+        try:
+            while total is None or written[0] < total:
+                index, slot, shape, error = next_result()
+                if index == "eof":
+                    total = slot
+                    continue
+                if error is not None:
+                    raise RuntimeError(error)
+                heapq.heappush(pending, (index, slot, shape))
+                while pending and pending[0][0] == written[0]:
+                    _, slot, shape = heapq.heappop(pending)
+                    write(outputs[slot, :shape[0], :shape[1]])
+                    free_slots.put(slot)
+                    written[0] += 1
+        except Exception:
+            errors.append(traceback.format_exc())
+            stop.set()
+            free_slots.put(None)
+
+    decoder = threading.Thread(target=decode)
+    writer = threading.Thread(target=write_frames)
+    decoder.start()
+    writer.start()
+    writer.join()
+    decoder.join()
+    try:
+        if errors:
+            for process in processes:
+                process.terminate()
+            raise RuntimeError("Frame conversion failed:\n{}".format(errors[0].rstrip()))
+        for process in processes:
+            process.join()
+    finally:
+        views.clear()
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+    return written[0]
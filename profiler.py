@@ -0,0 +1,154 @@
+import atexit
+import json
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+
+
+class _NullStage:
+    """
+    Context manager returned while profiling is off: entering and leaving it does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("events", "name", "start")
+
+    def __init__(self, events, name):
+        self.events = events
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.events.append((self.name, self.start, time.perf_counter_ns() - self.start, threading.get_ident()))
+        return False
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB. /proc/self/status (VmHWM) is preferred because
+    ru_maxrss also keeps the peak of the parent process it was forked from before exec.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Profiler:
+    """
+    Stage timers for the converters. Code wraps each stage in `with profiler.stage("read"):` and
+    each video frame in `with profiler.frame():`; until enable() is called both return a shared
+    no-op context manager, so the instrumentation costs nothing when profiling is off.
+
+    Only the process that enabled the profiler is measured: stages that run in pipeline or batch
+    worker processes are not collected.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = 0
+
+    def enable(self, json_path=None, trace_path=None):
+        """
+        Start collecting. The report is printed and written when the process exits.
+        """
+        self.enabled = True
+        self.events = []
+        self.origin = time.perf_counter_ns()
+        atexit.register(self.finish, json_path, trace_path)
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self.events, name)
+
+    def frame(self):
+        return self.stage("frame")
+
+    def report(self):
+        """
+        Per-stage totals, per-frame latency percentiles and peak RSS as a dict.
+        """
+        stages = {}
+        frames = []
+        for name, _, duration, _ in self.events:
+            if name == "frame":
+                frames.append(duration)
+                continue
+            stage = stages.setdefault(name, {"count": 0, "total_seconds": 0.0})
+            stage["count"] += 1
+            stage["total_seconds"] += duration / 1e9
+        for stage in stages.values():
+            stage["mean_ms"] = stage["total_seconds"] * 1000 / stage["count"]
+        report = {
+            "wall_seconds": (time.perf_counter_ns() - self.origin) / 1e9,
+            "stages": stages,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if frames:
+            latencies = np.array(frames) / 1e6
+            report["frames"] = {
+                "count": len(frames),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "max_ms": float(latencies.max()),
+            }
+        return report
+
+    def trace_events(self):
+        """
+        Events in the Chrome trace-event format (chrome://tracing, Perfetto).
+        """
+        pid = os.getpid()
+        return [{"name": name, "ph": "X", "ts": (start - self.origin) / 1000, "dur": duration / 1000,
+                 "pid": pid, "tid": tid}
+                for name, start, duration, tid in self.events]
+
+    def finish(self, json_path=None, trace_path=None):
+        """
+        Print a summary and write the JSON report and the optional trace file.
+        """
+        if not self.enabled:
+            return
+        report = self.report()
+        print("{:<16} {:>8} {:>10} {:>10}".format("stage", "count", "total s", "mean ms"))
+        for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+            print("{:<16} {:>8} {:>10.3f} {:>10.3f}".format(name, stage["count"], stage["total_seconds"],
+                                                           stage["mean_ms"]))
+        if "frames" in report:
+            print("Frame latency: p50 {p50_ms:.2f} ms, p95 {p95_ms:.2f} ms, p99 {p99_ms:.2f} ms over {count} frames"
+                  .format(**report["frames"]))
+        print("Wall time {:.3f} s, peak RSS {:.1f} MB".format(report["wall_seconds"], report["peak_rss_mb"]))
+        if json_path:
+            with open(json_path, "w") as json_file:
+                json.dump(report, json_file, indent=2)
+        if trace_path:
+            with open(trace_path, "w") as trace_file:
+                json.dump({"traceEvents": self.trace_events()}, trace_file)
+        self.enabled = False
+
+
+profiler = Profiler()
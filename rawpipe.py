@@ -0,0 +1,261 @@
+"""
+Raw-frame pipe I/O for video2video/video2video_color: read rawvideo or Y4M frames from stdin and
+write the ASCII frames as rawvideo or Y4M to stdout, so an external encoder (or decoder) can sit
+on the other end of the pipe without a second encode:
+
+    ffmpeg -i in.mp4 -f yuv4mpegpipe - | python video2video.py --input - --output - | ffmpeg -i - out.mp4
+    ffmpeg -i in.mp4 -f rawvideo -pix_fmt bgr24 - | python video2video.py --input - --input_format rawvideo \
+        --input_size 1280x720 --fps 30 --output out.avi
+
+Every frame is read into one preallocated buffer and viewed with np.frombuffer; bgr24 frames are
+read straight into the caller's array. Output frames are placed on one fixed-size canvas, padded
+with the background, because the ASCII frames of a video can differ in size.
+"""
+import contextlib
+import sys
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+PIPE = "-"
+PIPE_FORMATS = ("y4m", "rawvideo")
+PIX_FMTS = ("bgr24", "rgb24", "gray", "yuv420p")
+Y4M_MAGIC = b"YUV4MPEG2"
+# Y4M 色彩空间到 rawvideo 像素格式，只支持 8 位
+_Y4M_COLORSPACES = {"420": "yuv420p", "420jpeg": "yuv420p", "420paldv": "yuv420p", "420mpeg2": "yuv420p",
+                    "444": "yuv444p", "mono": "gray"}
+_FROM_BGR = {"rgb24": cv2.COLOR_BGR2RGB, "gray": cv2.COLOR_BGR2GRAY, "yuv420p": cv2.COLOR_BGR2YUV_I420}
+_TO_BGR = {"rgb24": cv2.COLOR_RGB2BGR, "gray": cv2.COLOR_GRAY2BGR, "yuv420p": cv2.COLOR_YUV2BGR_I420,
+           "yuv444p": cv2.COLOR_YUV2BGR}
+
+
+def parse_size(text):
+    """
+    "1280x720" -> (1280, 720).
+    """
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def plane_shape(pix_fmt, width, height):
+    """
+    Shape of one frame of pix_fmt as a uint8 array (planar formats are stacked vertically).
+    """
+    if pix_fmt in ("bgr24", "rgb24"):
+        return height, width, 3
+    if pix_fmt == "gray":
+        return height, width
+    if pix_fmt == "yuv420p":
+        if width % 2 or height % 2:
+            raise ValueError("yuv420p frames need an even size, got {}x{}".format(width, height))
+        return height * 3 // 2, width
+    return 3, height, width
+
+
+def read_full(stream, view):
+    """
+    Fill view from stream. Returns False on a clean end of stream, raises on a truncated frame.
+    """
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            if filled:
+                raise ValueError("Truncated frame: {} of {} bytes".format(filled, len(view)))
+            return False
+        filled += count
+    return True
+
+
+class PipeCapture:
+    """
+    cv2.VideoCapture-like reader of rawvideo or Y4M frames from a binary stream.
+
+    read() returns a BGR view of a buffer that is reused by the next read(); read(image) converts
+    into image instead, which bgr24 input fills without any intermediate copy.
+    """
+
+    def __init__(self, stream, input_format="y4m", size=None, pix_fmt="bgr24", fps=0):
+        self.stream = stream
+        self.fps = Fraction(fps).limit_denominator(1001) if fps else Fraction(25)
+        if input_format == "y4m":
+            size, pix_fmt = self._read_y4m_header(fps)
+        elif size is None:
+            raise ValueError("rawvideo input needs --input_size WxH")
+        self.width, self.height = size
+        self.pix_fmt = pix_fmt
+        self.y4m = input_format == "y4m"
+        # 整帧缓冲区只创建一次，用 np.frombuffer 解释，每帧原地覆盖
+        self.buffer = bytearray(int(np.prod(plane_shape(pix_fmt, *size))))
+        self.view = memoryview(self.buffer)
+        self.planes = np.frombuffer(self.buffer, dtype=np.uint8).reshape(plane_shape(pix_fmt, *size))
+        self.frame = self.planes if pix_fmt == "bgr24" else np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.yuv = np.empty_like(self.frame) if pix_fmt == "yuv444p" else None
+        self.frames = 0
+        self.opened = True
+
+    def _read_y4m_header(self, fps):
+        header = self.stream.readline()
+        tokens = header.split()
+        if not tokens or tokens[0] != Y4M_MAGIC:
+            raise ValueError("Input is not a YUV4MPEG2 stream")
+        params = {token[:1].decode(): token[1:].decode() for token in tokens[1:]}
+        colorspace = params.get("C", "420jpeg")
+        if colorspace not in _Y4M_COLORSPACES:
+            raise ValueError("Unsupported Y4M colorspace C{}".format(colorspace))
+        if "I" in params and params["I"] not in ("p", "?"):
+            raise ValueError("Interlaced Y4M input is not supported")
+        if not fps and "F" in params:
+            numerator, _, denominator = params["F"].partition(":")
+            self.fps = Fraction(int(numerator), int(denominator or 1))
+        return (int(params["W"]), int(params["H"])), _Y4M_COLORSPACES[colorspace]
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.frames
+        return 0
+
+    def _read_frame(self, view):
+        if not self.opened:
+            return False
+        if self.y4m:
+            line = self.stream.readline()
+            if not line:
+                self.opened = False
+                return False
+            if not line.startswith(b"FRAME"):
+                raise ValueError("Expected a Y4M FRAME marker, got {!r}".format(line[:16]))
+        if not read_full(self.stream, view):
+            self.opened = False
+            return False
+        self.frames += 1
+        return True
+
+    def grab(self):
+        return self._read_frame(self.view)
+
+    def retrieve(self, image=None):
+        if image is None or image.shape != self.frame.shape:
+            image = self.frame
+        if self.pix_fmt == "bgr24":
+            if image is not self.planes:
+                image[...] = self.planes
+        elif self.pix_fmt == "yuv444p":
+            cv2.merge(list(self.planes), dst=self.yuv)
+            cv2.cvtColor(self.yuv, _TO_BGR["yuv444p"], dst=image)
+        else:
+            cv2.cvtColor(self.planes, _TO_BGR[self.pix_fmt], dst=image)
+        return True, image
+
+    def read(self, image=None):
+        if self.pix_fmt == "bgr24" and image is not None and image.shape == self.frame.shape and not self.y4m:
+            # bgr24 直接读入调用方的数组，不经过内部缓冲区
+            if not self._read_frame(memoryview(image.reshape(-1))):
+                return False, None
+            return True, image
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self):
+        self.opened = False
+
+
+class PipeWriter:
+    """
+    cv2.VideoWriter-like writer of BGR frames as rawvideo or Y4M to a binary stream. Frames are
+    placed at the top left of a canvas of canvas_shape (made even for yuv420p) filled with fill.
+    """
+
+    def __init__(self, stream, canvas_shape, fps, output_format="y4m", pix_fmt="yuv420p", fill=(0, 0, 0)):
+        if output_format == "y4m":
+            pix_fmt = "yuv420p"
+        height, width = canvas_shape[:2]
+        if pix_fmt == "yuv420p":
+            height, width = height + height % 2, width + width % 2
+        self.stream = stream
+        self.pix_fmt = pix_fmt
+        self.fill = np.array(fill, dtype=np.uint8)
+        self.canvas = np.empty((height, width, 3), dtype=np.uint8)
+        self.canvas[...] = self.fill
+        self.frame_size = None
+        self.converted = None if pix_fmt == "bgr24" else np.empty(plane_shape(pix_fmt, width, height), dtype=np.uint8)
+        self.frames = 0
+        if output_format == "y4m":
+            rate = Fraction(fps).limit_denominator(1001)
+            stream.write("YUV4MPEG2 W{} H{} F{}:{} Ip A1:1 C420jpeg\n".format(
+                width, height, rate.numerator, rate.denominator).encode())
+        self.frame_header = b"FRAME\n" if output_format == "y4m" else b""
+
+    @property
+    def size(self):
+        return self.canvas.shape[1], self.canvas.shape[0]
+
+    def write(self, frame):
+        height, width = frame.shape[:2]
+        if height > self.canvas.shape[0] or width > self.canvas.shape[1]:
+            raise ValueError("Frame {}x{} does not fit the {}x{} output".format(width, height, *self.size))
+        # 帧尺寸变化时才重新填充背景
+        if self.frame_size != (height, width):
+            self.canvas[...] = self.fill
+            self.frame_size = height, width
+        self.canvas[:height, :width] = frame
+        if self.converted is None:
+            data = self.canvas
+        else:
+            data = cv2.cvtColor(self.canvas, _FROM_BGR[self.pix_fmt], dst=self.converted)
+        if self.frame_header:
+            self.stream.write(self.frame_header)
+        self.stream.write(memoryview(data.reshape(-1)))
+        self.frames += 1
+
+    def release(self):
+        self.stream.flush()
+
+
+def add_pipe_args(parser):
+    """
+    Pipe I/O options shared by video2video and video2video_color.
+    """
+    parser.add_argument("--input_format", type=str, default="y4m", choices=PIPE_FORMATS,
+                        help="Format of frames read from stdin (--input -)")
+    parser.add_argument("--input_size", type=parse_size, default=None, help="WxH of rawvideo input frames")
+    parser.add_argument("--pix_fmt", type=str, default="bgr24", choices=PIX_FMTS, help="Pixel format of rawvideo input")
+    parser.add_argument("--output_format", type=str, default="y4m", choices=PIPE_FORMATS,
+                        help="Format of frames written to stdout (--output -)")
+    parser.add_argument("--output_pix_fmt", type=str, default="bgr24", choices=PIX_FMTS,
+                        help="Pixel format of rawvideo output (Y4M output is always 4:2:0)")
+
+
+@contextlib.contextmanager
+def pipe_io(args, max_output_shape, fill, stdin=None, stdout=None):
+    """
+    (cap, out) for --input - / --output -, None where the regular file is used. While the block
+    runs with --output -, messages printed by the converters go to stderr instead of stdout.
+    max_output_shape(frame_shape) is the largest ASCII frame of a frame_shape input.
+    """
+    cap = out = None
+    if args.input == PIPE:
+        cap = PipeCapture(stdin or sys.stdin.buffer, args.input_format, args.input_size, args.pix_fmt, args.fps)
+    if args.output != PIPE:
+        yield cap, None
+        return
+    source = cap or cv2.VideoCapture(args.input)
+    frame_shape = (int(source.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(source.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    fps = args.fps or (cap.fps if cap else source.get(cv2.CAP_PROP_FPS)) or 25
+    if cap is None:
+        source.release()
+    out = PipeWriter(stdout or sys.stdout.buffer, max_output_shape(frame_shape), fps, args.output_format,
+                     args.output_pix_fmt, fill)
+    with contextlib.redirect_stdout(sys.stderr):
+        yield cap, out
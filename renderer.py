@@ -0,0 +1,407 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+# render_color 按段合成主块时每段的像素数，中间缓冲区保持在缓存大小附近
+RENDER_BAND_PIXELS = 1 << 16
+
+
+class GlyphAtlas:
+    """
+    Rasterize every character of a ramp once into fixed-size coverage tiles, so a whole
+    grid of character indices can be rendered with one array gather instead of
+    one ImageDraw.text call per row or per cell.
+    """
+
+    def __init__(self, char_list, font, sample_character):
+        self.char_list = char_list
+        self.char_width, self.char_height = font.getsize(sample_character)
+        # 字形可能超出单元格（下伸部分、宽字符、负的左侧空白），按单元格大小分块保存
+        bboxes = [font.getbbox(char) for char in char_list]
+        left = min(min(bbox[0] for bbox in bboxes), 0)
+        top = min(min(bbox[1] for bbox in bboxes), 0)
+        right = max(max(bbox[2] for bbox in bboxes), self.char_width)
+        bottom = max(max(bbox[3] for bbox in bboxes), self.char_height)
+        self.margin_x = -(left // self.char_width)
+        self.margin_y = -(top // self.char_height)
+        self.blocks_x = self.margin_x - (-right // self.char_width)
+        self.blocks_y = self.margin_y - (-bottom // self.char_height)
+
+        tile_width = self.blocks_x * self.char_width
+        tile_height = self.blocks_y * self.char_height
+        origin = (self.margin_x * self.char_width, self.margin_y * self.char_height)
+        tiles = np.empty((len(char_list), tile_height, tile_width), dtype=np.uint8)
+        for index, char in enumerate(char_list):
+            tile = Image.new("L", (tile_width, tile_height), 0)
+            ImageDraw.Draw(tile).text(origin, char, fill=255, font=font)
+            tiles[index] = np.asarray(tile)
+        # (字符, 块行, 块列, 字高, 字宽)，每个块与一个单元格等大
+        self.tiles = np.ascontiguousarray(tiles.reshape(
+            len(char_list), self.blocks_y, self.char_height, self.blocks_x, self.char_width
+        ).transpose(0, 1, 3, 2, 4))
+        self.block_ink = self.tiles.any(axis=(3, 4))
+        self.main_tiles = np.ascontiguousarray(self.tiles[:, self.margin_y, self.margin_x])
+        # 每个块中所有字形墨迹的包围范围，溢出块只需处理这一小块区域
+        self.block_bounds = {}
+        for dy in range(self.blocks_y):
+            for dx in range(self.blocks_x):
+                ink = self.tiles[:, dy, dx].any(axis=0)
+                ys, xs = np.nonzero(ink.any(axis=1))[0], np.nonzero(ink.any(axis=0))[0]
+                if len(ys):
+                    self.block_bounds[dy, dx] = (slice(ys[0], ys[-1] + 1), slice(xs[0], xs[-1] + 1))
+
+    def coverage(self, char_indices):
+        """
+        Return the ink coverage (0-1, float32) of a (num_rows, num_cols) char-index grid as a
+        (num_rows * char_height, num_cols * char_width) array. Glyph parts that spill into
+        neighbouring cells are composited the same way repeated text draws would be.
+        """
+        num_rows, num_cols = char_indices.shape
+        transparency = np.ones((num_rows + self.blocks_y - 1, num_cols + self.blocks_x - 1,
+                                self.char_height, self.char_width), dtype=np.float32)
+        for dy in range(self.blocks_y):
+            for dx in range(self.blocks_x):
+                alpha = self.tiles[char_indices, dy, dx] / np.float32(255)
+                transparency[dy:dy + num_rows, dx:dx + num_cols] *= 1 - alpha
+        transparency = transparency[self.margin_y:self.margin_y + num_rows,
+                                    self.margin_x:self.margin_x + num_cols].transpose(0, 2, 1, 3)
+        return 1 - transparency.reshape(num_rows * self.char_height, num_cols * self.char_width)
+
+    def render(self, char_indices, fill, bg_code):
+        """
+        Render a char-index grid as a grayscale ("L") image with the given ink and background.
+        """
+        canvas = bg_code + (fill - bg_code) * self.coverage(char_indices)
+        return Image.fromarray(np.rint(canvas).astype(np.uint8), "L")
+
+    def render_color(self, char_indices, colors, bg_color, size):
+        """
+        Render a char-index grid onto an RGB canvas of the given (width, height), filling every
+        glyph with its cell's color (num_rows, num_cols, 3). Glyph parts that overlap are
+        blended in the row-major order per-cell text drawing would use; parts that fall
+        outside the canvas are clipped.
+        """
+        canvas = self.render_color_canvas(char_indices, colors, bg_color, size)
+        # 超出输出尺寸的部分被裁掉，直接按行跨度从画布缓冲区构造图像
+        offset = (self.margin_y * self.char_height * canvas.shape[1] + self.margin_x * self.char_width) * 3
+        return Image.frombuffer("RGB", size, canvas.reshape(-1)[offset:], "raw", "RGB", canvas.strides[0], 1)
+
+    def render_color_canvas(self, char_indices, colors, bg_color, size):
+        """
+        Composite for render_color and return the whole padded canvas, whose cell
+        (margin_y, margin_x) is the top-left cell of the grid.
+        """
+        num_rows, num_cols = char_indices.shape
+        width, height = size
+        char_width, char_height = self.char_width, self.char_height
+        colors = np.clip(colors, 0, 255).astype(np.uint8)
+
+        padded_rows = max(num_rows + self.blocks_y - 1, self.margin_y - (-height // char_height))
+        padded_cols = max(num_cols + self.blocks_x - 1, self.margin_x - (-width // char_width))
+        canvas = np.empty((padded_rows * char_height, padded_cols * char_width, 3), dtype=np.uint8)
+        canvas[:] = np.tile(np.array(bg_color, dtype=np.uint8), padded_cols * char_width).reshape(-1, 3)
+        cells = canvas.reshape(padded_rows, char_height, padded_cols, char_width, 3)
+
+        # 块偏移越大，对应的字符越早被绘制
+        blocks = [(dy, dx) for dy in reversed(range(self.blocks_y)) for dx in reversed(range(self.blocks_x))]
+        main = blocks.index((self.margin_y, self.margin_x))
+        for dy, dx in blocks[:main]:
+            self._blend_spill(cells, char_indices, colors, dy, dx)
+
+        # 主块覆盖所有单元格：画布 * (1 - 覆盖率) + 单元格颜色 * 覆盖率。按几行单元格一段处理，
+        # 中间结果放在每段复用的小缓冲区中，不为整幅图像分配多份临时数组
+        band = max(1, RENDER_BAND_PIXELS // (num_cols * char_width * char_height))
+        band_shape = (min(band, num_rows) * char_height, num_cols * char_width)
+        alpha = np.empty(band_shape, dtype=np.uint8)
+        alpha_rgb, inverse, fill = (np.empty(band_shape + (3,), dtype=np.uint8) for _ in range(3))
+        left = self.margin_x * char_width
+        for start in range(0, num_rows, band):
+            stop = min(start + band, num_rows)
+            rows = slice(0, (stop - start) * char_height)
+            alpha[rows].reshape(stop - start, char_height, num_cols, char_width)[...] = \
+                self.main_tiles[char_indices[start:stop]].transpose(0, 2, 1, 3)
+            cv2.cvtColor(alpha[rows], cv2.COLOR_GRAY2RGB, dst=alpha_rgb[rows])
+            # 每个单元格的颜色展开成一行像素，再整行复制到单元格的每一行像素
+            row_fill = np.repeat(colors[start:stop], char_width, axis=1)
+            fill[rows].reshape(stop - start, char_height, -1)[...] = row_fill.reshape(stop - start, 1, -1)
+            cv2.bitwise_not(alpha_rgb[rows], dst=inverse[rows])
+            region = canvas[(self.margin_y + start) * char_height:(self.margin_y + stop) * char_height,
+                            left:left + band_shape[1]]
+            cv2.multiply(region, inverse[rows], dst=inverse[rows], scale=1 / 255)
+            cv2.multiply(fill[rows], alpha_rgb[rows], dst=fill[rows], scale=1 / 255)
+            region[...] = cv2.add(inverse[rows], fill[rows], dst=inverse[rows])
+
+        for dy, dx in blocks[main + 1:]:
+            self._blend_spill(cells, char_indices, colors, dy, dx)
+        return canvas
+
+    def _blend_spill(self, cells, char_indices, colors, dy, dx):
+        """
+        Blend block (dy, dx) of every glyph that has ink there onto the cells it spills into.
+        Only a few glyphs reach outside their own cell, so this works on those cells alone.
+        """
+        if (dy, dx) not in self.block_bounds:
+            return
+        rows, cols = np.nonzero(self.block_ink[char_indices, dy, dx])
+        if len(rows):
+            span_y, span_x = self.block_bounds[dy, dx]
+            # 每个单元格的像素排成一行，颜色和覆盖率展开成同样形状，交给 cv2 逐像素运算
+            alpha = self.tiles[char_indices[rows, cols], dy, dx][:, span_y, span_x].reshape(len(rows), -1)
+            alpha = cv2.cvtColor(alpha, cv2.COLOR_GRAY2RGB)
+            fill = cv2.resize(colors[rows, cols, np.newaxis], (alpha.shape[1], len(rows)),
+                              interpolation=cv2.INTER_NEAREST)
+            region = np.ascontiguousarray(cells[rows + dy, span_y, cols + dx, span_x]).reshape(alpha.shape)
+            # region + rint((fill - region) * alpha / 255)，拆成正负两部分用饱和的 uint8 运算；
+            # (fill - region) * alpha / 255 离 .5 至少 1/510，与浮点运算的舍入结果完全相同
+            up = cv2.multiply(cv2.subtract(fill, region), alpha, scale=1 / 255)
+            down = cv2.multiply(cv2.subtract(region, fill), alpha, scale=1 / 255)
+            region = cv2.subtract(cv2.add(region, up), down)
+            cells[rows + dy, span_y, cols + dx, span_x] = region.reshape(
+                len(rows), span_y.stop - span_y.start, span_x.stop - span_x.start, 3)
+
+
+class ColorGridRenderer:
+    """
+    GlyphAtlas.render_color_canvas for one fixed grid shape, background and output size, drawn
+    into buffers allocated once, so rendering a stream of frames allocates no new arrays. Spill
+    blocks are blended over the whole grid (cells without ink there have zero coverage), which
+    gives the same pixels as blending only the inked cells. render() returns the padded canvas,
+    overwritten by the next call; the grid's top-left cell starts at offset (y, x).
+    """
+
+    def __init__(self, atlas, grid_shape, bg_color, size):
+        num_rows, num_cols = grid_shape
+        char_width, char_height = atlas.char_width, atlas.char_height
+        width, height = size
+        padded_rows = max(num_rows + atlas.blocks_y - 1, atlas.margin_y - (-height // char_height))
+        padded_cols = max(num_cols + atlas.blocks_x - 1, atlas.margin_x - (-width // char_width))
+        self.grid_shape = grid_shape
+        # 空白画布保留一份，每帧整块复制，比按像素广播背景色快得多
+        self.blank = np.empty((padded_rows * char_height, padded_cols * char_width, 3), dtype=np.uint8)
+        self.blank[...] = np.array(bg_color, dtype=np.uint8)
+        self.canvas = np.empty_like(self.blank)
+        self.cells = self.canvas.reshape(padded_rows, char_height, padded_cols, char_width, 3)
+        self.offset = (atlas.margin_y * char_height, atlas.margin_x * char_width)
+
+        # 主块：与 render_color_canvas 一样用 cv2 按覆盖率混合，所有中间结果都预先分配
+        region_shape = (num_rows * char_height, num_cols * char_width)
+        self.region = self.canvas[self.offset[0]:self.offset[0] + region_shape[0],
+                                  self.offset[1]:self.offset[1] + region_shape[1]]
+        self.main_tiles = np.ascontiguousarray(atlas.tiles[:, atlas.margin_y, atlas.margin_x])
+        self.main_gathered = np.empty((num_rows, num_cols, char_height, char_width), dtype=np.uint8)
+        self.alpha = np.empty(region_shape, dtype=np.uint8)
+        self.alpha_rgb, self.inverse, self.fill, self.blended = (
+            np.empty(region_shape + (3,), dtype=np.uint8) for _ in range(4))
+
+        # 溢出块按绘制顺序排列，主块之前的先画
+        blocks = [(dy, dx) for dy in reversed(range(atlas.blocks_y)) for dx in reversed(range(atlas.blocks_x))]
+        main = blocks.index((atlas.margin_y, atlas.margin_x))
+        self.spills_before = [self._spill(atlas, block) for block in blocks[:main] if block in atlas.block_bounds]
+        self.spills_after = [self._spill(atlas, block) for block in blocks[main + 1:] if block in atlas.block_bounds]
+        self.colors = np.empty(grid_shape + (3,), dtype=np.float32)
+
+    def _spill(self, atlas, block):
+        num_rows, num_cols = self.grid_shape
+        dy, dx = block
+        span_y, span_x = atlas.block_bounds[block]
+        tiles = np.ascontiguousarray(atlas.tiles[:, dy, dx, span_y, span_x])
+        gathered = np.empty((num_rows, num_cols) + tiles.shape[1:], dtype=np.uint8)
+        target = self.cells[dy:dy + num_rows, span_y, dx:dx + num_cols, span_x]
+        # 参与运算的数组都与目标区域同形且连续，numpy 不需要为跨步或广播的操作数分配缓冲区
+        pixels, alpha, fill = (np.empty(target.shape, dtype=np.float32) for _ in range(3))
+        return tiles, gathered, target, pixels, alpha, fill
+
+    def _blend_spill(self, char_indices, spill):
+        # 与 GlyphAtlas._blend_spill 相同的 float32 运算：pixels += (fill - pixels) * alpha
+        tiles, gathered, target, pixels, alpha, fill = spill
+        np.take(tiles, char_indices, axis=0, out=gathered, mode="clip")
+        np.copyto(alpha, gathered.transpose(0, 2, 1, 3)[..., np.newaxis])
+        np.divide(alpha, np.float32(255), out=alpha)
+        np.copyto(fill, self.colors[:, np.newaxis, :, np.newaxis])
+        np.copyto(pixels, target)
+        np.subtract(fill, pixels, out=fill)
+        np.multiply(fill, alpha, out=fill)
+        np.add(pixels, fill, out=pixels)
+        np.rint(pixels, out=pixels)
+        np.copyto(target, pixels, casting="unsafe")
+
+    def render(self, char_indices, colors):
+        """
+        Render a char-index grid with uint8 cell colors (num_rows, num_cols, 3).
+        """
+        np.copyto(self.canvas, self.blank)
+        np.copyto(self.colors, colors)
+        for spill in self.spills_before:
+            self._blend_spill(char_indices, spill)
+
+        num_rows, num_cols, char_height, char_width = self.main_gathered.shape
+        np.take(self.main_tiles, char_indices, axis=0, out=self.main_gathered, mode="clip")
+        np.copyto(self.alpha.reshape(num_rows, char_height, num_cols, char_width),
+                  self.main_gathered.transpose(0, 2, 1, 3))
+        cv2.cvtColor(self.alpha, cv2.COLOR_GRAY2RGB, dst=self.alpha_rgb)
+        cv2.resize(colors, (self.alpha.shape[1], self.alpha.shape[0]), dst=self.fill,
+                   interpolation=cv2.INTER_NEAREST)
+        cv2.bitwise_not(self.alpha_rgb, dst=self.inverse)
+        cv2.multiply(self.region, self.inverse, dst=self.blended, scale=1 / 255)
+        cv2.multiply(self.fill, self.alpha_rgb, dst=self.fill, scale=1 / 255)
+        cv2.add(self.blended, self.fill, dst=self.blended)
+        np.copyto(self.region, self.blended)
+
+        for spill in self.spills_after:
+            self._blend_spill(char_indices, spill)
+        return self.canvas
+
+
+class DeltaRenderer:
+    """
+    Render consecutive video frames through a GlyphAtlas, keeping the previous frame's
+    char-index grid, cell colors and canvas. Only cells whose character changed, or whose
+    color moved by more than color_threshold, are re-blitted (together with the neighbours
+    their glyphs spill into); a frame with no dirty cells reuses the previous image as is.
+    Has the same render / render_color interface as GlyphAtlas. After each frame, changed is
+    the (left, top, right, bottom) pixel box of the image that may differ from the previous
+    frame, or None when the frame is unchanged.
+    """
+
+    def __init__(self, atlas, color_threshold=0, full_redraw_ratio=0.25):
+        self.atlas = atlas
+        self.color_threshold = color_threshold
+        # 需要重绘的单元格超过这个比例时，整帧走 GlyphAtlas 的快速路径
+        self.full_redraw_ratio = full_redraw_ratio
+        self.char_width, self.char_height = atlas.char_width, atlas.char_height
+        self.char_indices = None
+        self.colors = None
+        self.canvas = None
+        self.image = None
+        self.key = None
+        self.changed = None
+        # 每帧脏单元格所占比例，以及整帧复用的次数
+        self.dirty_ratios = []
+        self.reused_frames = 0
+
+    def render(self, char_indices, fill, bg_code):
+        """
+        Grayscale counterpart of GlyphAtlas.render.
+        """
+        num_rows, num_cols = char_indices.shape
+        colors = np.full((num_rows, num_cols, 1), fill, dtype=np.int32)
+        size = (num_cols * self.char_width, num_rows * self.char_height)
+        return self._update(char_indices, colors, (bg_code,), size, "L")
+
+    def render_color(self, char_indices, colors, bg_color, size):
+        """
+        Incremental counterpart of GlyphAtlas.render_color.
+        """
+        return self._update(char_indices, colors, tuple(bg_color), size, "RGB")
+
+    def _update(self, char_indices, colors, bg_color, size, mode):
+        atlas = self.atlas
+        num_rows, num_cols = char_indices.shape
+        colors = np.clip(colors, 0, 255).astype(np.int32)
+        key = (char_indices.shape, bg_color, size, mode)
+        reset = key != self.key
+        if reset:
+            # 网格、背景或输出尺寸变化时重新开始，整帧都算作脏单元格
+            width, height = size
+            padded_rows = max(num_rows + atlas.blocks_y - 1, atlas.margin_y - (-height // self.char_height))
+            padded_cols = max(num_cols + atlas.blocks_x - 1, atlas.margin_x - (-width // self.char_width))
+            self.canvas = np.empty((padded_rows * self.char_height, padded_cols * self.char_width, len(bg_color)),
+                                   dtype=np.uint8)
+            self.canvas[:] = bg_color
+            self.char_indices = np.array(char_indices)
+            self.colors = colors
+            self.key = key
+            dirty = np.ones(char_indices.shape, dtype=bool)
+        else:
+            dirty = char_indices != self.char_indices
+            dirty |= np.abs(colors - self.colors).max(axis=2) > self.color_threshold
+            self.char_indices[dirty] = char_indices[dirty]
+            self.colors[dirty] = colors[dirty]
+
+        self.dirty_ratios.append(dirty.mean())
+        if not dirty.any():
+            self.reused_frames += 1
+            self.changed = None
+            return self.image
+
+        # 字形会溢出到相邻单元格，受影响的是脏单元格在各个有墨迹的块偏移下覆盖的所有单元格
+        padded_rows = self.canvas.shape[0] // self.char_height
+        padded_cols = self.canvas.shape[1] // self.char_width
+        affected = np.zeros((padded_rows, padded_cols), dtype=bool)
+        for dy, dx in atlas.block_bounds:
+            affected[dy:dy + num_rows, dx:dx + num_cols] |= dirty
+        if affected.mean() > self.full_redraw_ratio:
+            self._redraw(bg_color, size, mode)
+        else:
+            rows, cols = np.nonzero(affected)
+            cells = self.canvas.reshape(padded_rows, self.char_height, padded_cols, self.char_width, -1)
+            cells[rows, :, cols] = self._composite(rows, cols, bg_color)
+
+        offset_y, offset_x = atlas.margin_y * self.char_height, atlas.margin_x * self.char_width
+        width, height = size
+        # 受影响单元格的外接框换算到输出图像的像素坐标，落在可见区域之外时为 None
+        rows = np.nonzero(affected.any(axis=1))[0]
+        cols = np.nonzero(affected.any(axis=0))[0]
+        left = max(cols[0] * self.char_width - offset_x, 0)
+        top = max(rows[0] * self.char_height - offset_y, 0)
+        right = min((cols[-1] + 1) * self.char_width - offset_x, width)
+        bottom = min((rows[-1] + 1) * self.char_height - offset_y, height)
+        self.changed = (int(left), int(top), int(right), int(bottom)) if left < right and top < bottom else None
+        if reset:
+            # 重新开始时整幅图像都可能与上一帧不同
+            self.changed = (0, 0, width, height)
+        view = self.canvas[offset_y:offset_y + height, offset_x:offset_x + width]
+        # 复制一份，画布在下一帧会被原地修改
+        self.image = Image.fromarray(np.array(view[:, :, 0] if mode == "L" else view), mode)
+        return self.image
+
+    def _redraw(self, bg_color, size, mode):
+        """
+        Redraw the whole canvas from the current grid with GlyphAtlas.
+        """
+        atlas = self.atlas
+        if mode == "RGB":
+            self.canvas = atlas.render_color_canvas(self.char_indices, self.colors, bg_color, size)
+        else:
+            # 灰度输出正好是网格区域，边距部分不会显示
+            num_rows, num_cols = self.char_indices.shape
+            offset_y, offset_x = atlas.margin_y * self.char_height, atlas.margin_x * self.char_width
+            coverage = atlas.coverage(self.char_indices)
+            fill = self.colors[0, 0, 0]
+            self.canvas[offset_y:offset_y + num_rows * self.char_height,
+                        offset_x:offset_x + num_cols * self.char_width, 0] = np.rint(
+                bg_color[0] + (fill - bg_color[0]) * coverage)
+
+    def _composite(self, rows, cols, bg_color):
+        """
+        Recomposite the given padded-canvas cells from scratch, drawing every glyph block that
+        lands on them in the same order GlyphAtlas.render_color does.
+        """
+        atlas = self.atlas
+        num_rows, num_cols = self.char_indices.shape
+        pixels = np.empty((len(rows), self.char_height, self.char_width, len(bg_color)), dtype=np.float32)
+        pixels[:] = bg_color
+        for dy in reversed(range(atlas.blocks_y)):
+            for dx in reversed(range(atlas.blocks_x)):
+                if (dy, dx) not in atlas.block_bounds:
+                    continue
+                src_rows, src_cols = rows - dy, cols - dx
+                valid = np.nonzero((src_rows >= 0) & (src_rows < num_rows) & (src_cols >= 0) & (src_cols < num_cols))[0]
+                src_rows, src_cols = src_rows[valid], src_cols[valid]
+                indices = self.char_indices[src_rows, src_cols]
+                inked = np.nonzero(atlas.block_ink[indices, dy, dx])[0]
+                valid, indices = valid[inked], indices[inked]
+                alpha = atlas.tiles[indices, dy, dx][..., np.newaxis] / np.float32(255)
+                fill = self.colors[src_rows[inked], src_cols[inked], np.newaxis, np.newaxis]
+                pixels[valid] += (fill - pixels[valid]) * alpha
+        return np.rint(pixels).astype(np.uint8)
+
+    def summary(self):
+        """
+        One-line report of how much of each frame had to be redrawn.
+        """
+        if not self.dirty_ratios:
+            return "Delta rendering: no frames rendered"
+        ratios = np.array(self.dirty_ratios) * 100
+        return "Delta rendering: {} frames, {} reused unchanged, dirty cells per frame {:.1f}% mean / {:.1f}% median / {:.1f}% max".format(
+            len(ratios), self.reused_frames, ratios.mean(), np.median(ratios), ratios.max())
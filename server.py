@@ -0,0 +1,397 @@
+"""
+Conversion daemon: keeps converters (fonts, ramps, glyph atlases) warm in a pool of worker
+processes and serves conversion requests over HTTP/1.1 on localhost or on a Unix socket:
+
+    python server.py --port 8765 --workers 4
+    curl --data-binary @data/input.jpg "http://127.0.0.1:8765/convert/img2img?num_cols=120" -o output.png
+    python server.py --socket /tmp/ascii.sock
+    curl --unix-socket /tmp/ascii.sock http://localhost/metrics
+
+POST /convert/<img2txt|img2img|img2img_color> takes the encoded image as the body and the
+options as query parameters: language, mode, num_cols, background, dither, format (text, ansi,
+ansi256 or html for img2txt; png, jpg or webp for the images), color_step and timeout (seconds,
+at most --timeout). GET /metrics returns queue depth, counters and latency percentiles as JSON,
+GET /health returns "ok".
+
+The asyncio front end only parses requests; conversions run in a ProcessPoolExecutor. At most
+workers + max_queue conversions are admitted at a time, the rest get 503 with Retry-After at
+once, so a burst cannot build an unbounded backlog. A request that does not finish within its
+timeout gets 504 and is cancelled if no worker has started it yet.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import io
+import json
+import os
+import signal
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from converter import Converter
+from utils import load_image_for_grid
+
+CONVERTERS = ("img2txt", "img2img", "img2img_color")
+TEXT_FORMATS = ("text", "ansi", "ansi256", "html")
+IMAGE_FORMATS = {"png": ("PNG", "image/png"), "jpg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+MAX_COLS = 2000
+# 延迟百分位按最近这么多个请求计算
+LATENCY_WINDOW = 4096
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+# 每个 worker 进程中按参数缓存的转换器，字体、字符表和字形图集只加载一次
+_converters = {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_warm(spec):
+    """
+    "img2txt:simple" or "img2img:english:standard" -> (converter, language, mode), with the
+    scripts' defaults for what is left out.
+    """
+    kind, *rest = spec.split(":")
+    if kind not in CONVERTERS:
+        raise argparse.ArgumentTypeError("Unknown converter {}".format(kind))
+    if kind == "img2txt":
+        return kind, "general", rest[0] if rest else "complex"
+    return kind, rest[0] if rest else "english", rest[1] if len(rest) > 1 else "standard"
+
+
+def request_options(kind, query):
+    """
+    Conversion options of a request from its query string, with the scripts' defaults.
+    Raises ValueError for invalid values.
+    """
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    text = kind == "img2txt"
+    try:
+        options = {
+            "kind": kind,
+            # img2txt 的简单/复杂模式即 general 字母表
+            "language": "general" if text else params.get("language", "english"),
+            "mode": params.get("mode", "complex" if text else "standard"),
+            "num_cols": int(params.get("num_cols", 150 if text else 300)),
+            "background": params.get("background", "black"),
+            "dither": params.get("dither", "0").lower() in ("1", "true", "yes"),
+            "format": params.get("format", "text" if text else "png"),
+            "color_step": int(params.get("color_step", 8)),
+            "timeout": float(params["timeout"]) if "timeout" in params else None,
+        }
+    except ValueError as error:
+        raise ValueError("Invalid parameter: {}".format(error))
+    if not 0 < options["num_cols"] <= MAX_COLS:
+        raise ValueError("num_cols must be between 1 and {}".format(MAX_COLS))
+    if options["background"] not in ("black", "white"):
+        raise ValueError("background must be black or white")
+    if options["format"] not in (TEXT_FORMATS if text else IMAGE_FORMATS):
+        raise ValueError("Unsupported format {}".format(options["format"]))
+    if options["color_step"] <= 0:
+        raise ValueError("color_step must be positive")
+    # timeout=0 或负数不能当作"未指定"，否则会得到服务器的最大超时或直接 504
+    if options["timeout"] is not None and not options["timeout"] > 0:
+        raise ValueError("timeout must be positive")
+    return options
+
+
+def get_converter(language, mode, background="black", dither=False, atlas=True):
+    key = (language, mode, background, dither)
+    if key not in _converters:
+        _converters[key] = Converter(language, mode, background=background, dither=dither)
+    if atlas:
+        _converters[key].load_atlas()
+    return _converters[key]
+
+
+def warm_worker(specs):
+    """
+    Worker initializer: load the converters of specs before the first request arrives.
+    """
+    for kind, language, mode in specs:
+        get_converter(language, mode, atlas=kind != "img2txt")
+
+
+def convert_request(options, data):
+    """
+    Convert one encoded image in a worker process. Returns (body, content type, seconds).
+    """
+    start = time.perf_counter()
+    kind, num_cols = options["kind"], options["num_cols"]
+    converter = get_converter(options["language"], options["mode"], options["background"], options["dither"],
+                              kind != "img2txt")
+    image, size, decode_scale = load_image_for_grid(data, num_cols, converter.scale)
+    if image is None:
+        raise ValueError("Cannot read image")
+    if kind == "img2txt":
+        text = converter.to_text(image, num_cols, options["format"], options["color_step"], size, decode_scale)
+        content_type = "text/html" if options["format"] == "html" else "text/plain"
+        return text.encode("utf-8"), content_type + "; charset=utf-8", time.perf_counter() - start
+    if kind == "img2img":
+        out_image = converter.to_image(image, num_cols, size, decode_scale)
+    else:
+        out_image = converter.to_color_image(image, num_cols, size, decode_scale)
+    image_format, content_type = IMAGE_FORMATS[options["format"]]
+    output = io.BytesIO()
+    out_image.save(output, format=image_format)
+    return output.getvalue(), content_type, time.perf_counter() - start
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = np.array(values) * 1000
+    return {"count": int(values.size), "p50": float(np.percentile(values, 50)),
+            "p90": float(np.percentile(values, 90)), "p99": float(np.percentile(values, 99)),
+            "max": float(values.max())}
+
+
+async def read_request(reader, max_body):
+    """
+    (method, target, headers, body) of the next request on a connection, None once the client
+    has closed it.
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if error.partial.strip():
+            raise HTTPError(400, "Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Request header too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "Chunked bodies are not supported, send Content-Length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, "Body larger than {} bytes".format(max_body))
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def format_response(status, content_type, body, keep_alive=True, headers=None):
+    lines = ["HTTP/1.1 {} {}".format(status, REASONS.get(status, "")), "Content-Type: " + content_type,
+             "Content-Length: {}".format(len(body)), "Connection: " + ("keep-alive" if keep_alive else "close")]
+    lines.extend("{}: {}".format(name, value) for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def json_body(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def error_response(error):
+    return error.status, "application/json", json_body({"error": str(error)}), {}
+
+
+class ConversionServer:
+    """
+    asyncio front end: HTTP parsing, admission control and metrics in the event loop, the
+    conversions in a process pool whose workers keep their converters between requests.
+    """
+
+    def __init__(self, workers, max_queue, timeout, max_body, warm):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_body = max_body
+        self.warm = warm
+        self.executor = None
+        self.in_flight = 0
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.worker_seconds = collections.deque(maxlen=LATENCY_WINDOW)
+        self.start_time = time.time()
+
+    async def start(self):
+        """
+        Start the workers and wait until every one has loaded its converters.
+        """
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=warm_worker,
+                                                               initargs=(self.warm,))
+        # 每次提交都会在没有空闲 worker 时新建一个进程，提交 workers 个空任务即启动全部进程
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, time.sleep, 0) for _ in range(self.workers)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def queue_depth(self):
+        return max(0, self.in_flight - self.workers)
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "counters": dict(self.counters),
+            "latency_ms": percentiles(self.latencies),
+            "worker_ms": percentiles(self.worker_seconds),
+            "uptime_seconds": time.time() - self.start_time,
+        }
+
+    def _release(self):
+        self.in_flight -= 1
+
+    async def convert(self, kind, query, body):
+        """
+        (status, content type, body, headers) of one conversion request.
+        """
+        start = time.perf_counter()
+        self.counters["requests"] += 1
+        try:
+            options = request_options(kind, query)
+        except ValueError as error:
+            self.counters["bad_requests"] += 1
+            return 400, "application/json", json_body({"error": str(error)}), {}
+        # 背压：已接纳的请求达到上限时立即拒绝，而不是让排队时间无限增长
+        if self.in_flight >= self.workers + self.max_queue:
+            self.counters["rejected"] += 1
+            return 503, "application/json", json_body({"error": "Server busy"}), {"Retry-After": "1"}
+        timeout = self.timeout if options["timeout"] is None else min(options["timeout"], self.timeout)
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            future = executor.submit(convert_request, options, body)
+            self.in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.in_flight)
+            # 超时后仍在运行的转换继续占用名额，直到 worker 真正完成
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+            output, content_type, seconds = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            return 504, "application/json", json_body({"error": "Timed out after {} s".format(timeout)}), {}
+        except ValueError as error:
+            self.counters["bad_requests"] += 1
+            return 400, "application/json", json_body({"error": str(error)}), {}
+        except concurrent.futures.process.BrokenProcessPool:
+            # worker 异常退出（例如内存不足被杀掉）：换一个新的进程池，同时失败的请求只换一次
+            self.counters["errors"] += 1
+            if executor is self.executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                await self.start()
+            return 500, "application/json", json_body({"error": "Worker process died"}), {}
+        except Exception as error:
+            self.counters["errors"] += 1
+            return 500, "application/json", json_body({"error": "{}: {}".format(type(error).__name__, error)}), {}
+        self.counters["completed"] += 1
+        self.latencies.append(time.perf_counter() - start)
+        self.worker_seconds.append(seconds)
+        return 200, content_type, output, {"X-Worker-Ms": "{:.1f}".format(seconds * 1000)}
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, "text/plain", b"ok", {}
+        if url.path == "/metrics":
+            return 200, "application/json", json_body(self.metrics()), {}
+        prefix, _, kind = url.path.rpartition("/")
+        if prefix != "/convert" or kind not in CONVERTERS:
+            raise HTTPError(404, "Unknown path {}".format(url.path))
+        if method != "POST":
+            raise HTTPError(405, "Use POST with the image as the body")
+        return await self.convert(kind, url.query, body)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve the requests of one keep-alive connection in order.
+        """
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, self.max_body)
+                except HTTPError as error:
+                    # 请求没有读完，回复后关闭连接
+                    response = error_response(error)
+                else:
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    try:
+                        response = await self.route(method, target, body)
+                    except HTTPError as error:
+                        response = error_response(error)
+                status, content_type, output, extra = response
+                writer.write(format_response(status, content_type, output, keep_alive, extra))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def get_args():
+    parser = argparse.ArgumentParser("ASCII conversion server")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--socket", type=str, default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Conversion worker processes")
+    parser.add_argument("--max_queue", type=int, default=None,
+                        help="Requests admitted beyond the busy workers before answering 503 (default: 4 per worker)")
+    parser.add_argument("--timeout", type=float, default=30, help="Largest time a request may take, in seconds")
+    parser.add_argument("--max_body_mb", type=float, default=32, help="Largest accepted image, in MB")
+    parser.add_argument("--warm", type=parse_warm, nargs="*",
+                        default=[("img2txt", "general", "complex"), ("img2img", "english", "standard"),
+                                 ("img2img_color", "english", "standard")],
+                        help="Converters every worker loads at start: img2txt[:mode] or img2img[_color][:language[:mode]]")
+    return parser.parse_args()
+
+
+async def serve(args):
+    server = ConversionServer(args.workers, args.max_queue if args.max_queue is not None else 4 * args.workers,
+                              args.timeout, int(args.max_body_mb * 1024 * 1024), args.warm)
+    start = time.perf_counter()
+    await server.start()
+    if args.socket:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.socket)
+        address = args.socket
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        address = "http://{}:{}".format(args.host, args.port)
+    print("Serving on {} with {} workers (warm in {:.2f} s)".format(address, args.workers,
+                                                                   time.perf_counter() - start), flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    async with listener:
+        await stop.wait()
+    server.close()
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+    print(json.dumps(server.metrics()["counters"]))
+
+
+def main():
+    asyncio.run(serve(get_args()))
+
+
+if __name__ == "__main__":
+    main()
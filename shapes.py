@@ -0,0 +1,110 @@
+"""
+Shape-matching glyph selection. Brightness mode picks a character from the mean of its cell
+only, so an edge or a thin line through a cell comes out as a flat mid-tone. Here every cell is
+downsampled to a small patch (8x16 by default, the cell aspect of the grid, smaller when the
+cell has fewer pixels) and compared with every glyph of the ramp rasterized to the same patch
+size; the glyph with the best score wins.
+
+The glyphs are compared as they look drawn on white, so bright cells still get sparse glyphs
+as in brightness mode, and the cell brightness c is mapped linearly onto the range of glyph
+mean brightness. The score of glyph g over the n pixels of a patch is
+-n (mean(c) - mean(g))^2 + 2 (c - mean(c)).(g - mean(g)),
+which is -||c - g||^2 without its penalty on glyph texture: a plain least-squares match turns
+flat mid-tones into blanks, since a blank glyph is closer to a flat patch than any glyph of
+black strokes on white. Flat cells get the glyph of the nearest tone, as in brightness mode,
+and cells with edges or lines the glyph whose strokes line up with them. Without the terms
+that are equal for every glyph the score is linear in c, so all cells, with a constant 1
+appended, are scored against all glyphs, with those terms appended, in one float32 matrix
+product done by BLAS instead of a loop over cells. Ink that a glyph spills into the cells
+below or beside it (underscores, descenders) darkens them and counts as a tone error of its
+mean.
+"""
+import cv2
+import numpy as np
+
+# 每次矩阵乘法处理的单元格数上限，限制大网格时补丁矩阵和得分矩阵的内存
+MATCH_BAND_CELLS = 1 << 15
+
+
+class ShapeMatcher:
+    """
+    Glyph patches of a GlyphAtlas prepared for matching against the cells of gray images.
+    Patches are patch_width wide and aspect times as tall, narrower for cells with fewer
+    pixels, since upsampling a cell adds nothing to compare. tone is an optional 256-entry
+    brightness curve applied to the cells first.
+    """
+
+    def __init__(self, atlas, patch_width=8, aspect=2, tone=None):
+        self.atlas = atlas
+        self.patch_width = patch_width
+        self.aspect = aspect
+        self.tone = None if tone is None else np.asarray(tone, dtype=np.uint8)
+        self.dtype = np.uint8 if len(atlas.char_list) <= 256 else np.uint16
+        self._glyph_sets = {}
+
+    def patch_size(self, cell_width):
+        """
+        (width, height) of the patches of cells cell_width pixels wide.
+        """
+        width = max(1, min(self.patch_width, int(cell_width)))
+        return width, max(1, int(round(width * self.aspect)))
+
+    def glyph_set(self, patch_size):
+        """
+        (patch pixels + 1, glyphs) float32 matrix of the glyph patches with the per-glyph score
+        terms as its last row, built once per patch size.
+        """
+        if patch_size not in self._glyph_sets:
+            atlas = self.atlas
+            num_glyphs = len(atlas.char_list)
+            blocks = {}
+            for dy in range(atlas.blocks_y):
+                for dx in range(atlas.blocks_x):
+                    blocks[dy, dx] = np.stack([cv2.resize(tile, patch_size, interpolation=cv2.INTER_AREA)
+                                               for tile in atlas.tiles[:, dy, dx]]).reshape(num_glyphs, -1)
+            # 白底黑字的样子：墨迹越多越暗，与亮度模式的字符顺序一致
+            glyphs = 255 - blocks.pop((atlas.margin_y, atlas.margin_x)).astype(np.float32)
+            # 溢出到相邻单元格的墨迹（下划线、下伸部分）使相邻单元格变暗，按平均墨迹计入色调误差
+            spill = sum(ink.mean(axis=1) for ink in blocks.values()) if blocks else 0
+            means = glyphs.mean(axis=1)
+            low, high = float(means.min()), float(means.max())
+            # 单元格亮度 c 线性映射为 low + gain * c，与字形的亮度范围对齐
+            gain = max((high - low) / 255, 1e-6)
+            size = glyphs.shape[1]
+            bias = (low * glyphs.sum(axis=1) - 0.5 * size * (means ** 2 + spill ** 2)) / gain
+            self._glyph_sets[patch_size] = np.vstack([glyphs.T, bias]).astype(np.float32)
+        return self._glyph_sets[patch_size]
+
+    def patches(self, gray_image, num_rows, num_cols, cell_width, cell_height, patch_size):
+        """
+        The cells resized to patches, as a (num_rows, patch_height, num_cols, patch_width) uint8 array.
+        """
+        patch_width, patch_height = patch_size
+        bottom = min(int(num_rows * cell_height), gray_image.shape[0])
+        right = min(int(num_cols * cell_width), gray_image.shape[1])
+        # 缩小不到一半时双线性与区域平均几乎相同，但快得多
+        interpolation = cv2.INTER_AREA if cell_width >= 2 * patch_width else cv2.INTER_LINEAR
+        resized = cv2.resize(gray_image[:bottom, :right], (num_cols * patch_width, num_rows * patch_height),
+                             interpolation=interpolation)
+        if self.tone is not None:
+            resized = cv2.LUT(resized, self.tone)
+        return resized.reshape(num_rows, patch_height, num_cols, patch_width)
+
+    def match(self, gray_image, num_rows, num_cols, cell_width, cell_height):
+        """
+        (num_rows, num_cols) glyph indices of the best matching glyph of every cell.
+        """
+        patch_size = self.patch_size(cell_width)
+        glyphs = self.glyph_set(patch_size)
+        patches = self.patches(gray_image, num_rows, num_cols, cell_width, cell_height, patch_size)
+        patch_pixels = patch_size[0] * patch_size[1]
+        indices = np.empty((num_rows, num_cols), dtype=self.dtype)
+        band = max(1, MATCH_BAND_CELLS // num_cols)
+        for start in range(0, num_rows, band):
+            rows = patches[start:start + band]
+            # 每个单元格一行，末尾补常数 1 与字形矩阵最后一行的偏置相乘，一次矩阵乘法得到全部得分
+            cells = np.empty((len(rows) * num_cols, patch_pixels + 1), dtype=np.float32)
+            cells[:, -1] = 1
+            cells[:, :-1].reshape(len(rows), num_cols, patch_size[1], patch_size[0])[...] = rows.transpose(0, 2, 1, 3)
+            indices[start:start + len(rows)] = (cells @ glyphs).argmax(axis=1).reshape(len(rows), num_cols)
+        return indices
@@ -0,0 +1,377 @@
+"""
+Segment-sharded video conversion, to spread a long video over several processes or machines
+that share a filesystem. All shard files live next to the manifest:
+
+    plan    split the input into frame ranges and write a JSON manifest holding the converter settings
+    run     convert shards: a worker seeks to the first frame of its range (CAP_PROP_POS_FRAMES),
+            writes a segment and then a status file with the frame count
+    merge   check that every shard is done with the expected frame count and join the segments in order
+    local   plan if needed, run every pending shard in its own process (retrying failed ones), merge
+
+Video segments are lossless FFV1 .avi files at the largest ASCII frame size, and the status file keeps
+the size of every frame, so the merged XVID output is the same as a single-process conversion.
+.asv segments are containers whose records are copied into the output as they are. Animated
+(.gif, .webp) and piped (-) outputs are rejected.
+
+    python video2video.py --input data/input.mp4 --output data/output.avi --shard plan --shards 8
+    python video2video.py --shard run --manifest data/output.avi.shards.json --shard_index 3
+    python video2video.py --shard merge --manifest data/output.avi.shards.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+import cv2
+import numpy as np
+
+from animation import ANIMATION_EXTENSIONS
+from asciivideo import AsciiVideoReader, AsciiVideoWriter, CONTAINER_EXTENSION
+from rawpipe import PIPE
+
+MANIFEST_VERSION = 1
+SHARD_COMMANDS = ("plan", "run", "merge", "local")
+# 不写入清单的参数：分片控制参数和只对当前进程有效的参数
+_LOCAL_SETTINGS = {"shard", "manifest", "shards", "shard_index", "retries", "play", "profile", "trace"}
+
+
+def manifest_path_for(args):
+    return args.manifest or args.output + ".shards.json"
+
+
+def write_json(path, data):
+    """
+    Write JSON atomically, so a reader on another machine never sees half a file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump(data, tmp_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError("{} is not a shard manifest".format(manifest_path))
+    return manifest
+
+
+def shard_paths(manifest_path, shard):
+    """
+    (segment path, status path) of a shard, next to the manifest.
+    """
+    segment_path = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), shard["segment"])
+    return segment_path, os.path.splitext(segment_path)[0] + ".json"
+
+
+def read_status(manifest_path, shard):
+    try:
+        with open(shard_paths(manifest_path, shard)[1]) as status_file:
+            return json.load(status_file)
+    except (OSError, ValueError):
+        return None
+
+
+def check_output(output_path):
+    """
+    Raise ValueError for outputs that merging cannot write: segments are joined into an XVID
+    video or an .asv container, not into an animation or a pipe.
+    """
+    if output_path == PIPE or os.path.splitext(output_path)[1].lower() in ANIMATION_EXTENSIONS:
+        raise ValueError("Sharded conversion cannot write {}: use a video file or {}".format(
+            "to stdout" if output_path == PIPE else output_path, CONTAINER_EXTENSION))
+
+
+def plan_shards(manifest_path, settings, num_shards):
+    """
+    Split settings["input"] into num_shards frame ranges and write the manifest. The last range
+    is open-ended, since the frame count in the header of some formats is only an estimate.
+    """
+    check_output(settings["output"])
+    cap = cv2.VideoCapture(settings["input"])
+    if not cap.isOpened():
+        raise ValueError("Cannot open video {}".format(settings["input"]))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = settings.get("fps") or int(cap.get(cv2.CAP_PROP_FPS))
+    cap.release()
+    if frame_count <= 0:
+        raise ValueError("Cannot count the frames of {}".format(settings["input"]))
+
+    num_shards = max(1, min(num_shards, frame_count))
+    bounds = np.linspace(0, frame_count, num_shards + 1).astype(int)
+    name = os.path.splitext(os.path.basename(manifest_path))[0]
+    extension = CONTAINER_EXTENSION if os.path.splitext(settings["output"])[1] == CONTAINER_EXTENSION else ".avi"
+    shards = [{"index": index, "start": int(bounds[index]),
+               "stop": int(bounds[index + 1]) if index < num_shards - 1 else None,
+               "segment": "{}.{:04d}{}".format(name, index, extension)}
+              for index in range(num_shards)]
+    manifest = {"version": MANIFEST_VERSION, "input": settings["input"], "output": settings["output"],
+                "frame_count": frame_count, "fps": fps, "settings": dict(settings, fps=fps), "shards": shards}
+    write_json(manifest_path, manifest)
+    # 重新规划后旧的状态文件不再有效
+    for shard in shards:
+        status_path = shard_paths(manifest_path, shard)[1]
+        if os.path.exists(status_path):
+            os.remove(status_path)
+    return manifest
+
+
+def pending_shards(manifest_path, manifest):
+    """
+    Indices of the shards that are not done (never run, failed or interrupted).
+    """
+    return [shard["index"] for shard in manifest["shards"]
+            if (read_status(manifest_path, shard) or {}).get("status") != "done"]
+
+
+class ShardCapture:
+    """
+    A cv2.VideoCapture limited to frames [start, stop) (stop None reads to the end), positioned
+    with CAP_PROP_POS_FRAMES. Fails if the backend cannot land on the first frame exactly.
+    """
+
+    def __init__(self, cap, start, stop=None):
+        if start and (not cap.set(cv2.CAP_PROP_POS_FRAMES, start) or int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start):
+            raise RuntimeError("Cannot seek to frame {} (landed on {})".format(
+                start, int(cap.get(cv2.CAP_PROP_POS_FRAMES))))
+        self.cap = cap
+        self.remaining = None if stop is None else stop - start
+        self.frames = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        if self.remaining == 0:
+            return False, None
+        ok, frame = self.cap.read(image)
+        if ok:
+            self.frames += 1
+            if self.remaining is not None:
+                self.remaining -= 1
+        return ok, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+class SegmentWriter:
+    """
+    Lossless (FFV1) video segment. Frames are padded to a fixed canvas, at least canvas_shape and
+    even-sized, and the real (height, width) of every frame is kept in sizes.
+    """
+
+    def __init__(self, path, fps, canvas_shape):
+        height, width = canvas_shape[0] + canvas_shape[0] % 2, canvas_shape[1] + canvas_shape[1] % 2
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"FFV1"), fps, (width, height))
+        if not self.out.isOpened():
+            raise RuntimeError("Cannot write FFV1 segment {}".format(path))
+        self.sizes = []
+
+    def write(self, frame):
+        height, width = frame.shape[:2]
+        self.canvas[:height, :width] = frame
+        self.out.write(self.canvas)
+        self.sizes.append([height, width])
+
+    def release(self):
+        self.out.release()
+
+
+def run_shard(manifest_path, index, convert):
+    """
+    Convert one shard with convert(settings, segment_path, (start, stop)) -> (frames, sizes) and
+    record the outcome in its status file. The segment is written under a temporary name and
+    renamed once complete. Returns the status.
+    """
+    manifest = load_manifest(manifest_path)
+    shard = manifest["shards"][index]
+    segment_path, status_path = shard_paths(manifest_path, shard)
+    root, extension = os.path.splitext(segment_path)
+    partial_path = root + ".partial" + extension
+    status = {"index": index, "host": socket.gethostname(), "pid": os.getpid()}
+    start = time.perf_counter()
+    try:
+        frames, sizes = convert(argparse.Namespace(**manifest["settings"]), partial_path,
+                                (shard["start"], shard["stop"]))
+        if shard["stop"] is not None and frames != shard["stop"] - shard["start"]:
+            raise RuntimeError("Converted {} of {} frames".format(frames, shard["stop"] - shard["start"]))
+        os.replace(partial_path, segment_path)
+        status.update(status="done", frames=frames, sizes=sizes)
+    except Exception:
+        status.update(status="failed", error=traceback.format_exc())
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    status["seconds"] = time.perf_counter() - start
+    write_json(status_path, status)
+    return status
+
+
+def segment_frames(segment_path):
+    if segment_path.endswith(CONTAINER_EXTENSION):
+        reader = AsciiVideoReader(segment_path)
+        count = len(reader)
+        reader.close()
+        return count
+    cap = cv2.VideoCapture(segment_path)
+    count = 0
+    while cap.grab():
+        count += 1
+    cap.release()
+    return count
+
+
+def merge_shards(manifest_path):
+    """
+    Verify every shard and concatenate the segments into the output in order. A segment whose
+    file does not hold the frames its status promises is marked failed, so it is run again.
+    Returns the number of frames merged.
+    """
+    manifest = load_manifest(manifest_path)
+    check_output(manifest["output"])
+    problems = []
+    statuses = []
+    for shard in manifest["shards"]:
+        status = read_status(manifest_path, shard) or {"status": "pending"}
+        statuses.append(status)
+        segment_path = shard_paths(manifest_path, shard)[0]
+        if status["status"] != "done":
+            problems.append("shard {} is {}".format(shard["index"], status["status"]))
+        elif shard["stop"] is not None and status["frames"] != shard["stop"] - shard["start"]:
+            problems.append("shard {} converted {} of {} frames".format(shard["index"], status["frames"],
+                                                                       shard["stop"] - shard["start"]))
+        elif not os.path.exists(segment_path) or segment_frames(segment_path) != status["frames"]:
+            problems.append("shard {} segment is missing or incomplete".format(shard["index"]))
+            status.update(status="failed", error="Segment does not hold {} frames".format(status["frames"]))
+            write_json(shard_paths(manifest_path, shard)[1], status)
+    if problems:
+        raise RuntimeError("Cannot merge {}:\n  {}".format(manifest_path, "\n  ".join(problems)))
+
+    total = sum(status["frames"] for status in statuses)
+    if total != manifest["frame_count"]:
+        print("The input header reported {} frames, {} were converted".format(manifest["frame_count"], total))
+    segment_paths = [shard_paths(manifest_path, shard)[0] for shard in manifest["shards"]]
+    if manifest["output"].endswith(CONTAINER_EXTENSION):
+        merge_containers(segment_paths, manifest["output"])
+    else:
+        merge_videos(segment_paths, [status["sizes"] for status in statuses], manifest["output"], manifest["fps"])
+    return total
+
+
+def merge_containers(segment_paths, output_path):
+    writer = None
+    for segment_path in segment_paths:
+        reader = AsciiVideoReader(segment_path)
+        if writer is None:
+            header = dict(reader.header)
+            fixed = [header.pop(key) for key in ("char_list", "num_rows", "num_cols", "fps")]
+            writer = AsciiVideoWriter(output_path, *fixed, **header)
+        writer.append(reader)
+        reader.close()
+    writer.close()
+
+
+def merge_videos(segment_paths, sizes, output_path, fps):
+    """
+    Crop the padded frames of every segment back to their size and write them to one XVID
+    video, sized by the first frame like a single-process conversion.
+    """
+    out = None
+    for segment_path, segment_sizes in zip(segment_paths, sizes):
+        cap = cv2.VideoCapture(segment_path)
+        for height, width in segment_sizes:
+            ok, frame = cap.read()
+            if not ok:
+                raise RuntimeError("Segment {} ended early".format(segment_path))
+            if out is None:
+                out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"XVID"), fps, (width, height))
+            out.write(np.ascontiguousarray(frame[:height, :width]))
+        cap.release()
+    if out:
+        out.release()
+
+
+def run_local(manifest_path, script_path, retries=1, parallel=None):
+    """
+    Run every pending shard as a separate `script --shard run` process, at most parallel at a
+    time, retrying failed shards up to retries times. Returns the shards still not done.
+    """
+    parallel = parallel or os.cpu_count()
+    manifest = load_manifest(manifest_path)
+    pending = pending_shards(manifest_path, manifest)
+    for attempt in range(retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print("Retrying shards {}".format(pending))
+        for first in range(0, len(pending), parallel):
+            processes = [subprocess.Popen([sys.executable, script_path, "--shard", "run", "--manifest", manifest_path,
+                                           "--shard_index", str(index)])
+                         for index in pending[first:first + parallel]]
+            for process in processes:
+                process.wait()
+        pending = pending_shards(manifest_path, manifest)
+    return pending
+
+
+def resumable(manifest_path, settings):
+    """
+    Whether an existing manifest was planned with the same settings.
+    """
+    try:
+        manifest = load_manifest(manifest_path)
+    except (OSError, ValueError):
+        return False
+    return manifest["settings"] == dict(settings, fps=settings.get("fps") or manifest["fps"])
+
+
+def run_command(args, script_path, convert):
+    """
+    Handle --shard for a video converter; convert is its segment converter (see run_shard).
+    Returns the process exit status.
+    """
+    manifest_path = manifest_path_for(args)
+    settings = {key: value for key, value in vars(args).items() if key not in _LOCAL_SETTINGS}
+    # local 模式下清单已存在且设置相同时继续上次的运行，只补跑未完成的分片
+    if args.shard == "plan" or (args.shard == "local" and not resumable(manifest_path, settings)):
+        manifest = plan_shards(manifest_path, settings, args.shards)
+        print("Planned {} shards over {} frames in {}".format(len(manifest["shards"]), manifest["frame_count"],
+                                                              manifest_path))
+        if args.shard == "plan":
+            return 0
+
+    if args.shard == "run":
+        indices = args.shard_index or pending_shards(manifest_path, load_manifest(manifest_path))
+        failed = 0
+        for index in indices:
+            status = run_shard(manifest_path, index, convert)
+            if status["status"] == "done":
+                print("Shard {} done: {} frames in {:.2f} s".format(index, status["frames"], status["seconds"]))
+            else:
+                failed += 1
+                print("Shard {} failed:\n{}".format(index, status["error"].rstrip()))
+        return 1 if failed else 0
+
+    if args.shard == "local":
+        pending = run_local(manifest_path, script_path, args.retries)
+        if pending:
+            print("Shards {} failed, see their status files".format(pending))
+            return 1
+
+    try:
+        total = merge_shards(manifest_path)
+    except RuntimeError as error:
+        print(error)
+        return 1
+    print("Merged {} frames into {}".format(total, load_manifest(manifest_path)["output"]))
+    return 0
@@ -0,0 +1,209 @@
+"""
+Strip-based rendering of large ASCII images: the output is produced a few text rows at a time
+and streamed into a PNG or TIFF encoder, so memory stays bounded by the strip size however
+large the image is. The crop box is computed from the glyph ink extents instead of getbbox().
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+STRIP_FORMATS = (".png", ".tif", ".tiff")
+
+
+class PngStripWriter:
+    """
+    Minimal streaming PNG encoder (8-bit grayscale or RGB): scanlines are Sub-filtered, fed to
+    one zlib stream and flushed as IDAT chunks as soon as the compressor produces output.
+    """
+
+    def __init__(self, path, width, height, channels):
+        self.file = open(path, "wb")
+        self.channels = channels
+        self.compressor = zlib.compressobj(6)
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 0 if channels == 1 else 2
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    def write(self, rows):
+        height = rows.shape[0]
+        rows = rows.reshape(height, -1)
+        # Sub 滤波：每个字节减去左边同一通道的字节
+        lines = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+        lines[:, 0] = 1
+        lines[:, 1:self.channels + 1] = rows[:, :self.channels]
+        np.subtract(rows[:, self.channels:], rows[:, :-self.channels], out=lines[:, self.channels + 1:])
+        data = self.compressor.compress(lines.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+
+class TiffStripWriter:
+    """
+    Minimal streaming baseline TIFF encoder (uncompressed, one strip): the header and IFD are
+    written first since every offset is known in advance, then pixel rows are appended.
+    """
+
+    def __init__(self, path, width, height, channels):
+        size = width * height * channels
+        if size >= 2 ** 32:
+            raise ValueError("Image too large for a baseline TIFF ({} bytes)".format(size))
+        self.file = open(path, "wb")
+        entries = 10
+        ifd_offset = 8
+        extra_offset = ifd_offset + 2 + entries * 12 + 4
+        data_offset = extra_offset + 8
+        if channels == 1:
+            bits_per_sample = (1, 8)
+        else:
+            bits_per_sample = (3, extra_offset)
+        tags = [
+            (256, 4, 1, width),
+            (257, 4, 1, height),
+            (258, 3) + bits_per_sample,
+            (259, 3, 1, 1),
+            (262, 3, 1, 1 if channels == 1 else 2),
+            (273, 4, 1, data_offset),
+            (277, 3, 1, channels),
+            (278, 4, 1, height),
+            (279, 4, 1, size),
+            (284, 3, 1, 1),
+        ]
+        header = struct.pack("<2sHI", b"II", 42, ifd_offset) + struct.pack("<H", entries)
+        for tag, kind, count, value in tags:
+            # SHORT 类型的值放在 4 字节字段的低位
+            packed = struct.pack("<HI", value, 0)[:4] if kind == 3 and count == 1 else struct.pack("<I", value)
+            header += struct.pack("<HHI", tag, kind, count) + packed
+        header += struct.pack("<I", 0) + struct.pack("<4H", 8, 8, 8, 0)
+        self.file.write(header)
+
+    def write(self, rows):
+        self.file.write(np.ascontiguousarray(rows).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def open_strip_writer(path, width, height, channels):
+    if os.path.splitext(path)[1].lower() == ".png":
+        return PngStripWriter(path, width, height, channels)
+    return TiffStripWriter(path, width, height, channels)
+
+
+def ink_bounds(atlas):
+    """
+    Ink bounding box (left, top, right, bottom) of every glyph, relative to its cell origin.
+    Glyphs without ink get an empty box.
+    """
+    num_chars = len(atlas.char_list)
+    tiles = atlas.tiles.transpose(0, 1, 3, 2, 4).reshape(
+        num_chars, atlas.blocks_y * atlas.char_height, atlas.blocks_x * atlas.char_width)
+    bounds = np.zeros((num_chars, 4), dtype=np.int64)
+    for index in range(num_chars):
+        ys = np.flatnonzero(tiles[index].any(axis=1))
+        xs = np.flatnonzero(tiles[index].any(axis=0))
+        if len(ys):
+            bounds[index] = (xs[0], ys[0], xs[-1] + 1, ys[-1] + 1)
+    return bounds - np.array([atlas.margin_x * atlas.char_width, atlas.margin_y * atlas.char_height] * 2)
+
+
+def crop_box(atlas, char_indices, size, visible=None):
+    """
+    The box getbbox() would return on the rendered image of size (width, height), computed from
+    the glyph ink extents. visible masks out cells whose glyph cannot be seen (e.g. ink in the
+    background color). Returns None for an image without ink.
+    """
+    bounds = ink_bounds(atlas)[char_indices]
+    inked = bounds[..., 2] > bounds[..., 0]
+    if visible is not None:
+        inked &= visible
+    rows, cols = np.nonzero(inked)
+    if not len(rows):
+        return None
+    bounds = bounds[rows, cols]
+    x, y = cols * atlas.char_width, rows * atlas.char_height
+    width, height = size
+    left = max(int((x + bounds[:, 0]).min()), 0)
+    top = max(int((y + bounds[:, 1]).min()), 0)
+    right = min(int((x + bounds[:, 2]).max()), width)
+    bottom = min(int((y + bounds[:, 3]).max()), height)
+    return left, top, right, bottom
+
+
+def grid_ink_box(atlas, grid_shape, size):
+    """
+    The box crop_box gives when every cell could hold any glyph: it depends only on the grid
+    shape, so all frames of a video share it.
+    """
+    bounds = ink_bounds(atlas)
+    bounds = bounds[bounds[:, 2] > bounds[:, 0]]
+    num_rows, num_cols = grid_shape
+    width, height = size
+    return (max(int(bounds[:, 0].min()), 0), max(int(bounds[:, 1].min()), 0),
+            min((num_cols - 1) * atlas.char_width + int(bounds[:, 2].max()), width),
+            min((num_rows - 1) * atlas.char_height + int(bounds[:, 3].max()), height))
+
+
+def render_rows(atlas, char_indices, colors, bg_color, first_row, last_row, width):
+    """
+    Pixels of text rows [first_row, last_row) of the rendered image, width pixels wide, with
+    the parts of glyphs from neighbouring rows that spill into them. Gray when bg_color is a
+    number (colors is then the ink level), RGB otherwise. Rows past the grid are background.
+    """
+    num_rows = char_indices.shape[0]
+    char_width, char_height = atlas.char_width, atlas.char_height
+    # 影响这几行的字符所在的行：上方的字符可能向下溢出，下方的字符可能向上溢出
+    start = min(max(first_row + atlas.margin_y - atlas.blocks_y + 1, 0), num_rows)
+    stop = min(max(last_row + atlas.margin_y, start), num_rows)
+    height = (last_row - first_row) * char_height
+    if np.ndim(bg_color) == 0:
+        out = np.full((height, width), bg_color, dtype=np.uint8)
+        if stop > start:
+            coverage = atlas.coverage(char_indices[start:stop])
+            top = (first_row - start) * char_height
+            part = coverage[max(top, 0):top + height, :width]
+            out[max(-top, 0):max(-top, 0) + len(part), :part.shape[1]] = np.rint(
+                bg_color + (colors - bg_color) * part)
+        return out
+
+    if stop <= start:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+        out[:] = bg_color
+        return out
+    canvas = atlas.render_color_canvas(char_indices[start:stop], colors[start:stop], bg_color,
+                                       (width, (last_row - start) * char_height))
+    top = (first_row - start + atlas.margin_y) * char_height
+    left = atlas.margin_x * char_width
+    return canvas[top:top + height, left:left + width]
+
+
+def save_strips(path, atlas, char_indices, colors, bg_color, size, strip_rows=32, visible=None):
+    """
+    Render the char grid into an image of size (width, height), crop it to the ink and stream
+    it to a PNG/TIFF file strip_rows text rows at a time. Returns the crop box.
+    """
+    box = crop_box(atlas, char_indices, size, visible) or (0, 0, 1, 1)
+    left, top, right, bottom = box
+    channels = 1 if np.ndim(bg_color) == 0 else 3
+    writer = open_strip_writer(path, right - left, bottom - top, channels)
+    char_height = atlas.char_height
+    first_row = top // char_height
+    last_row = -(-bottom // char_height)
+    for row in range(first_row, last_row, strip_rows):
+        strip_end = min(row + strip_rows, last_row)
+        pixels = render_rows(atlas, char_indices, colors, bg_color, row, strip_end, right)
+        y0 = row * char_height
+        pixels = pixels[max(top - y0, 0):bottom - y0, left:right]
+        writer.write(pixels)
+    writer.close()
+    return box
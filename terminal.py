@@ -0,0 +1,92 @@
+import sys
+import time
+
+import cv2
+
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+CLEAR_SCREEN = "\x1b[2J"
+CURSOR_HOME = "\x1b[H"
+RESET = "\x1b[0m"
+
+
+def ansi_color_rows(chars, colors):
+    """
+    Join a (num_rows, num_cols) char grid into lines with 24-bit foreground colors
+    (num_rows, num_cols, 3, RGB). The escape is only emitted when the color changes.
+    """
+    lines = []
+    for row_chars, row_colors in zip(chars.tolist(), colors.tolist()):
+        parts = []
+        previous = None
+        for char, color in zip(row_chars, row_colors):
+            if color != previous:
+                parts.append("\x1b[38;2;{};{};{}m".format(*color))
+                previous = color
+            parts.append(char)
+        lines.append("".join(parts))
+    return lines
+
+
+def play(cap, fps, frame_to_text, stream=None):
+    """
+    Play an opened cv2.VideoCapture in the terminal at fps frames per second.
+
+    frame_to_text(frame) returns the text of one frame; every frame is sent to the stream in a
+    single write that starts with a cursor-home escape, so the screen is overwritten in place
+    instead of being cleared. Frames whose time has already passed are skipped with
+    cap.grab() without being decoded or converted. Returns (shown, dropped, elapsed seconds).
+    """
+    stream = stream or sys.stdout
+    interval = 1 / fps
+    shown = dropped = 0
+    index = 0
+    stream.write(HIDE_CURSOR + CLEAR_SCREEN)
+    start = time.perf_counter()
+    try:
+        while True:
+            # 落后于时钟时丢掉已经过期的帧
+            behind = int((time.perf_counter() - start) / interval)
+            ok = True
+            while ok and index < behind:
+                ok = cap.grab()
+                index += ok
+                dropped += ok
+            if ok:
+                ok, frame = cap.read()
+            if not ok:
+                break
+            text = CURSOR_HOME + frame_to_text(frame)
+            delay = start + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            stream.write(text)
+            stream.flush()
+            shown += 1
+            index += 1
+    finally:
+        stream.write(RESET + SHOW_CURSOR + "\n")
+        stream.flush()
+    # 最后一帧也要占满自己的显示时间
+    return shown, dropped, max(time.perf_counter() - start, index * interval)
+
+
+def play_video(input_path, fps, frame_to_text):
+    """
+    Play a video file in the terminal and report the achieved frame rate against the target.
+    fps == 0 uses the source frame rate.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if fps == 0:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    play_capture(cap, fps, frame_to_text)
+    cap.release()
+
+
+def play_capture(cap, fps, frame_to_text):
+    """
+    play() followed by the achieved vs. target frame rate report.
+    """
+    shown, dropped, elapsed = play(cap, fps, frame_to_text)
+    print("Played {} frames, dropped {}: {:.1f} fps achieved, {:.1f} fps target".format(
+        shown, dropped, shown / elapsed if elapsed else 0, fps))
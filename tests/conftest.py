@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 仓库的模块都在顶层，合成图像和视频的工具在 benchmarks 中；顶层模块优先（两处都有 animation）
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # 脚本按相对路径加载 fonts/ 下的字体
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,100 @@
+"""
+AnimationWriter output read back with PIL: frame count, durations (unchanged frames lengthen the
+frame before them) and pixels, for the gray and color palettes in GIF and WebP.
+"""
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+import video2video
+from animation import AnimationWriter, blend_palette, color_palette
+from suite import script_args
+
+WIDTH, HEIGHT = 64, 48
+FPS = 20
+
+
+def gray_frames():
+    """
+    (frame, changed box) pairs: a gradient, a changed block, an unchanged frame, a block on an
+    odd offset and another unchanged frame.
+    """
+    frame = np.tile(np.linspace(0, 255, WIDTH).astype(np.uint8), (HEIGHT, 1))
+    frames = [(frame.copy(), None)]
+    frame[10:20, 8:24] = 255
+    frames.append((frame.copy(), (8, 10, 24, 20)))
+    frames.append((frame.copy(), None))
+    frame[21:30, 33:41] = 0
+    frames.append((frame.copy(), (33, 21, 41, 30)))
+    frames.append((frame.copy(), None))
+    return frames
+
+
+def decode(path):
+    with Image.open(path) as image:
+        frames = [(np.array(frame.convert("RGB")), frame.info.get("duration")) for frame in ImageSequence.Iterator(image)]
+        return frames, image.info.get("loop")
+
+
+@pytest.mark.parametrize("extension", [".gif", ".webp"])
+def test_gray_animation(tmp_path, extension):
+    path = str(tmp_path / ("out" + extension))
+    palette = blend_palette((0, 0, 0), (255, 255, 255))
+    frames = gray_frames()
+    with AnimationWriter(path, (WIDTH, HEIGHT), FPS, palette) as writer:
+        for frame, box in frames:
+            writer.write(frame, box)
+    assert (writer.frames, writer.stored_frames) == (5, 3)
+    decoded, loop = decode(path)
+    assert loop == 0
+    # 没有变化的帧并入上一帧：三帧，时长 50、100、100 ms
+    assert [duration for _, duration in decoded] == [50, 100, 100]
+    for (image, _), index in zip(decoded, (0, 1, 3)):
+        assert np.array_equal(image, palette[frames[index][0]])
+
+
+@pytest.mark.parametrize("extension", [".gif", ".webp"])
+def test_color_animation(tmp_path, extension):
+    path = str(tmp_path / ("out" + extension))
+    palette = color_palette((0, 0, 0))
+    rng = np.random.default_rng(0)
+    first = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    first[:, :8] = 0
+    second = first.copy()
+    second[4:12, 8:30] = (40, 200, 90)
+    with AnimationWriter(path, (WIDTH, HEIGHT), FPS, palette, loop=2) as writer:
+        writer.write(first)
+        writer.write(second, (8, 4, 30, 12))
+    decoded, loop = decode(path)
+    assert loop == 2
+    assert [duration for _, duration in decoded] == [50, 50]
+    for (image, _), frame in zip(decoded, (first, second)):
+        # 每个像素都是调色板中与之最近的颜色（BGR 输入，RGB 调色板），背景精确保留
+        assert np.array_equal(image, palette[writer.quantize(frame)])
+        # 误差不超过立方体半个级差加一个 5 位格子的宽度
+        assert np.abs(image.astype(np.int16) - frame[:, :, ::-1]).max() <= 26 + 8
+        assert not image[:, :8].any()
+
+
+def test_wrong_size_and_format(tmp_path):
+    palette = blend_palette((0, 0, 0), (255, 255, 255))
+    with pytest.raises(ValueError):
+        AnimationWriter(str(tmp_path / "out.mp4"), (WIDTH, HEIGHT), FPS, palette)
+    with AnimationWriter(str(tmp_path / "out.gif"), (WIDTH, HEIGHT), FPS, palette) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((HEIGHT, WIDTH + 1), dtype=np.uint8))
+
+
+def test_video2video_gif(tmp_path):
+    from video_pipeline import make_clip
+
+    make_clip(str(tmp_path / "clip.avi"), 160, 120, 6, fps=10)
+    args = script_args(video2video, ["--input", str(tmp_path / "clip.avi"), "--output", str(tmp_path / "out.gif"),
+                                     "--num_cols", "30", "--fps", "10"])
+    char_list, font, bg_code, atlas, lut = video2video.load_resources(args)
+    video2video.process_video(args.input, args.output, char_list, font, args.num_cols, args.scale, args.fps,
+                              args.overlay_ratio, bg_code, atlas, lut, args.dither)
+    decoded, _ = decode(str(tmp_path / "out.gif"))
+    # 合成片段的每一帧都在变化，六帧各 100 ms
+    assert [duration for _, duration in decoded] == [100] * 6
+    assert len({image.shape for image, _ in decoded}) == 1
@@ -0,0 +1,135 @@
+"""
+The .asv container: frames round-trip unchanged through every compression, random access goes
+through the frame index, and truncated or corrupt files are reported instead of misread.
+"""
+import numpy as np
+import pytest
+
+from asciivideo import AsciiVideoReader, AsciiVideoWriter, COMPRESSIONS, rle_decode, rle_encode
+
+CHAR_LIST = " .:-=+*#%@"
+NUM_ROWS, NUM_COLS = 9, 23
+
+
+def make_frames(count, color):
+    rng = np.random.default_rng(0)
+    frames = []
+    for index in range(count):
+        # 大片相同的字符（RLE 的长游程，含超过 255 的），加上随机的单元格
+        char_indices = np.full((NUM_ROWS, NUM_COLS), index % len(CHAR_LIST), dtype=np.uint8)
+        char_indices[index % NUM_ROWS] = rng.integers(0, len(CHAR_LIST), NUM_COLS)
+        colors = rng.integers(0, 256, (NUM_ROWS, NUM_COLS, 3), dtype=np.uint8) if color else None
+        frames.append((char_indices, colors))
+    return frames
+
+
+def write_container(path, frames, color, compression):
+    with AsciiVideoWriter(str(path), CHAR_LIST, NUM_ROWS, NUM_COLS, 25, color=color, compression=compression,
+                          font="fonts/DejaVuSansMono-Bold.ttf", font_size=10) as writer:
+        for char_indices, colors in frames:
+            writer.write(char_indices, colors)
+    return writer
+
+
+def assert_frame(record, frame):
+    char_indices, colors = record
+    assert np.array_equal(char_indices, frame[0])
+    if frame[1] is None:
+        assert colors is None
+    else:
+        assert np.array_equal(colors, frame[1])
+
+
+@pytest.mark.parametrize("data", [b"", b"\x07", bytes(600), bytes(range(256)) * 3, b"\x01\x01\x02" * 100])
+def test_rle_round_trip(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    assert np.array_equal(rle_decode(rle_encode(data)), data)
+
+
+def check_reader(reader, frames, compression):
+    assert len(reader) == len(frames)
+    assert reader.header["char_list"] == CHAR_LIST and reader.header["compression"] == compression
+    # 顺序读取，与 cv2.VideoCapture 相同的接口
+    for frame in frames:
+        ok, record = reader.read()
+        assert ok
+        assert_frame(record, frame)
+    assert reader.read() == (False, None)
+    # 通过索引随机访问，顺序无关
+    for index in (7, 0, 11, 3, -1):
+        assert_frame(reader[index], frames[index])
+    if compression == "none":
+        # 未压缩的记录直接是内存映射上的视图，步长相同
+        assert np.shares_memory(reader[5][0], np.frombuffer(reader.map, dtype=np.uint8))
+        assert len(set(np.diff(reader.index["offset"]).tolist())) == 1
+
+
+@pytest.mark.parametrize("color", [False, True])
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_round_trip(tmp_path, compression, color):
+    frames = make_frames(12, color)
+    write_container(tmp_path / "video.asv", frames, color, compression)
+    reader = AsciiVideoReader(str(tmp_path / "video.asv"))
+    # 在单独的函数中检查，关闭内存映射前不再持有指向它的帧视图
+    check_reader(reader, frames, compression)
+    reader.close()
+
+
+def test_append_copies_records(tmp_path):
+    frames = make_frames(10, True)
+    write_container(tmp_path / "first.asv", frames[:4], True, "rle")
+    write_container(tmp_path / "second.asv", frames[4:], True, "rle")
+    with AsciiVideoWriter(str(tmp_path / "merged.asv"), CHAR_LIST, NUM_ROWS, NUM_COLS, 25, color=True,
+                          compression="rle") as writer:
+        for name in ("first.asv", "second.asv"):
+            reader = AsciiVideoReader(str(tmp_path / name))
+            writer.append(reader)
+            reader.close()
+    reader = AsciiVideoReader(str(tmp_path / "merged.asv"))
+    for index, frame in enumerate(frames):
+        assert_frame(reader[index], frame)
+    reader.close()
+
+
+def test_mismatched_grid_is_rejected(tmp_path):
+    with AsciiVideoWriter(str(tmp_path / "video.asv"), CHAR_LIST, NUM_ROWS, NUM_COLS, 25) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((NUM_ROWS + 1, NUM_COLS), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("keep", [0, 5, 40, -1, -30])
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_truncated_file(tmp_path, compression, keep):
+    path = tmp_path / "video.asv"
+    write_container(path, make_frames(6, True), True, compression)
+    data = path.read_bytes()
+    # 写到一半中断：文件尾部的索引和 footer 缺失
+    path.write_bytes(data[:keep] if keep >= 0 else data[:len(data) + keep])
+    with pytest.raises(ValueError):
+        AsciiVideoReader(str(path))
+
+
+@pytest.mark.parametrize("compression", ["zlib", "rle"])
+def test_corrupt_record(tmp_path, compression):
+    path = tmp_path / "video.asv"
+    write_container(path, make_frames(6, True), True, compression)
+    reader = AsciiVideoReader(str(path))
+    offset, length = (int(value) for value in reader.index[2])
+    reader.close()
+    data = bytearray(path.read_bytes())
+    data[offset:offset + length - 1] = bytes(length - 1)
+    path.write_bytes(bytes(data))
+    reader = AsciiVideoReader(str(path))
+    try:
+        assert_frame(reader[1], make_frames(6, True)[1])
+        with pytest.raises(ValueError):
+            reader[2]
+    finally:
+        reader.close()
+
+
+def test_not_a_container(tmp_path):
+    path = tmp_path / "video.asv"
+    path.write_bytes(b"RIFF" + bytes(100))
+    with pytest.raises(ValueError):
+        AsciiVideoReader(str(path))
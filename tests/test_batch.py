@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+
+import cv2
+
+import img2txt
+from batch import collect_inputs, is_batch_input, run_batch
+from suite import script_args
+from video_pipeline import make_frame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_images(directory, names):
+    paths = []
+    for index, name in enumerate(names):
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, make_frame(64, 48, index))
+        paths.append(path)
+    return paths
+
+
+def convert_batch(input_spec, output_dir):
+    args = script_args(img2txt, ["--input", input_spec, "--output", output_dir, "--num_cols", "20"])
+    results = run_batch(input_spec, output_dir, img2txt.load_resources, img2txt.convert_file, args, 0, ".txt")
+    assert all(error is None for _, _, _, error in results)
+    return sorted(os.path.relpath(output, output_dir) for _, output, _, _ in results)
+
+
+def test_directory(tmp_path):
+    write_images(str(tmp_path / "in"), ["a.jpg", "sub/b.png"])
+    (tmp_path / "in" / "notes.md").write_text("not an image")
+    assert is_batch_input(str(tmp_path / "in"))
+    assert convert_batch(str(tmp_path / "in"), str(tmp_path / "out")) == ["a.txt", os.path.join("sub", "b.txt")]
+
+
+def test_glob(tmp_path):
+    write_images(str(tmp_path / "in"), ["a.jpg", "b.jpg", "c.png"])
+    pattern = str(tmp_path / "in" / "*.jpg")
+    assert is_batch_input(pattern)
+    assert convert_batch(pattern, str(tmp_path / "out")) == ["a.txt", "b.txt"]
+
+
+def test_list_file(tmp_path):
+    paths = write_images(str(tmp_path / "in"), ["a.jpg", "sub/b.png", "c.png"])
+    for name in ("list.txt", "list.lst"):
+        list_path = tmp_path / name
+        list_path.write_text("\n".join(paths[:2]) + "\n\n")
+        assert is_batch_input(str(list_path))
+        assert collect_inputs(str(list_path)) == (sorted(paths[:2]), str(tmp_path / "in"))
+    assert convert_batch(str(tmp_path / "list.txt"), str(tmp_path / "out")) == ["a.txt", os.path.join("sub", "b.txt")]
+
+
+def test_plain_images_are_not_batches(tmp_path):
+    # 任何不是 .txt/.lst 的已有文件都是单张图像，包括名字里带通配符字符的文件
+    paths = write_images(str(tmp_path), ["x.ppm", "x.pgm", "photo[1].png", "shot?.jpg"])
+    for path in paths:
+        assert not is_batch_input(path)
+    assert is_batch_input(str(tmp_path / "photo[0-9].png"))
+
+
+def test_single_file_conversion(tmp_path):
+    write_images(str(tmp_path), ["x.ppm", "photo[1].png"])
+    for name in ("x.ppm", "photo[1].png"):
+        output_path = str(tmp_path / (name + ".txt"))
+        subprocess.run([sys.executable, "-W", "ignore", "img2txt.py", "--input", str(tmp_path / name), "--output",
+                        output_path, "--num_cols", "20"], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        with open(output_path, encoding="utf-8") as output_file:
+            assert len(output_file.read().splitlines()) > 1
+
+
+def test_invalid_settings_fail_before_workers_start(tmp_path):
+    write_images(str(tmp_path / "in"), ["a.jpg", "b.jpg"])
+    # 加载失败时不能让进程池反复重启 worker 而挂起
+    result = subprocess.run([sys.executable, "-W", "ignore", "img2img.py", "--input", str(tmp_path / "in"),
+                             "--output", str(tmp_path / "out"), "--language", "klingon", "--workers", "2"],
+                            cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60)
+    assert result.returncode != 0
+    assert result.stderr.count("Traceback") == 1
+    assert not (tmp_path / "out").exists()
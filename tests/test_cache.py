@@ -0,0 +1,135 @@
+"""
+The result cache (cache.py): which options change the key, LRU eviction down to the size limit,
+atomic writes and the counters shared between processes.
+"""
+import multiprocessing
+import os
+
+import cv2
+import pytest
+
+import img2img
+import img2txt
+from cache import LOW_WATER, ResultCache, _atomic_write
+from suite import script_args
+from video_pipeline import make_frame
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = str(tmp_path / "input.png")
+    cv2.imwrite(path, make_frame(160, 120))
+    return path
+
+
+def convert(module, input_path, output_path, cache_dir, options=()):
+    """
+    Convert with the script's convert_file and return the cache counters afterwards.
+    """
+    args = script_args(module, ["--input", input_path, "--output", output_path, "--num_cols", "40",
+                                "--cache_dir", cache_dir] + list(options))
+    module.convert_file(input_path, output_path, args, module.load_resources(args))
+    return ResultCache(cache_dir, 1 << 20).stats()
+
+
+def test_hit_copies_the_stored_output(tmp_path, input_path):
+    cache_dir = str(tmp_path / "cache")
+    stats = convert(img2txt, input_path, str(tmp_path / "first.txt"), cache_dir)
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (0, 1, 1)
+    stats = convert(img2txt, input_path, str(tmp_path / "second.txt"), cache_dir)
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+    assert (tmp_path / "first.txt").read_bytes() == (tmp_path / "second.txt").read_bytes()
+
+
+@pytest.mark.parametrize("module, extension, options", [
+    (img2txt, ".txt", ["--mode", "simple"]),
+    (img2txt, ".txt", ["--gamma", "1.5"]),
+    (img2txt, ".txt", ["--format", "html"]),
+    (img2img, ".png", ["--background", "white"]),
+    (img2img, ".png", ["--language", "russian"]),
+])
+def test_changed_option_misses(tmp_path, input_path, module, extension, options):
+    cache_dir = str(tmp_path / "cache")
+    convert(module, input_path, str(tmp_path / ("first" + extension)), cache_dir)
+    stats = convert(module, input_path, str(tmp_path / ("second" + extension)), cache_dir, options)
+    assert (stats["hits"], stats["misses"]) == (0, 2)
+    # 不同的输出扩展名也是不同的条目
+    if module is img2img:
+        stats = convert(module, input_path, str(tmp_path / "third.jpg"), cache_dir)
+        assert (stats["hits"], stats["misses"]) == (0, 3)
+
+
+def test_changed_input_misses(tmp_path, input_path):
+    cache_dir = str(tmp_path / "cache")
+    convert(img2txt, input_path, str(tmp_path / "first.txt"), cache_dir)
+    cv2.imwrite(input_path, make_frame(160, 120, 1))
+    stats = convert(img2txt, input_path, str(tmp_path / "second.txt"), cache_dir)
+    assert (stats["hits"], stats["misses"]) == (0, 2)
+
+
+@pytest.mark.parametrize("options", [["--workers", "3"], ["--cache_mb", "64"], ["--workers", "0", "--cache_mb", "1"]])
+def test_ignored_options_hit(tmp_path, input_path, options):
+    cache_dir = str(tmp_path / "cache")
+    convert(img2txt, input_path, str(tmp_path / "first.txt"), cache_dir)
+    # 输出路径和只影响运行方式的参数不属于缓存键
+    stats = convert(img2txt, input_path, str(tmp_path / "second.txt"), cache_dir, options)
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_eviction_removes_oldest_entries(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), 10 * 1000)
+    output = tmp_path / "output.bin"
+    for index in range(10):
+        output.write_bytes(bytes([index]) * 1000)
+        cache.store("{:064x}".format(index), str(output))
+        # 修改时间严格递增，淘汰顺序与写入顺序一致
+        os.utime(cache.entry_path("{:064x}".format(index)), ns=(index * 10 ** 9, index * 10 ** 9))
+    assert cache.stats()["evictions"] == 0
+    # 第 0 个条目命中后成为最近使用的条目
+    assert cache.fetch("{:064x}".format(0), str(tmp_path / "hit.bin"))
+    output.write_bytes(bytes(1500))
+    cache.store("{:064x}".format(10), str(output))
+    stats = cache.stats()
+    remaining = {os.path.basename(path) for path, _, _ in cache._entries()}
+    # 11500 字节超出上限，按最近使用时间淘汰到 9000 字节以内：第 1 到 3 个条目
+    assert stats["bytes"] <= cache.max_bytes * LOW_WATER
+    assert stats["bytes"] == sum(size for _, size, _ in cache._entries()) == 8500
+    assert remaining == {"{:064x}".format(index) for index in (0, 4, 5, 6, 7, 8, 9, 10)}
+    assert stats["evictions"] == 3
+
+
+def test_atomic_write_leaves_no_partial_file(tmp_path):
+    target = tmp_path / "output.txt"
+    target.write_bytes(b"old")
+    _atomic_write(str(target), b"new")
+    assert target.read_bytes() == b"new"
+    # 替换失败（目标是目录）时删除临时文件，原有内容不变
+    (tmp_path / "directory").mkdir()
+    with pytest.raises(OSError):
+        _atomic_write(str(tmp_path / "directory"), b"data")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["directory", "output.txt"]
+
+
+def count_hits(cache_dir, key, output_path, times):
+    cache = ResultCache(cache_dir, 1 << 20)
+    for _ in range(times):
+        assert cache.fetch(key, output_path)
+
+
+def test_counters_shared_between_processes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = ResultCache(cache_dir, 1 << 20)
+    (tmp_path / "entry.txt").write_bytes(b"ascii art")
+    cache.store("ab" * 32, str(tmp_path / "entry.txt"))
+    processes = [multiprocessing.Process(target=count_hits,
+                                         args=(cache_dir, "ab" * 32, str(tmp_path / "out{}.txt".format(index)), 50))
+                 for index in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    # flock 保护下的读-改-写不会丢失计数
+    stats = cache.stats()
+    assert (stats["hits"], stats["stores"], stats["entries"]) == (200, 1, 1)
+    assert not [name for _, _, names in os.walk(cache_dir) for name in names if name.endswith(".tmp")]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from utils import SummedAreaTable, build_char_lut, cell_means, cell_sums, map_brightness
+
+CHAR_LIST = "@%#*+=-:. "
+
+
+def reference_means(image, num_rows, num_cols, cell_width, cell_height):
+    """
+    The original per-cell loop: np.mean over each slice, clamped to the image.
+    """
+    height, width = image.shape[:2]
+    means = np.empty((num_rows, num_cols))
+    for i in range(num_rows):
+        for j in range(num_cols):
+            cell = image[int(i * cell_height):min(int((i + 1) * cell_height), height),
+                         int(j * cell_width):min(int((j + 1) * cell_width), width)]
+            means[i, j] = np.mean(cell)
+    return means
+
+
+def text_grid(means, num_chars=len(CHAR_LIST)):
+    # 原来逐单元格循环里的字符下标公式
+    return "\n".join("".join(CHAR_LIST[min(int(value * num_chars / 255), num_chars - 1)] for value in row)
+                     for row in means)
+
+
+def grids(height, width):
+    """
+    (num_rows, num_cols, cell_width, cell_height) cases: the scripts' own grid, with non-integer
+    cell sizes, and grids whose last row and column run past the image and are clamped.
+    """
+    cases = []
+    for num_cols in (7, 13, 30):
+        cell_width = width / num_cols
+        cases.append((int(height / (2 * cell_width)), num_cols, cell_width, 2 * cell_width))
+    for cell_width, cell_height in ((6.5, 13), (4.3, 9.1), (6, 12)):
+        cases.append((-(-height // cell_height), -(-width // cell_width), cell_width, cell_height))
+    return [(int(rows), int(cols), cell_width, cell_height) for rows, cols, cell_width, cell_height in cases]
+
+
+@pytest.fixture(params=[(61, 97), (120, 163, 3)], ids=["gray", "color"])
+def image(request):
+    return np.random.default_rng(1).integers(0, 256, request.param, dtype=np.uint8)
+
+
+def test_cell_means_match_loop(image):
+    table = SummedAreaTable(image)
+    for grid in grids(*image.shape[:2]):
+        expected = reference_means(image, *grid)
+        assert np.allclose(cell_means(image, *grid), expected, rtol=0, atol=1e-9)
+        assert np.allclose(table.cell_means(*grid), expected, rtol=0, atol=1e-9)
+        assert text_grid(cell_means(image, *grid)) == text_grid(expected)
+        assert text_grid(table.cell_means(*grid)) == text_grid(expected)
+
+
+def test_cell_sums_match_loop(image):
+    table = SummedAreaTable(image)
+    height, width = image.shape[:2]
+    for num_rows, num_cols, cell_width, cell_height in grids(height, width):
+        sums, counts = cell_sums(image, num_rows, num_cols, cell_width, cell_height)
+        table_sums, table_counts = table.cell_sums(num_rows, num_cols, cell_width, cell_height)
+        for i in range(num_rows):
+            for j in range(num_cols):
+                cell = image[int(i * cell_height):min(int((i + 1) * cell_height), height),
+                             int(j * cell_width):min(int((j + 1) * cell_width), width)]
+                expected = cell.reshape(-1, *image.shape[2:]).sum(axis=0, dtype=np.int64)
+                assert (sums[i, j] == expected).all() and (table_sums[i, j] == expected).all()
+                assert counts[i, j] == table_counts[i, j] == cell.shape[0] * cell.shape[1]
+
+
+def test_text_grid_through_lut(image):
+    # 查找表映射得到的字符网格与逐单元格循环的平均值映射出的网格相同
+    lut = build_char_lut(len(CHAR_LIST))
+    for grid in grids(*image.shape[:2]):
+        expected = map_brightness(reference_means(image, *grid), lut)
+        assert (map_brightness(cell_means(image, *grid), lut) == expected).all()
+        assert (map_brightness(SummedAreaTable(image).cell_means(*grid), lut) == expected).all()
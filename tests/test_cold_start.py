@@ -0,0 +1,52 @@
+"""
+Cold-start regression of the image entry points (see benchmarks/cold_start.py): --help and
+importing converter must not load the heavy modules, which take most of the start-up time.
+"""
+import subprocess
+import sys
+
+import cv2
+import pytest
+
+from cold_start import convert_argv
+from video_pipeline import make_frame
+
+HEAVY_MODULES = ("numpy", "cv2", "PIL")
+# --help 后打印 sys.modules 中已加载的重模块
+HELP_CHECK = """
+import runpy, sys
+sys.argv = [{script!r}, "--help"]
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except SystemExit:
+    pass
+print(" ".join(name for name in {heavy!r} if name in sys.modules), file=sys.stderr)
+"""
+
+
+def loaded_modules(code):
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    return result.stdout, result.stderr.split()
+
+
+@pytest.mark.parametrize("entry_point", ["img2txt", "img2img", "img2img_color"])
+def test_help_skips_heavy_imports(entry_point):
+    usage, loaded = loaded_modules(HELP_CHECK.format(script=entry_point + ".py", heavy=HEAVY_MODULES))
+    assert "--num_cols" in usage
+    assert loaded == []
+
+
+def test_converter_imports_numpy_only():
+    _, loaded = loaded_modules("import sys, converter; print(' '.join(name for name in {!r} if name in sys.modules),"
+                               " file=sys.stderr)".format(HEAVY_MODULES))
+    assert loaded == ["numpy"]
+
+
+@pytest.mark.parametrize("entry_point", ["img2txt", "img2img", "img2img_color"])
+def test_conversion_still_runs(tmp_path, entry_point):
+    # 延迟导入后实际转换仍需加载全部模块，这里确认转换路径没有因此出错
+    cv2.imwrite(str(tmp_path / "input.png"), make_frame(320, 240))
+    subprocess.run([sys.executable, "-W", "ignore", entry_point + ".py"] + convert_argv(entry_point, str(tmp_path)),
+                   check=True, stdout=subprocess.DEVNULL)
+    assert list(tmp_path.glob("output.*"))
@@ -0,0 +1,126 @@
+"""
+Colored text output (colortext.py): merging cells of the same color into runs renders the same
+characters in the same colors as one escape or <span> per cell (naive_save of
+benchmarks/color_text.py), and only emits a tag where the color changes.
+"""
+import re
+from html.parser import HTMLParser
+
+import cv2
+import numpy as np
+import pytest
+
+import img2txt
+from color_text import naive_save
+from colortext import COLOR_FORMATS, color_text, quantize_colors, rgb_to_xterm256
+from suite import script_args
+from video_pipeline import make_frame
+
+ESCAPE = re.compile(r"\x1b\[([0-9;]*)m")
+
+
+def render_ansi(document):
+    """
+    (char, color) of every printed character; the color is the SGR parameters in effect.
+    """
+    cells, color = [], None
+    for index, part in enumerate(ESCAPE.split(document)):
+        if index % 2:
+            color = None if part in ("", "0") else part.split(";", 1)[1]
+        else:
+            cells.extend((char, color) for char in part if char != "\n")
+    return cells
+
+
+class HtmlRenderer(HTMLParser):
+    """
+    (char, color) of every character inside <pre>, with colors from class rules or inline styles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.classes, self.cells, self.colors, self.style = {}, [], [None], None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "style":
+            self.style = ""
+        elif tag == "span":
+            color = attrs.get("style") or self.classes[attrs["class"]]
+            self.colors.append(color.split("color:", 1)[1])
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self.classes = dict(re.findall(r"\.(\w+)\{(color:#[0-9a-f]{6})\}", self.style))
+            self.style = None
+        elif tag == "span":
+            self.colors.pop()
+
+    def handle_data(self, data):
+        if self.style is not None:
+            self.style += data
+        else:
+            self.cells.extend((char, self.colors[-1]) for char in data if char != "\n")
+
+
+def render(document, color_format):
+    if color_format != "html":
+        return render_ansi(document)
+    renderer = HtmlRenderer()
+    renderer.feed(document)
+    renderer.close()
+    return renderer.cells
+
+
+def make_grid(seed):
+    """
+    Characters including ones HTML has to escape, and blocky colors whose runs cross line breaks.
+    """
+    rng = np.random.default_rng(seed)
+    chars = rng.choice(list(" .:&<>#@"), (12, 17))
+    colors = rng.integers(0, 256, (4, 3, 3)).repeat(3, axis=0).repeat(6, axis=1)[:, :17]
+    colors[5:8] = colors[5, 0]
+    # 量化步长内的微小差异，step 大于 1 时同属一段
+    colors[::2] += rng.integers(0, 2, colors[::2].shape)
+    return chars, np.clip(colors, 0, 255)
+
+
+@pytest.mark.parametrize("color_format", COLOR_FORMATS)
+@pytest.mark.parametrize("step", [1, 8])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_runs_render_like_cells(tmp_path, color_format, step, seed):
+    chars, colors = make_grid(seed)
+    document = color_text(chars, colors, color_format, step)
+    naive_save(chars, colors, color_format, step, str(tmp_path / "naive.txt"))
+    naive = (tmp_path / "naive.txt").read_text(encoding="utf-8")
+    cells = render(document, color_format)
+    assert cells == render(naive, color_format)
+    assert "".join(char for char, _ in cells) == "".join(chars.ravel())
+    # 每个颜色变化处恰好一个标签，换行不打断颜色段
+    if color_format == "ansi256":
+        codes = rgb_to_xterm256(colors).ravel()
+    else:
+        rgb = quantize_colors(colors, step).reshape(-1, 3)
+        codes = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    runs = 1 + np.count_nonzero(codes[1:] != codes[:-1])
+    tags = document.count("<span") if color_format == "html" else len(ESCAPE.findall(document)) - 1
+    assert tags == runs < chars.size
+    if color_format != "html":
+        assert document.endswith("\x1b[0m")
+
+
+def test_img2txt_formats_keep_text(tmp_path):
+    input_path = str(tmp_path / "input.png")
+    cv2.imwrite(input_path, make_frame(160, 120))
+    outputs = {}
+    for color_format in ("text",) + COLOR_FORMATS:
+        output_path = str(tmp_path / "output.txt")
+        args = script_args(img2txt, ["--input", input_path, "--output", output_path, "--num_cols", "40",
+                                     "--format", color_format])
+        img2txt.convert_file(input_path, output_path, args, img2txt.load_resources(args))
+        with open(output_path, encoding="utf-8") as output_file:
+            outputs[color_format] = output_file.read()
+    # 去掉颜色后与纯文本输出完全相同
+    text = outputs.pop("text").replace("\n", "")
+    for color_format, document in outputs.items():
+        assert "".join(char for char, _ in render(document, color_format)) == text
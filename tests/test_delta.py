@@ -0,0 +1,78 @@
+"""
+DeltaRenderer frames equal GlyphAtlas full renders of the same grids, and changed covers every
+pixel that differs from the previous frame.
+"""
+import numpy as np
+import pytest
+from PIL import ImageFont
+
+from alphabets import GENERAL
+from renderer import DeltaRenderer, GlyphAtlas
+
+CHAR_LIST = GENERAL["complex"]
+SHAPE = (15, 40)
+
+
+@pytest.fixture(scope="module")
+def atlas():
+    return GlyphAtlas(CHAR_LIST, ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=10), "A")
+
+
+def grid_sequence():
+    """
+    (char indices, colors) of consecutive frames: sparse changes, an unchanged frame, a change
+    large enough for a full redraw, edge cells and a grid of another shape.
+    """
+    rng = np.random.default_rng(0)
+    char_indices = rng.integers(0, len(CHAR_LIST), SHAPE)
+    colors = rng.integers(0, 256, SHAPE + (3,))
+    yield char_indices.copy(), colors.copy()
+    for changes in (1, 5, 0, 300, 20):
+        rows, cols = rng.integers(0, SHAPE[0], changes), rng.integers(0, SHAPE[1], changes)
+        char_indices[rows, cols] = rng.integers(0, len(CHAR_LIST), changes)
+        colors[rows, cols] = rng.integers(0, 256, (changes, 3))
+        yield char_indices.copy(), colors.copy()
+    for row, col in ((0, 0), (0, -1), (-1, 0), (-1, -1)):
+        char_indices[row, col] = (char_indices[row, col] + 1) % len(CHAR_LIST)
+        colors[row, col] = 255 - colors[row, col]
+        yield char_indices.copy(), colors.copy()
+    yield char_indices[:-2, :-3].copy(), colors[:-2, :-3].copy()
+
+
+def check_changed(delta, previous, image):
+    differs = np.asarray(image) != np.asarray(previous)
+    if differs.ndim == 3:
+        differs = differs.any(axis=2)
+    if delta.changed is None:
+        assert not differs.any()
+        return
+    left, top, right, bottom = delta.changed
+    differs[top:bottom, left:right] = False
+    assert not differs.any()
+
+
+@pytest.mark.parametrize("background", [(0, 0, 0), (255, 255, 255)])
+def test_render_color_matches_atlas(atlas, background):
+    delta = DeltaRenderer(atlas)
+    previous = None
+    for char_indices, colors in grid_sequence():
+        size = (char_indices.shape[1] * atlas.char_width, 2 * char_indices.shape[0] * atlas.char_height)
+        image = delta.render_color(char_indices, colors, background, size)
+        assert np.array_equal(np.asarray(image), np.asarray(atlas.render_color(char_indices, colors, background, size)))
+        if previous is not None and previous.size == image.size:
+            check_changed(delta, previous, image)
+        previous = image.copy()
+    assert delta.reused_frames == 1
+
+
+@pytest.mark.parametrize("bg_code", [0, 255])
+def test_render_matches_atlas(atlas, bg_code):
+    delta = DeltaRenderer(atlas)
+    previous = None
+    for char_indices, _ in grid_sequence():
+        image = delta.render(char_indices, 255 - bg_code, bg_code)
+        assert np.array_equal(np.asarray(image), np.asarray(atlas.render(char_indices, 255 - bg_code, bg_code)))
+        if previous is not None and previous.size == image.size:
+            check_changed(delta, previous, image)
+        previous = image.copy()
+    assert delta.reused_frames == 1
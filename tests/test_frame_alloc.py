@@ -0,0 +1,66 @@
+"""
+video2video_color's FrameProcessor allocates a bounded amount per steady-state frame and does
+not keep what it allocates (the check of benchmarks/frame_alloc.py), and its frames equal the
+previous per-frame path.
+"""
+import numpy as np
+import pytest
+
+import video2video_color
+from frame_alloc import measure, previous_convert
+from strips import grid_ink_box
+from suite import script_args
+from video_pipeline import make_frame
+
+BUDGET = 16 * 1024
+WARMUP = 3
+FRAMES = 10
+
+
+@pytest.mark.parametrize("dither", [False, True])
+@pytest.mark.parametrize("size", [(640, 360), (1280, 720)])
+def test_steady_state_allocations(size, dither):
+    opt = script_args(video2video_color, ["--num_cols", "100"] + (["--dither"] if dither else []))
+    resources = video2video_color.load_resources(opt)
+    char_list, font, bg_color, atlas, lut = resources
+    frames = [make_frame(size[0], size[1], index) for index in range(WARMUP + FRAMES)]
+    processor = video2video_color.FrameProcessor(opt.num_cols, char_list, font, bg_color, opt.background,
+                                                 opt.overlay_ratio, atlas, lut, opt.dither)
+    processor(frames[0])
+    char_width, char_height = font.getsize("A")
+    num_rows, num_cols = processor.char_indices.shape
+    box = grid_ink_box(atlas, (num_rows, num_cols), (char_width * num_cols, 2 * char_height * num_rows))
+    for frame in frames:
+        assert np.array_equal(processor(frame), previous_convert(frame, opt, resources, box))
+
+    allocated, held, _ = measure(processor, frames, WARMUP)
+    assert max(allocated) <= BUDGET
+    assert held[-1] - held[0] <= BUDGET
+    # 对照：原来的路径每帧都分配整帧大小的图像，说明测量确实能发现逐帧分配
+    allocated, _, _ = measure(lambda frame: previous_convert(frame, opt, resources, box), frames, WARMUP)
+    assert max(allocated) > BUDGET
+
+
+def test_processor_reused_across_columns(monkeypatch, capsys):
+    opt = script_args(video2video_color, ["--num_cols", "100", "--renderer", "pil"])
+    char_list, font, bg_color, atlas, lut = video2video_color.load_resources(opt)
+    processor = video2video_color.FrameProcessor(opt.num_cols, char_list, font, bg_color, opt.background,
+                                                 opt.overlay_ratio, atlas, lut)
+    prepared = []
+    prepare = processor.prepare
+    monkeypatch.setattr(processor, "prepare", lambda shape: prepared.append(shape) or prepare(shape))
+    # 实时模式的列数序列：变化时才重新准备；列数超过帧宽时回退提示只打印一次
+    frame = make_frame(96, 64)
+    ink_atlases = set()
+    for num_cols in (40, 40, 200, 200, 40, 300, 40):
+        expected = video2video_color.convert_frame(frame, num_cols, char_list, font, bg_color, opt.background,
+                                                   opt.overlay_ratio, atlas, lut)
+        assert np.array_equal(processor(frame, num_cols), expected)
+        ink_atlases.add(id(processor.ink_atlas))
+    assert len(prepared) == 5
+    # PIL 渲染时求裁剪框的图集只建一次
+    assert len(ink_atlases) == 1
+    capsys.readouterr()
+    for num_cols in (200, 40, 300):
+        processor(frame, num_cols)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,76 @@
+"""
+Reduced decoding of large inputs (utils.load_image_for_grid, see benchmarks/large_input.py):
+the characters stay close to a full decode, a JPEG never allocates the full-size pixels, and
+images above PIL's decompression-bomb limit still load.
+"""
+import tracemalloc
+import warnings
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from converter import Converter, grayscale
+from utils import image_size, load_image_for_grid
+from video_pipeline import make_frame
+
+WIDTH, HEIGHT = 4000, 3000
+# 每个单元格约 67 像素宽，自动选择 8 倍缩小解码
+NUM_COLS = 60
+
+
+@pytest.fixture(scope="module")
+def converter():
+    return Converter("general", "complex")
+
+
+@pytest.fixture(scope="module")
+def inputs(tmp_path_factory):
+    frame = make_frame(WIDTH, HEIGHT)
+    frame += np.random.default_rng(0).integers(0, 16, frame.shape, dtype=np.uint8)
+    paths = {}
+    for extension in ("jpg", "png"):
+        paths[extension] = str(tmp_path_factory.mktemp("large") / ("input." + extension))
+        cv2.imwrite(paths[extension], frame)
+    return paths
+
+
+def load(path, converter, decode_scale):
+    """
+    (char indices, decode scale, peak traced bytes) of one load and conversion.
+    """
+    tracemalloc.start()
+    image, size, decode_scale = load_image_for_grid(path, NUM_COLS, converter.scale, decode_scale)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return converter.char_indices(grayscale(image), NUM_COLS, size, decode_scale)[0], decode_scale, peak
+
+
+@pytest.mark.parametrize("extension", ["jpg", "png"])
+def test_reduced_decode_matches_full(inputs, converter, extension):
+    full, _, full_peak = load(inputs[extension], converter, 1)
+    reduced, decode_scale, peak = load(inputs[extension], converter, 0)
+    assert decode_scale == 8
+    assert reduced.shape == full.shape
+    # 只有跨越缩小后像素边界的单元格会略有不同
+    steps = np.abs(reduced.astype(np.int64) - full)
+    assert (steps == 0).mean() >= 0.9
+    assert steps.max() <= 5
+    if extension == "jpg":
+        # DCT 缩放：整幅原尺寸像素（36 MB）从未分配
+        assert peak < full_peak / 16
+        assert peak < 2 * WIDTH * HEIGHT * 3 // 64
+    else:
+        assert peak <= full_peak * 1.1
+
+
+def test_decompression_bomb_limit(inputs, converter, monkeypatch):
+    # 模拟超过 PIL 默认上限（约 179 MP）的输入
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", WIDTH * HEIGHT // 4)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert image_size(inputs["jpg"]) == (WIDTH, HEIGHT, "JPEG")
+        image, size, decode_scale = load_image_for_grid(inputs["jpg"], NUM_COLS, converter.scale)
+    assert size == (WIDTH, HEIGHT) and decode_scale == 8 and image.shape == (HEIGHT // 8, WIDTH // 8, 3)
+    assert Image.MAX_IMAGE_PIXELS == WIDTH * HEIGHT // 4
@@ -0,0 +1,72 @@
+"""
+LatencyController holds the latency budget of live mode, driven by simulated frame timings (the
+wall-clock check on real conversions is benchmarks/live_latency.py, which depends on machine load).
+"""
+import numpy as np
+
+from live import LatencyController, SyntheticCapture, run_live
+
+FPS = 15
+
+
+def simulate(controller, seconds_per_cell, frames):
+    """
+    Feed the controller the latency of a conversion whose cost grows with the number of cells
+    (num_cols squared); seconds_per_cell(frame) may change during the run, like a loaded CPU.
+    Returns the (num_cols, latency) of every frame.
+    """
+    history = []
+    for frame in range(frames):
+        latency = seconds_per_cell(frame) * controller.num_cols ** 2
+        history.append((controller.num_cols, latency))
+        controller.update(latency)
+    return history
+
+
+def test_controller_drops_and_recovers():
+    controller = LatencyController(10, 200, patience=3)
+    # 超出 headroom * 预算（80 ms）：按超出比例的平方根立即减少
+    assert controller.update(0.2) == int(200 * 0.632)
+    assert controller.decisions[-1]["reason"] == "over"
+    # 连续 patience 帧低于 low_water * 预算（50 ms）后增加 10%
+    num_cols = controller.num_cols
+    assert [controller.update(0.01) for _ in range(3)] == [num_cols, num_cols, int(num_cols * 1.1)]
+    for _ in range(100):
+        controller.update(0.001)
+    assert controller.num_cols == 200
+
+
+def test_budget_held_under_load():
+    controller = LatencyController(FPS, 300)
+    # 300 列时每帧 180 ms，第 60 帧起负载加倍
+    history = simulate(controller, lambda frame: 2e-6 if frame < 60 else 4e-6, 120)
+    latencies = np.array([latency for _, latency in history])
+    # 开始一秒和负载变化后的一秒内允许超出预算，之后都在预算之内
+    assert (latencies[FPS:60] <= controller.budget).all()
+    assert (latencies[60 + FPS:] <= controller.budget).all()
+    assert controller.metrics(FPS)["latency_ms"]["p95"] <= controller.metrics()["budget_ms"]
+    assert history[59][0] > history[-1][0] >= controller.min_cols
+    assert [decision["reason"] for decision in controller.decisions] == ["over"] * len(controller.decisions)
+
+
+def test_columns_grow_back_when_load_drops():
+    controller = LatencyController(FPS, 300)
+    history = simulate(controller, lambda frame: 4e-6 if frame < 30 else 2e-7, 300)
+    # 负载消失后逐步恢复到起始列数，且不会超过
+    assert history[29][0] < 300
+    assert history[-1][0] == 300
+    assert max(num_cols for num_cols, _ in history) == 300
+    assert all(latency <= controller.budget for _, latency in history[30:])
+
+
+def test_run_live_passes_controller_columns():
+    controller = LatencyController(FPS, 300)
+    columns = []
+
+    def convert(frame, num_cols):
+        columns.append(num_cols)
+        return frame
+
+    metrics = run_live(SyntheticCapture(64, 48, 1000), convert, lambda frame: None, controller, max_frames=20)
+    assert metrics["frames"] == len(columns) == 20
+    assert columns == controller.cols
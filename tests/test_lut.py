@@ -0,0 +1,59 @@
+import numpy as np
+
+from utils import BAYER_MATRIX, build_char_lut, build_tone_curve, map_brightness
+
+
+def first_levels(lut):
+    """
+    The lowest brightness level of every character index after the first.
+    """
+    return [int(np.argmax(lut >= index)) for index in range(1, int(lut.max()) + 1)]
+
+
+def test_default_bucket_boundaries():
+    # 10 个字符（simple 模式）：第 k 个字符从 ceil(255 * k / 10) 开始
+    lut = build_char_lut(10)
+    assert lut.dtype == np.uint8 and lut.shape == (256,)
+    assert first_levels(lut) == [26, 51, 77, 102, 128, 153, 179, 204, 230]
+    assert lut[0] == 0 and lut[255] == 9
+    # 70 个字符（complex 模式）
+    lut = build_char_lut(70)
+    assert first_levels(lut)[:3] == [4, 8, 11] and first_levels(lut)[-1] == 252
+    assert lut[127] == 34 and lut[128] == 35 and lut[255] == 69
+    assert build_char_lut(300).dtype == np.uint16
+
+
+def test_fractional_brightness_truncates():
+    lut = build_char_lut(10)
+    brightness = np.array([[0.0, 25.99, 26.0, 229.99, 230.0, 255.0, 300.0, -4.0]])
+    assert map_brightness(brightness, lut).tolist() == [[0, 0, 1, 8, 9, 9, 9, 0]]
+
+
+def test_tone_curves():
+    assert (build_tone_curve() == np.arange(256)).all()
+    assert build_tone_curve(2.2)[[0, 64, 128, 255]].tolist() == [0, 12, 56, 255]
+    assert build_tone_curve(1.0, 1.5)[[0, 30, 128, 200, 255]].tolist() == [0, 0, 128, 236, 255]
+    assert build_tone_curve(0.5, 2.0)[[0, 64, 128, 192, 255]].tolist() == [0, 128, 234, 255, 255]
+    for gamma, contrast in ((2.2, 1.0), (0.5, 2.0), (1.0, 0.5)):
+        curve = build_tone_curve(gamma, contrast)
+        assert (np.diff(curve) >= 0).all()
+        lut = build_char_lut(10, gamma, contrast)
+        assert (lut == np.minimum(curve * 10 // 255, 9)).all()
+
+
+def test_bayer_dither():
+    lut = build_char_lut(10)
+    # 阈值是 4x4 Bayer 矩阵，幅度为一个字符的亮度步长 256 / 10
+    assert sorted(((BAYER_MATRIX + 0.5) * 16 - 0.5).round().ravel().tolist()) == list(range(16))
+    assert map_brightness(np.full((4, 4), 26.0), lut, dither=True).tolist() == [
+        [0, 1, 0, 1], [1, 0, 1, 0], [0, 1, 0, 1], [1, 0, 1, 0]]
+    assert map_brightness(np.full((4, 4), 40.0), lut, dither=True).tolist() == [
+        [1, 1, 1, 1], [1, 1, 1, 1], [1, 1, 1, 1], [2, 1, 1, 1]]
+    # 图案按 4x4 重复，网格尺寸不是 4 的倍数时截断
+    tiled = map_brightness(np.full((6, 9), 26.0), lut, dither=True)
+    assert (tiled[:4, :4] == tiled[:4, 4:8]).all() and (tiled[:2] == tiled[4:6]).all()
+    # 平坦区域的平均字符下标跟随亮度，而不是停在同一个字符上
+    gradient = np.tile(np.linspace(0, 255, 64), (32, 1))
+    means = map_brightness(gradient, lut, dither=True).mean(axis=0)
+    assert (np.diff(means[::8]) > 0).all()
+    assert (map_brightness(gradient, lut) == map_brightness(gradient, lut, dither=False)).all()
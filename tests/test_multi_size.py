@@ -0,0 +1,44 @@
+"""
+Several --num_cols values in one run give the same outputs as one run per size.
+"""
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from video_pipeline import make_frame
+
+SIZES = ["150", "97", "40"]
+
+
+def convert(tmp_path, script, output, num_cols, extra):
+    subprocess.run([sys.executable, "-W", "ignore", script, "--input", str(tmp_path / "input.png"),
+                    "--output", str(tmp_path / output), "--num_cols"] + num_cols + ["--decode_scale", "1"] + extra,
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def read_output(path):
+    if path.suffix == ".txt":
+        return path.read_bytes()
+    with Image.open(path) as image:
+        return np.array(image)
+
+
+@pytest.mark.parametrize("script, extension, extra", [
+    ("img2txt.py", ".txt", []),
+    ("img2txt.py", ".txt", ["--format", "html"]),
+    ("img2img.py", ".png", ["--background", "white"]),
+    ("img2img_color.py", ".png", []),
+])
+def test_sizes_match_separate_runs(tmp_path, script, extension, extra):
+    cv2.imwrite(str(tmp_path / "input.png"), make_frame(757, 533, 1))
+    convert(tmp_path, script, "multi" + extension, SIZES, extra)
+    for num_cols in SIZES:
+        convert(tmp_path, script, "single" + extension, [num_cols], extra)
+        multi = read_output(tmp_path / "multi_{}{}".format(num_cols, extension))
+        single = read_output(tmp_path / ("single" + extension))
+        assert np.array_equal(multi, single), num_cols
+    assert not (tmp_path / ("multi" + extension)).exists()
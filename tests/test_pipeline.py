@@ -0,0 +1,102 @@
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from pipeline import run_pipeline
+
+
+class FrameList:
+    """
+    Minimal cv2.VideoCapture stand-in: read(image) returns the next frame, into image if given.
+    """
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self, image=None):
+        if not self.frames:
+            return False, None
+        frame = self.frames.pop(0)
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            return True, image
+        return True, frame
+
+
+class FailingCapture(FrameList):
+    """
+    FrameList whose read raises once the given number of frames were read.
+    """
+
+    def __init__(self, frames, fail_after):
+        super().__init__(frames)
+        self.fail_after = fail_after
+
+    def read(self, image=None):
+        if self.fail_after == 0:
+            raise IOError("stream dropped")
+        self.fail_after -= 1
+        return super().read(image)
+
+
+def invert_rows(frame, rows):
+    # 输出尺寸随帧内容变化，检验按实际尺寸取回结果
+    return 255 - frame[:rows + int(frame[0, 0, 0]) % 3]
+
+
+def kill_on_frame(frame, index):
+    if frame[0, 0, 0] == index:
+        os.kill(os.getpid(), signal.SIGKILL)
+    return frame
+
+
+def fail_on_frame(frame, index):
+    if frame[0, 0, 0] == index:
+        raise ValueError("bad frame {}".format(index))
+    return frame
+
+
+def make_frames(count):
+    frames = np.random.default_rng(0).integers(0, 256, (count, 16, 24, 3), dtype=np.uint8)
+    frames[:, 0, 0, 0] = np.arange(count)
+    return frames
+
+
+def test_results_in_order():
+    frames = make_frames(30)
+    written = []
+    count = run_pipeline(FrameList(frames), invert_rows, (10,), lambda shape: (shape[0], shape[1], 3),
+                         lambda frame: written.append(frame.copy()), workers=3)
+    assert count == len(frames) == len(written)
+    for frame, result in zip(frames, written):
+        assert (result == invert_rows(frame, 10)).all()
+
+
+def test_conversion_error_is_raised():
+    with pytest.raises(RuntimeError, match="bad frame 5"):
+        run_pipeline(FrameList(make_frames(20)), fail_on_frame, (5,), lambda shape: shape, lambda frame: None,
+                     workers=2)
+
+
+def test_killed_worker_fails_instead_of_hanging():
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="exited with code"):
+        run_pipeline(FrameList(make_frames(20)), kill_on_frame, (5,), lambda shape: shape, lambda frame: None,
+                     workers=2)
+    assert time.perf_counter() - start < 30
+
+
+@pytest.mark.parametrize("cap", [
+    FailingCapture(make_frames(20), 7),
+    # 中途帧尺寸变化，复制到共享内存槽位时出错
+    FrameList(list(make_frames(6)) + [np.zeros((8, 8, 3), dtype=np.uint8)] + list(make_frames(6))),
+], ids=["read", "shape"])
+def test_decode_error_is_raised(cap):
+    start = time.perf_counter()
+    written = []
+    with pytest.raises(RuntimeError, match="stream dropped|could not broadcast"):
+        run_pipeline(cap, invert_rows, (10,), lambda shape: (shape[0], shape[1], 3), written.append, workers=2)
+    assert time.perf_counter() - start < 30
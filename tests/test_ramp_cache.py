@@ -0,0 +1,108 @@
+"""
+The sorted ramp cache of utils.load_ramp: repeated runs reuse the in-process and on-disk
+entries, and changing the font file, the font size or the alphabet measures the ramp again.
+"""
+import os
+import shutil
+
+import pytest
+from PIL import ImageFont
+
+import alphabets
+import utils
+
+MEASURE_CHARS = utils.measure_chars
+
+
+@pytest.fixture
+def measured(tmp_path, monkeypatch):
+    """
+    Empty caches under tmp_path; returns the list of (alphabet, font size) actually measured.
+    """
+    monkeypatch.setattr(utils, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(utils, "_ramp_cache", {})
+    calls = []
+
+    def counting(char_list, font, language):
+        calls.append((char_list, font.size))
+        return MEASURE_CHARS(char_list, font, language)
+
+    monkeypatch.setattr(utils, "measure_chars", counting)
+    return calls
+
+
+def font_copy(tmp_path, name="DejaVuSansMono-Bold.ttf"):
+    path = str(tmp_path / "font.ttf")
+    shutil.copyfile(os.path.join("fonts", name), path)
+    return path
+
+
+def uncached_ramp(language, mode, font_path, font_size):
+    char_list = getattr(alphabets, language.upper())[mode]
+    brightness, _ = MEASURE_CHARS(char_list, ImageFont.truetype(font_path, size=font_size), language)
+    return utils.select_chars(char_list, brightness)
+
+
+def test_repeated_runs_hit(tmp_path, measured):
+    font_path = font_copy(tmp_path)
+    first = utils.get_data("english", "standard", font_path=font_path)[0]
+    assert utils.get_data("english", "standard", font_path=font_path)[0] == first
+    assert len(measured) == 1
+    # 新进程：内存中的缓存为空，从磁盘读取
+    utils._ramp_cache.clear()
+    assert utils.get_data("english", "standard", font_path=font_path)[0] == first
+    assert len(measured) == 1
+    assert first == uncached_ramp("english", "standard", font_path, 20)
+    # 强制重建
+    utils.get_data("english", "standard", rebuild_cache=True, font_path=font_path)
+    assert len(measured) == 2
+
+
+def test_font_change_invalidates(tmp_path, measured):
+    font_path = font_copy(tmp_path)
+    utils.get_data("french", "standard", font_path=font_path)
+    # 同一路径换成另一个字体文件：按内容哈希，不按路径
+    shutil.copyfile(os.path.join("fonts", "DejaVuSansMono-Oblique.ttf"), font_path)
+    stat = os.stat(font_path)
+    os.utime(font_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    ramp = utils.get_data("french", "standard", font_path=font_path)[0]
+    assert len(measured) == 2
+    assert ramp == uncached_ramp("french", "standard", font_path, 20)
+    utils._ramp_cache.clear()
+    assert utils.get_data("french", "standard", font_path=font_path)[0] == ramp
+    assert len(measured) == 2
+
+
+def test_size_change_invalidates(tmp_path, measured):
+    font_path = font_copy(tmp_path)
+    for font_size in (20, 12, 20, 12):
+        ramp = utils.get_data("english", "standard", font_path=font_path, font_size=font_size)[0]
+        assert ramp == uncached_ramp("english", "standard", font_path, font_size)
+    assert [size for _, size in measured] == [20, 12]
+    assert len(os.listdir(utils.CACHE_DIR)) == 2
+
+
+def test_alphabet_change_invalidates(tmp_path, measured, monkeypatch):
+    font_path = font_copy(tmp_path)
+    utils.get_data("english", "standard", font_path=font_path)
+    # 修改 alphabets.py 中的字符表：键相同，但保存的字母表不同
+    alphabet = alphabets.ENGLISH["standard"][::2]
+    monkeypatch.setitem(alphabets.ENGLISH, "standard", alphabet)
+    ramp = utils.get_data("english", "standard", font_path=font_path)[0]
+    assert measured[-1][0] == alphabet and len(measured) == 2
+    assert set(ramp) <= set(alphabet)
+    # 磁盘上的条目也已更新
+    utils._ramp_cache.clear()
+    assert utils.get_data("english", "standard", font_path=font_path)[0] == ramp
+    assert len(measured) == 2
+
+
+def test_corrupt_entry_is_rebuilt(tmp_path, measured):
+    font_path = font_copy(tmp_path)
+    ramp = utils.get_data("english", "standard", font_path=font_path)[0]
+    utils._ramp_cache.clear()
+    for name in os.listdir(utils.CACHE_DIR):
+        with open(os.path.join(utils.CACHE_DIR, name), "w") as cache_file:
+            cache_file.write('{"version": 1, "alph')
+    assert utils.get_data("english", "standard", font_path=font_path)[0] == ramp
+    assert len(measured) == 2
@@ -0,0 +1,139 @@
+"""
+Raw-frame pipe I/O (rawpipe.py): every pixel format and Y4M colorspace round-trips through
+PipeWriter and PipeCapture, and video2video / video2video_color run with --input - --output -
+write exactly the bytes of an in-process convert_frame (the check of benchmarks/pipe_io.py).
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+import video2video
+import video2video_color
+from pipe_io import encode, expected_output, pipe_options, run_script
+from rawpipe import PIX_FMTS, PipeCapture, PipeWriter, plane_shape
+from video_pipeline import make_frame
+
+WIDTH, HEIGHT = 96, 64
+FPS = 25
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return [make_frame(WIDTH, HEIGHT, index) for index in range(4)]
+
+
+def through(frame, pix_fmt):
+    """
+    frame as it comes back after a conversion to pix_fmt and back to BGR.
+    """
+    if pix_fmt == "gray":
+        return cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+    if pix_fmt == "yuv420p":
+        return cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420), cv2.COLOR_YUV2BGR_I420)
+    return frame
+
+
+def read_all(cap, into=None):
+    decoded = []
+    while True:
+        ok, frame = cap.read(into)
+        if not ok:
+            return decoded
+        decoded.append(frame.copy())
+
+
+@pytest.mark.parametrize("output_format", ["rawvideo", "y4m"])
+@pytest.mark.parametrize("pix_fmt", PIX_FMTS)
+def test_round_trip(frames, output_format, pix_fmt):
+    stream = encode(frames, FPS, output_format, pix_fmt)
+    if output_format == "y4m":
+        # Y4M 总是 4:2:0，尺寸和帧率来自文件头
+        pix_fmt = "yuv420p"
+        assert stream.startswith(b"YUV4MPEG2 W96 H64 F25:1 Ip A1:1 C420jpeg\n")
+        cap = PipeCapture(io.BytesIO(stream), "y4m")
+    else:
+        assert len(stream) == len(frames) * np.prod(plane_shape(pix_fmt, WIDTH, HEIGHT))
+        cap = PipeCapture(io.BytesIO(stream), "rawvideo", (WIDTH, HEIGHT), pix_fmt, FPS)
+    assert (cap.width, cap.height, cap.get(cv2.CAP_PROP_FPS)) == (WIDTH, HEIGHT, FPS)
+    # 读入调用方的数组与读入内部缓冲区的结果相同
+    decoded = read_all(cap, np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8))
+    assert len(decoded) == cap.frames == len(frames)
+    for frame, expected in zip(decoded, frames):
+        assert np.array_equal(frame, through(expected, pix_fmt))
+
+
+@pytest.mark.parametrize("colorspace", ["444", "mono"])
+def test_y4m_colorspaces(frames, colorspace):
+    stream = io.BytesIO()
+    stream.write("YUV4MPEG2 W{} H{} F30000:1001 C{}\n".format(WIDTH, HEIGHT, colorspace).encode())
+    for frame in frames:
+        stream.write(b"FRAME\n")
+        if colorspace == "mono":
+            stream.write(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).tobytes())
+        else:
+            stream.write(np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2YUV).transpose(2, 0, 1)).tobytes())
+    cap = PipeCapture(io.BytesIO(stream.getvalue()), "y4m")
+    assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(29.97, abs=0.01)
+    for frame, expected in zip(read_all(cap), frames):
+        if colorspace == "mono":
+            assert np.array_equal(frame, through(expected, "gray"))
+        else:
+            assert np.array_equal(frame, cv2.cvtColor(cv2.cvtColor(expected, cv2.COLOR_BGR2YUV), cv2.COLOR_YUV2BGR))
+
+
+def test_writer_pads_frames_on_canvas():
+    stream = io.BytesIO()
+    writer = PipeWriter(stream, (5, 7, 3), FPS, "rawvideo", "yuv420p", fill=(255, 255, 255))
+    # yuv420p 需要偶数尺寸，画布补到 8x6
+    assert writer.size == (8, 6)
+    writer.write(np.zeros((3, 4, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((7, 4, 3), dtype=np.uint8))
+    canvas = cv2.cvtColor(np.frombuffer(stream.getvalue(), dtype=np.uint8).reshape(9, 8), cv2.COLOR_YUV2BGR_I420)
+    assert canvas[:3, :4].max() <= 2 and canvas[3:].min() >= 253 and canvas[:, 4:].min() >= 253
+
+
+@pytest.mark.parametrize("stream, options, message", [
+    (b"RIFF" + bytes(64), ("y4m",), "not a YUV4MPEG2"),
+    (b"YUV4MPEG2 W8 H8 C422\n", ("y4m",), "colorspace"),
+    (b"YUV4MPEG2 W8 H8 It\n", ("y4m",), "Interlaced"),
+    (b"", ("rawvideo",), "input_size"),
+    (b"", ("rawvideo", (7, 5), "yuv420p"), "even size"),
+])
+def test_invalid_input(stream, options, message):
+    with pytest.raises(ValueError, match=message):
+        PipeCapture(io.BytesIO(stream), *options)
+
+
+def test_truncated_frame(frames):
+    stream = encode(frames, FPS, "y4m")
+    cap = PipeCapture(io.BytesIO(stream[:-100]), "y4m")
+    for _ in frames[:-1]:
+        assert cap.read()[0]
+    with pytest.raises(ValueError, match="Truncated"):
+        cap.read()
+    # 第二帧的帧头损坏
+    second = stream.index(b"FRAME\n", stream.index(b"FRAME\n") + 1)
+    cap = PipeCapture(io.BytesIO(stream[:second] + b"FRAMX" + stream[second + 5:]), "y4m")
+    assert cap.read()[0]
+    with pytest.raises(ValueError, match="FRAME marker"):
+        cap.read()
+
+
+# 每种输入像素格式配相同的输出像素格式，再加 Y4M 进出
+PIPE_CASES = [("rawvideo", pix_fmt, "rawvideo", pix_fmt) for pix_fmt in PIX_FMTS] + [("y4m", "bgr24", "y4m", "bgr24")]
+
+
+@pytest.mark.parametrize("module", [video2video, video2video_color])
+@pytest.mark.parametrize("input_format, pix_fmt, output_format, output_pix_fmt", PIPE_CASES)
+def test_script_output_is_identical(frames, module, input_format, pix_fmt, output_format, output_pix_fmt):
+    stream = encode(frames, FPS, input_format, pix_fmt)
+    options = pipe_options(input_format, (WIDTH, HEIGHT), output_format, pix_fmt, output_pix_fmt)
+    options += ["--num_cols", "24"]
+    expected = expected_output(module, stream, options)
+    worker_counts = (0, 2) if pix_fmt in ("bgr24", "yuv420p") else (0,)
+    for workers in worker_counts:
+        output, _ = run_script(module, options + ["--workers", str(workers)], stream)
+        assert output == expected
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+import video2video
+import video2video_color
+from converter import Converter
+from renderer import GlyphAtlas
+from utils import build_char_lut
+from video_pipeline import make_frame
+
+# 图集合成与逐行/逐字 draw.text 之间允许的最大像素差（抗锯齿混合的舍入）
+GRAY_TOLERANCE = 2
+COLOR_TOLERANCE = 1
+
+LATIN = [("english", "standard"), ("general", "complex"), ("general", "simple"), ("russian", "standard")]
+# CJK 字体不随仓库分发，没有时跳过
+CJK = [("chinese", "standard", "fonts/simsun.ttc"), ("japanese", "hiragana", "fonts/arial-unicode.ttf"),
+       ("korean", "standard", "fonts/arial-unicode.ttf")]
+
+
+def max_diff(first, second):
+    return int(np.abs(np.asarray(first, dtype=np.int16) - np.asarray(second, dtype=np.int16)).max())
+
+
+def check_converter(language, mode, background):
+    atlas = Converter(language, mode, background=background)
+    pil = Converter(language, mode, background=background, renderer="pil")
+    rng = np.random.default_rng(0)
+    char_indices = rng.integers(0, len(atlas.char_list), (12, 30))
+    colors = rng.integers(0, 256, (12, 30, 3))
+    assert atlas.load_atlas() is not None and pil.load_atlas() is None
+    assert max_diff(atlas.render(char_indices), pil.render(char_indices)) <= GRAY_TOLERANCE
+    assert max_diff(atlas.render_color(char_indices, colors), pil.render_color(char_indices, colors)) <= COLOR_TOLERANCE
+
+
+@pytest.mark.parametrize("background", ["black", "white"])
+@pytest.mark.parametrize("language, mode", LATIN)
+def test_latin(language, mode, background):
+    check_converter(language, mode, background)
+
+
+@pytest.mark.parametrize("language, mode, font_path", CJK)
+def test_cjk(language, mode, font_path):
+    if not os.path.exists(font_path):
+        pytest.skip("{} is not installed".format(font_path))
+    check_converter(language, mode, "white")
+
+
+def test_video_paths():
+    frame = make_frame(320, 180, 3)
+    char_list = video2video.get_char_list("complex")
+    font = video2video.initialize_font(1)
+    atlas = GlyphAtlas(char_list, font, "A")
+    lut = build_char_lut(len(char_list))
+    for bg_code in (0, 255):
+        rendered = [video2video.convert_frame(frame, char_list, font, 60, 0, bg_code, renderer, lut)
+                    for renderer in (atlas, None)]
+        assert rendered[0].shape == rendered[1].shape
+        assert max_diff(*rendered) <= GRAY_TOLERANCE
+        bg_color = (bg_code,) * 3
+        rendered = [video2video_color.process_frame(frame, 60, char_list, font, bg_color, renderer, lut)
+                    for renderer in (atlas, None)]
+        assert max_diff(*rendered) <= COLOR_TOLERANCE
@@ -0,0 +1,49 @@
+"""
+Request option validation of server.py, and the timeout it applies to a conversion.
+"""
+import asyncio
+
+import cv2
+import pytest
+
+import server
+from video_pipeline import make_frame
+
+
+@pytest.mark.parametrize("query", ["timeout=0", "timeout=-1", "timeout=-0.5", "timeout=nan",
+                                   "color_step=0", "color_step=-8"])
+def test_non_positive_options_are_rejected(query):
+    with pytest.raises(ValueError):
+        server.request_options("img2txt", query)
+
+
+def test_options():
+    assert server.request_options("img2img", "")["timeout"] is None
+    options = server.request_options("img2txt", "timeout=0.5&color_step=4")
+    assert options["timeout"] == 0.5 and options["color_step"] == 4
+
+
+def run_convert(query, timeout=30):
+    conversion_server = server.ConversionServer(1, 1, timeout, 1 << 20, [])
+
+    async def convert():
+        await conversion_server.start()
+        try:
+            return await conversion_server.convert("img2txt", query, data)
+        finally:
+            conversion_server.close()
+
+    data = cv2.imencode(".png", make_frame(64, 48))[1].tobytes()
+    return asyncio.run(convert())
+
+
+@pytest.mark.parametrize("query", ["timeout=0", "timeout=-1", "color_step=0"])
+def test_convert_returns_400(query):
+    status, _, body, _ = run_convert(query)
+    assert status == 400, body
+
+
+def test_convert_timeouts():
+    # 请求的超时不能超过服务器的上限，未指定时使用服务器的超时
+    assert run_convert("timeout=60", timeout=30)[0] == 200
+    assert run_convert("", timeout=30)[0] == 200
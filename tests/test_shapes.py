@@ -0,0 +1,86 @@
+"""
+Shape matching (shapes.py): the glyphs picked by the single matrix product equal the argmax of
+the score written out per cell and per glyph, for full-size and narrowed patches, with a tone
+curve and with the cells split into several bands.
+"""
+import cv2
+import numpy as np
+import pytest
+
+import shapes
+from converter import Converter
+from video_pipeline import make_frame
+
+
+def glyph_patches(atlas, patch_size):
+    """
+    (glyphs on white, ink spilled into the neighbouring cells) of every glyph, as float64.
+    """
+    glyphs, spills = [], []
+    for tile in atlas.tiles:
+        blocks = {(dy, dx): cv2.resize(tile[dy, dx], patch_size, interpolation=cv2.INTER_AREA).astype(np.float64)
+                  for dy in range(atlas.blocks_y) for dx in range(atlas.blocks_x)}
+        glyphs.append(255 - blocks.pop((atlas.margin_y, atlas.margin_x)).ravel())
+        spills.append(sum(block.mean() for block in blocks.values()))
+    return glyphs, spills
+
+
+def brute_force(matcher, gray_image, num_rows, num_cols, cell_width, cell_height):
+    """
+    Per cell, the score of every glyph from its definition and their argmax, plus the margin
+    between the best and the second best score.
+    """
+    patch_size = matcher.patch_size(cell_width)
+    glyphs, spills = glyph_patches(matcher.atlas, patch_size)
+    means = [glyph.mean() for glyph in glyphs]
+    low, high = min(means), max(means)
+    gain = max((high - low) / 255, 1e-6)
+    patches = matcher.patches(gray_image, num_rows, num_cols, cell_width, cell_height, patch_size)
+    indices = np.empty((num_rows, num_cols), dtype=np.int64)
+    margins = np.empty((num_rows, num_cols))
+    for row in range(num_rows):
+        for col in range(num_cols):
+            cell = low + gain * patches[row, :, col].astype(np.float64).ravel()
+            n = cell.size
+            scores = [-n * (cell.mean() - mean) ** 2 + 2 * (cell - cell.mean()) @ (glyph - mean) - n * spill ** 2
+                      for glyph, mean, spill in zip(glyphs, means, spills)]
+            best = np.sort(scores)[-2:]
+            indices[row, col] = int(np.argmax(scores))
+            margins[row, col] = (best[1] - best[0]) / gain
+    return indices, margins
+
+
+def lined_image(width, height):
+    image = cv2.cvtColor(make_frame(width, height, 3), cv2.COLOR_BGR2GRAY)
+    # 加上细线和边缘，让形状而不只是亮度决定结果
+    image[::7] = 255
+    image[:, ::11] = 0
+    cv2.line(image, (0, height - 1), (width - 1, 0), 128, 2)
+    return image
+
+
+@pytest.mark.parametrize("num_cols, gamma", [(12, 1.0), (30, 1.0), (30, 1.8)])
+@pytest.mark.parametrize("mode", ["simple", "complex"])
+def test_product_matches_brute_force(num_cols, gamma, mode):
+    converter = Converter("general", mode, match="shape", gamma=gamma)
+    gray_image = lined_image(240, 180)
+    num_rows, num_cols, cell_width, cell_height = converter.grid(240, 180, num_cols)
+    matcher = converter.load_matcher()
+    indices = matcher.match(gray_image, num_rows, num_cols, cell_width, cell_height)
+    expected, margins = brute_force(matcher, gray_image, num_rows, num_cols, cell_width, cell_height)
+    # 12 列时补丁为完整的 8 像素宽，30 列时缩窄为单元格宽度
+    assert matcher.patch_size(cell_width)[0] == min(8, int(cell_width))
+    # float32 的乘积只可能在两个字形得分几乎相同时选得不同
+    different = indices != expected
+    assert (margins[different] < 1e-2).all()
+    assert different.mean() < 0.01
+
+
+def test_bands_do_not_change_result(monkeypatch):
+    converter = Converter("general", "complex", match="shape")
+    gray_image = lined_image(320, 240)
+    grid = converter.grid(320, 240, 40)
+    expected = converter.load_matcher().match(gray_image, *grid)
+    # 每个乘积只有几行单元格（包括最后不满的一段）
+    monkeypatch.setattr(shapes, "MATCH_BAND_CELLS", 3 * grid[1] - 5)
+    assert np.array_equal(converter.load_matcher().match(gray_image, *grid), expected)
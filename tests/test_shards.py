@@ -0,0 +1,89 @@
+"""
+Sharded conversion (shards.py) of a short clip merges into the same video as a serial run.
+"""
+import json
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from shards import merge_shards
+from video_pipeline import make_clip
+
+FRAMES = 23
+
+
+def convert(script, tmp_path, output, extra=()):
+    subprocess.run([sys.executable, "-W", "ignore", script, "--input", str(tmp_path / "clip.avi"),
+                    "--output", str(tmp_path / output), "--num_cols", "40"] + list(extra),
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize("script", ["video2video.py", "video2video_color.py"])
+def test_local_shards_match_serial(tmp_path, script):
+    make_clip(str(tmp_path / "clip.avi"), 320, 240, FRAMES)
+    convert(script, tmp_path, "serial.avi")
+    # 帧数不能被分片数整除，最后一个分片较短
+    convert(script, tmp_path, "sharded.avi", ["--shard", "local", "--shards", "3"])
+    serial, sharded = read_frames(tmp_path / "serial.avi"), read_frames(tmp_path / "sharded.avi")
+    assert len(serial) == len(sharded) == FRAMES
+    for index, (first, second) in enumerate(zip(serial, sharded)):
+        assert np.array_equal(first, second), index
+
+
+def test_merge_needs_every_shard(tmp_path):
+    make_clip(str(tmp_path / "clip.avi"), 320, 240, FRAMES)
+    convert("video2video.py", tmp_path, "out.avi", ["--shard", "plan", "--shards", "3"])
+    manifest = str(tmp_path / "out.avi.shards.json")
+    subprocess.run([sys.executable, "-W", "ignore", "video2video.py", "--shard", "run", "--manifest", manifest,
+                    "--shard_index", "0", "2"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with pytest.raises(subprocess.CalledProcessError):
+        subprocess.run([sys.executable, "-W", "ignore", "video2video.py", "--shard", "merge", "--manifest", manifest],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    assert not (tmp_path / "out.avi").exists()
+    # 补上缺少的分片后即可合并
+    subprocess.run([sys.executable, "-W", "ignore", "video2video.py", "--shard", "local", "--manifest", manifest,
+                    "--input", str(tmp_path / "clip.avi"), "--output", str(tmp_path / "out.avi")],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    assert len(read_frames(tmp_path / "out.avi")) == FRAMES
+
+
+@pytest.mark.parametrize("output", ["out.gif", "out.WEBP", "-"])
+@pytest.mark.parametrize("command", ["plan", "local"])
+def test_unmergeable_output_is_rejected(tmp_path, output, command):
+    make_clip(str(tmp_path / "clip.avi"), 160, 120, 4)
+    output_path = output if output == "-" else str(tmp_path / output)
+    result = subprocess.run([sys.executable, "-W", "ignore", "video2video.py", "--input", str(tmp_path / "clip.avi"),
+                             "--output", output_path, "--shard", command, "--manifest", str(tmp_path / "out.json")],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # 在规划之前失败，不会把 XVID 视频写到动画或标准输出的名字下
+    assert result.returncode != 0
+    assert b"Sharded conversion cannot write" in result.stderr
+    assert result.stdout == b""
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["clip.avi"]
+
+
+def test_merge_rejects_animated_output(tmp_path):
+    make_clip(str(tmp_path / "clip.avi"), 160, 120, 4)
+    convert("video2video.py", tmp_path, "out.avi", ["--shard", "local", "--shards", "2"])
+    manifest_path = tmp_path / "out.avi.shards.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["output"] = str(tmp_path / "out.gif")
+    manifest_path.write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        merge_shards(str(manifest_path))
+    assert not (tmp_path / "out.gif").exists()
@@ -0,0 +1,41 @@
+"""
+Strip-rendered PNG and TIFF output of img2img and img2img_color equals the full render.
+"""
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from video_pipeline import make_frame
+
+
+def convert(tmp_path, script, output, extra):
+    subprocess.run([sys.executable, "-W", "ignore", script, "--input", str(tmp_path / "input.png"),
+                    "--output", str(tmp_path / output), "--num_cols", "60"] + extra,
+                   check=True, stdout=subprocess.DEVNULL)
+    with Image.open(tmp_path / output) as image:
+        return np.array(image)
+
+
+@pytest.mark.parametrize("background", ["black", "white"])
+@pytest.mark.parametrize("script", ["img2img.py", "img2img_color.py"])
+def test_strips_match_full_render(tmp_path, script, background):
+    # 高度不是条带行数的整数倍，最后一个条带不满
+    cv2.imwrite(str(tmp_path / "input.png"), make_frame(331, 247, 2))
+    options = ["--background", background]
+    full = convert(tmp_path, script, "full.png", options)
+    for output, strip_rows in (("strips.png", 7), ("strips.tif", 7), ("single.png", 1000)):
+        strips = convert(tmp_path, script, output, options + ["--strip_rows", str(strip_rows)])
+        assert strips.shape == full.shape, output
+        assert np.array_equal(strips, full), output
+
+
+def test_strips_need_png_or_tiff(tmp_path):
+    cv2.imwrite(str(tmp_path / "input.png"), make_frame(64, 48))
+    with pytest.raises(subprocess.CalledProcessError):
+        subprocess.run([sys.executable, "-W", "ignore", "img2img.py", "--input", str(tmp_path / "input.png"),
+                        "--output", str(tmp_path / "out.jpg"), "--strip_rows", "8"],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -1,15 +1,31 @@
 import argparse
+import os
+import sys
 import cv2
 import numpy as np
 from PIL import Image, ImageFont, ImageDraw, ImageOps
+from utils import cell_means, build_char_lut, map_brightness
+from renderer import GlyphAtlas, DeltaRenderer
+from pipeline import run_pipeline
+from terminal import play_video
+from asciivideo import AsciiVideoWriter, CONTAINER_EXTENSION, COMPRESSIONS
+from animation import AnimationWriter, ANIMATION_EXTENSIONS, blend_palette, union_box
+from profiler import profiler
+from live import run_live_source
+from shards import ShardCapture, SegmentWriter, SHARD_COMMANDS, run_command
+from rawpipe import add_pipe_args, pipe_io
 
 def get_args():
     """
     Parse command line arguments.
     """
     parser = argparse.ArgumentParser("Image to ASCII")
-    parser.add_argument("--input", type=str, default="data/input.mp4", help="Path to input video")
-    parser.add_argument("--output", type=str, default="data/output.mp4", help="Path to output video")
+    parser.add_argument("--input", type=str, default="data/input.mp4",
+                        help="Path to input video (- reads Y4M/rawvideo frames from stdin)")
+    parser.add_argument("--output", type=str, default="data/output.mp4",
+                        help="Path to output video (.asv writes the compact ASCII video container, "
+                             ".gif/.webp an animation storing only the changed region of each frame, "
+                             "- writes Y4M/rawvideo frames to stdout)")
     parser.add_argument("--mode", type=str, default="simple", choices=["simple", "complex"],
                         help="10 or 70 different characters")
     parser.add_argument("--background", type=str, default="white", choices=["black", "white"],
@@ -18,6 +34,38 @@ def get_args():
     parser.add_argument("--scale", type=int, default=1, help="Scale factor for output size")
     parser.add_argument("--fps", type=int, default=0, help="Frames per second for output video")
     parser.add_argument("--overlay_ratio", type=float, default=0.2, help="Overlay width ratio")
+    parser.add_argument("--renderer", type=str, default="atlas", choices=["atlas", "pil"],
+                        help="Glyph atlas compositing or per-line PIL text drawing")
+    parser.add_argument("--gamma", type=float, default=1.0, help="Gamma curve applied to cell brightness")
+    parser.add_argument("--contrast", type=float, default=1.0, help="Contrast stretch around mid-gray")
+    parser.add_argument("--dither", action="store_true", help="Ordered dithering between neighbouring characters")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only redraw cells that changed since the previous frame (atlas renderer)")
+    parser.add_argument("--compression", type=str, default="zlib", choices=COMPRESSIONS,
+                        help="Per-frame compression of the .asv container")
+    parser.add_argument("--play", action="store_true",
+                        help="Play the ASCII video in the terminal instead of writing the output file")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes for pipelined conversion (0 converts frames in this process)")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        help="Report per-stage timings, frame latency percentiles and peak RSS, and write them to this JSON file")
+    parser.add_argument("--trace", type=str, default=None, help="Also write a Chrome trace-event file (with --profile)")
+    parser.add_argument("--shard", type=str, default=None, choices=SHARD_COMMANDS,
+                        help="Sharded conversion: plan frame ranges, run shards, merge segments, or all three locally")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Shard manifest (default: the output path followed by .shards.json)")
+    parser.add_argument("--shards", type=int, default=4, help="Number of frame ranges to plan")
+    parser.add_argument("--shard_index", type=int, nargs="+", default=None,
+                        help="Shards to run (default: every shard that is not done)")
+    parser.add_argument("--retries", type=int, default=1, help="Times failed shards are run again in local mode")
+    parser.add_argument("--live", action="store_true",
+                        help="Low-latency mode for a device index, pipe, stream or 'synthetic[:WxH]' input: "
+                             "num_cols adapts to keep every frame within the --fps budget")
+    parser.add_argument("--min_cols", type=int, default=20, help="Smallest num_cols the live controller may use")
+    parser.add_argument("--max_frames", type=int, default=0, help="Stop live mode after this many frames (0 = no limit)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop live mode after this many seconds (0 = no limit)")
+    parser.add_argument("--metrics", type=str, default=None, help="Write the live controller metrics to this JSON file")
+    add_pipe_args(parser)
     return parser.parse_args()
 
 def get_char_list(mode):
@@ -54,32 +102,55 @@ def calculate_cells(image, num_cols):
     num_rows = int(height / cell_height)
     return cell_width, cell_height, num_rows
 
-def create_ascii_image(image, char_list, font, num_cols, cell_width, cell_height, bg_code):
+def create_ascii_image(image, char_list, font, num_cols, cell_width, cell_height, bg_code, atlas=None,
+                       lut=None, dither=False):
     """
     Create an ASCII representation of the image.
+    If a glyph atlas is given, the frame is composited from it instead of drawn line by line.
     """
     height, width = image.shape
-    num_chars = len(char_list)
-    char_width, char_height = font.getsize("A")
     num_rows = int(height / cell_height)
+    if lut is None:
+        lut = build_char_lut(len(char_list))
+
+    with profiler.stage("cell_average"):
+        avg_color = cell_means(image, num_rows, num_cols, cell_width, cell_height)
+    with profiler.stage("char_map"):
+        char_idx = map_brightness(avg_color, lut, dither)
+
+    with profiler.stage("draw"):
+        if atlas is not None:
+            out_image = atlas.render(char_idx, 255 - bg_code, bg_code)
+        else:
+            char_width, char_height = font.getsize("A")
+            out_width = char_width * num_cols
+            out_height = char_height * num_rows
+            out_image = Image.new("L", (out_width, out_height), bg_code)
+            draw = ImageDraw.Draw(out_image)
+            chars = np.array(list(char_list))[char_idx]
+            for i in range(num_rows):
+                draw.text((0, i * char_height), "".join(chars[i]), fill=255 - bg_code, font=font)
 
-    out_width = char_width * num_cols
-    out_height = char_height * num_rows
-    out_image = Image.new("L", (out_width, out_height), bg_code)
-    draw = ImageDraw.Draw(out_image)
+    with profiler.stage("crop"):
+        cropped_image = out_image.getbbox()
+        return out_image.crop(cropped_image)
 
-    for i in range(num_rows):
-        line = ""
-        for j in range(num_cols):
-            x1, y1 = int(j * cell_width), int(i * cell_height)
-            x2, y2 = min(int((j + 1) * cell_width), width), min(int((i + 1) * cell_height), height)
-            avg_color = int(np.mean(image[y1:y2, x1:x2]))
-            char_idx = min(avg_color * num_chars // 255, num_chars - 1)
-            line += char_list[char_idx]
-        draw.text((0, i * char_height), line, fill=255 - bg_code, font=font)
+def frame_char_indices(frame, char_list, num_cols, lut=None, dither=False):
+    """
+    Char-index grid of one BGR video frame.
+    """
+    gray_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    cell_width, cell_height, num_rows = calculate_cells(gray_image, num_cols)
+    if lut is None:
+        lut = build_char_lut(len(char_list))
+    return map_brightness(cell_means(gray_image, num_rows, num_cols, cell_width, cell_height), lut, dither)
 
-    cropped_image = out_image.getbbox()
-    return out_image.crop(cropped_image)
+def frame_to_text(frame, char_list, num_cols, lut=None, dither=False):
+    """
+    Convert one BGR video frame into the lines of ASCII text used for terminal playback.
+    """
+    chars = np.array(list(char_list))[frame_char_indices(frame, char_list, num_cols, lut, dither)]
+    return "\n".join("".join(row) for row in chars)
 
 def overlay_original_frame(ascii_frame, original_frame, overlay_ratio):
     """
@@ -90,45 +161,212 @@ def overlay_original_frame(ascii_frame, original_frame, overlay_ratio):
     ascii_frame[height - overlay.shape[0]:, width - overlay.shape[1]:, :] = overlay
     return ascii_frame
 
-def process_video(input_path, output_path, char_list, font, num_cols, scale, fps, overlay_ratio, bg_code):
+def convert_frame(frame, char_list, font, num_cols, overlay_ratio, bg_code, atlas=None, lut=None, dither=False):
     """
-    Process video frame by frame and convert each frame to ASCII.
+    Convert one BGR video frame into a BGR ASCII frame.
     """
-    cap, fps = get_video_properties(input_path, fps)
-    out = None
+    with profiler.stage("grayscale"):
+        gray_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    cell_width, cell_height, num_rows = calculate_cells(gray_image, num_cols)
+
+    ascii_image = create_ascii_image(gray_image, char_list, font, num_cols, cell_width, cell_height, bg_code,
+                                     atlas, lut, dither)
+    with profiler.stage("overlay"):
+        ascii_image = cv2.cvtColor(np.array(ascii_image), cv2.COLOR_GRAY2BGR)
+        if overlay_ratio:
+            ascii_image = overlay_original_frame(ascii_image, frame, overlay_ratio)
+    return ascii_image
+
+def max_frame_shape(frame_shape, font, num_cols):
+    """
+    Largest ASCII frame convert_frame can produce for frames of the given shape (before cropping).
+    """
+    _, _, num_rows = calculate_cells(np.empty(frame_shape[:2], dtype=np.uint8), num_cols)
+    char_width, char_height = font.getsize("A")
+    return char_height * num_rows, char_width * num_cols, 3
 
+def save_container(cap, output_path, char_list, font, num_cols, fps, bg_code, lut=None, dither=False,
+                   compression="zlib"):
+    """
+    Store the char-index grid of every frame in an .asv container instead of rendering it.
+    Returns the number of frames stored.
+    """
+    writer = None
+    frames = 0
     while cap.isOpened():
         ret, frame = cap.read()
         if not ret:
             break
+        char_idx = frame_char_indices(frame, char_list, num_cols, lut, dither)
+        if writer is None:
+            writer = AsciiVideoWriter(output_path, char_list, char_idx.shape[0], char_idx.shape[1], fps,
+                                      compression=compression, font=font.path, font_size=font.size,
+                                      background="white" if bg_code == 255 else "black")
+        writer.write(char_idx)
+        frames += 1
+    if writer:
+        writer.close()
+    return frames
 
-        gray_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        cell_width, cell_height, num_rows = calculate_cells(gray_image, num_cols)
+def save_animation(cap, output_path, char_list, font, num_cols, fps, overlay_ratio, bg_code, atlas=None, lut=None,
+                   dither=False):
+    """
+    Write an animated GIF or WebP. Frames are rendered incrementally over the whole grid (no
+    cropping, so every frame has the same size), and each frame stores only the box of cells
+    whose character changed since the previous frame, plus the overlay. Returns the number of
+    frames written.
+    """
+    if not isinstance(atlas, DeltaRenderer):
+        atlas = DeltaRenderer(atlas or GlyphAtlas(char_list, font, "A"))
+    # 灰度帧只有背景和墨迹之间的混合色，调色板正好覆盖所有混合级别
+    palette = blend_palette((bg_code,) * 3, (255 - bg_code,) * 3)
+    writer = None
+    frames = 0
+    while cap.isOpened():
+        with profiler.stage("read"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        with profiler.frame():
+            with profiler.stage("char_map"):
+                char_idx = frame_char_indices(frame, char_list, num_cols, lut, dither)
+            with profiler.stage("draw"):
+                ascii_image = atlas.render(char_idx, 255 - bg_code, bg_code)
+            box = atlas.changed
+            if overlay_ratio:
+                with profiler.stage("overlay"):
+                    ascii_image = np.array(ascii_image)
+                    height, width = ascii_image.shape
+                    overlay = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                                         (int(width * overlay_ratio), int(height * overlay_ratio)))
+                    ascii_image[height - overlay.shape[0]:, width - overlay.shape[1]:] = overlay
+                    box = union_box(box, (width - overlay.shape[1], height - overlay.shape[0], width, height))
+            ascii_image = np.asarray(ascii_image)
+            if writer is None:
+                writer = AnimationWriter(output_path, (ascii_image.shape[1], ascii_image.shape[0]), fps, palette)
+            with profiler.stage("write"):
+                writer.write(ascii_image, box)
+        frames += 1
+    if writer:
+        writer.close()
+    return frames
 
-        ascii_image = create_ascii_image(gray_image, char_list, font, num_cols, cell_width, cell_height, bg_code)
-        ascii_image = cv2.cvtColor(np.array(ascii_image), cv2.COLOR_GRAY2BGR)
+def process_video(input_path, output_path, char_list, font, num_cols, scale, fps, overlay_ratio, bg_code,
+                  atlas=None, lut=None, dither=False, workers=0, compression="zlib", frame_range=None, out=None,
+                  cap=None):
+    """
+    Process video frame by frame and convert each frame to ASCII.
+    With workers > 0 frames are converted in parallel by a pipeline of worker processes.
+    An output path ending in .asv stores the char grids in the compact container instead, and
+    one ending in .gif or .webp writes an animation (see save_animation), frame by frame.
+    frame_range (start, stop) converts only those frames, out replaces the XVID writer and cap an
+    already opened capture (e.g. a rawpipe.PipeCapture) replaces opening input_path.
+    Returns the number of frames converted.
+    """
+    if cap is None:
+        cap, fps = get_video_properties(input_path, fps)
+    elif fps == 0:
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+    if frame_range is not None:
+        cap = ShardCapture(cap, *frame_range)
+    if os.path.splitext(output_path)[1] == CONTAINER_EXTENSION:
+        frames = save_container(cap, output_path, char_list, font, num_cols, fps, bg_code, lut, dither, compression)
+        cap.release()
+        return frames
+    if os.path.splitext(output_path)[1].lower() in ANIMATION_EXTENSIONS:
+        # 只存变化区域需要上一帧，按顺序在本进程中转换
+        frames = save_animation(cap, output_path, char_list, font, num_cols, fps, overlay_ratio, bg_code, atlas, lut,
+                                dither)
+        cap.release()
+        return frames
+    frames = 0
 
+    def write(ascii_image):
+        nonlocal out
         if out is None:
             out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"XVID"), fps,
                                   (ascii_image.shape[1], ascii_image.shape[0]))
+        with profiler.stage("write"):
+            out.write(ascii_image)
 
-        if overlay_ratio:
-            ascii_image = overlay_original_frame(ascii_image, frame, overlay_ratio)
-
-        out.write(ascii_image)
+    args = (char_list, font, num_cols, overlay_ratio, bg_code, atlas, lut, dither)
+    if workers > 0:
+        frames = run_pipeline(cap, convert_frame, args, lambda shape: max_frame_shape(shape, font, num_cols), write,
+                              workers)
+    else:
+        while cap.isOpened():
+            with profiler.stage("read"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            # 每帧延迟统计转换和写出两部分
+            with profiler.frame():
+                write(convert_frame(frame, *args))
+            frames += 1
 
     cap.release()
-    out.release()
+    if out:
+        out.release()
+    return frames
+
+def load_resources(args):
+    """
+    Character list, font, background code, glyph atlas and lookup table for the given arguments.
+    """
+    char_list = get_char_list(args.mode)
+    font = initialize_font(args.scale)
+    bg_code = 255 if args.background == "white" else 0
+    atlas = GlyphAtlas(char_list, font, "A") if args.renderer == "atlas" else None
+    if atlas is not None and args.delta:
+        atlas = DeltaRenderer(atlas)
+    lut = build_char_lut(len(char_list), args.gamma, args.contrast)
+    return char_list, font, bg_code, atlas, lut
+
+def convert_shard(args, segment_path, frame_range):
+    """
+    Convert the frames of one shard into a segment (see shards.py). Returns (frames, frame sizes).
+    """
+    char_list, font, bg_code, atlas, lut = load_resources(args)
+    out = None
+    if os.path.splitext(segment_path)[1] != CONTAINER_EXTENSION:
+        cap = cv2.VideoCapture(args.input)
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        cap.release()
+        out = SegmentWriter(segment_path, args.fps, max_frame_shape(frame_shape, font, args.num_cols))
+    frames = process_video(args.input, segment_path, char_list, font, args.num_cols, args.scale, args.fps,
+                           args.overlay_ratio, bg_code, atlas, lut, args.dither, args.workers, args.compression,
+                           frame_range, out)
+    return frames, out.sizes if out else None
 
 def main():
     """
     Main function to execute the video conversion.
     """
     args = get_args()
+    if args.profile:
+        profiler.enable(args.profile, args.trace)
+    if args.shard:
+        sys.exit(run_command(args, os.path.abspath(__file__), convert_shard))
+    if args.live:
+        # 实时模式：处理摄像头、管道或流的最新一帧，根据延迟预算自动调整列数
+        char_list, font, bg_code, atlas, lut = load_resources(args)
+        run_live_source(args, lambda frame, num_cols: frame_to_text(frame, char_list, num_cols, lut, args.dither),
+                        lambda frame, num_cols: convert_frame(frame, char_list, font, num_cols, args.overlay_ratio, bg_code,
+                                                                      atlas, lut, args.dither))
+        return
     char_list = get_char_list(args.mode)
-    font = initialize_font(args.scale)
-    bg_code = 255 if args.background == "white" else 0
-    process_video(args.input, args.output, char_list, font, args.num_cols, args.scale, args.fps, args.overlay_ratio, bg_code)
+    if args.play:
+        lut = build_char_lut(len(char_list), args.gamma, args.contrast)
+        play_video(args.input, args.fps, lambda frame: frame_to_text(frame, char_list, args.num_cols, lut, args.dither))
+        return
+    char_list, font, bg_code, atlas, lut = load_resources(args)
+    # --input - / --output - 从标准输入读取、向标准输出写出 Y4M 或 rawvideo 帧
+    with pipe_io(args, lambda shape: max_frame_shape(shape, font, args.num_cols), (bg_code,) * 3) as (cap, out):
+        process_video(args.input, args.output, char_list, font, args.num_cols, args.scale, args.fps, args.overlay_ratio,
+                      bg_code, atlas, lut, args.dither, args.workers, args.compression, out=out, cap=cap)
+        # 多进程时每个 worker 各自保留上一帧，统计留在子进程中
+        if isinstance(atlas, DeltaRenderer) and not args.workers:
+            print(atlas.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,29 @@
 import argparse
+import os
+import sys
 import cv2
 import numpy as np
-from PIL import Image, ImageFont, ImageDraw, ImageOps
+from PIL import Image, ImageFont, ImageDraw
+from utils import cell_sums, cell_bounds, build_char_lut, map_brightness, BAYER_MATRIX
+from renderer import GlyphAtlas, DeltaRenderer, ColorGridRenderer
+from pipeline import run_pipeline
+from terminal import ansi_color_rows, play_video
+from asciivideo import AsciiVideoWriter, CONTAINER_EXTENSION, COMPRESSIONS
+from animation import AnimationWriter, ANIMATION_EXTENSIONS, color_palette, union_box
+from profiler import profiler
+from live import run_live_source
+from shards import ShardCapture, SegmentWriter, SHARD_COMMANDS, run_command
+from rawpipe import add_pipe_args, pipe_io
+from strips import grid_ink_box
 
 def get_args():
     parser = argparse.ArgumentParser("Image to ASCII")
-    parser.add_argument("--input", type=str, default="data/input.mp4", help="Path to input video")
-    parser.add_argument("--output", type=str, default="data/output.mp4", help="Path to output video")
+    parser.add_argument("--input", type=str, default="data/input.mp4",
+                        help="Path to input video (- reads Y4M/rawvideo frames from stdin)")
+    parser.add_argument("--output", type=str, default="data/output.mp4",
+                        help="Path to output video (.asv writes the compact ASCII video container, "
+                             ".gif/.webp an animation storing only the changed region of each frame, "
+                             "- writes Y4M/rawvideo frames to stdout)")
     parser.add_argument("--mode", type=str, default="complex", choices=["simple", "complex"],
                         help="10 or 70 different characters")
     parser.add_argument("--background", type=str, default="black", choices=["black", "white"],
@@ -15,6 +32,40 @@ def get_args():
     parser.add_argument("--scale", type=int, default=1, help="upsize output")
     parser.add_argument("--fps", type=int, default=0, help="frame per second")
     parser.add_argument("--overlay_ratio", type=float, default=0.2, help="Overlay width ratio")
+    parser.add_argument("--renderer", type=str, default="atlas", choices=["atlas", "pil"],
+                        help="Glyph atlas compositing or per-character PIL text drawing")
+    parser.add_argument("--gamma", type=float, default=1.0, help="Gamma curve applied to cell brightness")
+    parser.add_argument("--contrast", type=float, default=1.0, help="Contrast stretch around mid-gray")
+    parser.add_argument("--dither", action="store_true", help="Ordered dithering between neighbouring characters")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only redraw cells that changed since the previous frame (atlas renderer)")
+    parser.add_argument("--delta_threshold", type=int, default=0,
+                        help="Largest per-channel color change a cell may drift before it is redrawn")
+    parser.add_argument("--compression", type=str, default="zlib", choices=COMPRESSIONS,
+                        help="Per-frame compression of the .asv container")
+    parser.add_argument("--play", action="store_true",
+                        help="Play the ASCII video in the terminal with 24-bit color instead of writing the output file")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes for pipelined conversion (0 converts frames in this process)")
+    parser.add_argument("--profile", type=str, nargs="?", const="profile.json", default=None,
+                        help="Report per-stage timings, frame latency percentiles and peak RSS, and write them to this JSON file")
+    parser.add_argument("--trace", type=str, default=None, help="Also write a Chrome trace-event file (with --profile)")
+    parser.add_argument("--shard", type=str, default=None, choices=SHARD_COMMANDS,
+                        help="Sharded conversion: plan frame ranges, run shards, merge segments, or all three locally")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Shard manifest (default: the output path followed by .shards.json)")
+    parser.add_argument("--shards", type=int, default=4, help="Number of frame ranges to plan")
+    parser.add_argument("--shard_index", type=int, nargs="+", default=None,
+                        help="Shards to run (default: every shard that is not done)")
+    parser.add_argument("--retries", type=int, default=1, help="Times failed shards are run again in local mode")
+    parser.add_argument("--live", action="store_true",
+                        help="Low-latency mode for a device index, pipe, stream or 'synthetic[:WxH]' input: "
+                             "num_cols adapts to keep every frame within the --fps budget")
+    parser.add_argument("--min_cols", type=int, default=20, help="Smallest num_cols the live controller may use")
+    parser.add_argument("--max_frames", type=int, default=0, help="Stop live mode after this many frames (0 = no limit)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop live mode after this many seconds (0 = no limit)")
+    parser.add_argument("--metrics", type=str, default=None, help="Write the live controller metrics to this JSON file")
+    add_pipe_args(parser)
     args = parser.parse_args()
     return args
 
@@ -35,75 +86,356 @@ def calculate_fps(cap, fps_input):
         return int(cap.get(cv2.CAP_PROP_FPS))
     return fps_input
 
-def process_frame(frame, num_cols, char_list, font, bg_color):
-    height, width, _ = frame.shape
+def calculate_grid(frame_shape, num_cols, verbose=True):
+    height, width = frame_shape[:2]
     cell_width = width / num_cols
     cell_height = 2 * cell_width
     num_rows = int(height / cell_height)
 
     if num_cols > width or num_rows > height:
-        print("Too many columns or rows. Using default settings.")
+        if verbose:
+            print("Too many columns or rows. Using default settings.")
         cell_width = 6
         cell_height = 12
         num_cols = int(width / cell_width)
         num_rows = int(height / cell_height)
+    return cell_width, cell_height, num_cols, num_rows
+
+def max_frame_shape(frame_shape, font, num_cols):
+    _, _, num_cols, num_rows = calculate_grid(frame_shape, num_cols, verbose=False)
+    char_width, char_height = font.getsize("A")
+    return 2 * char_height * num_rows, char_width * num_cols, 3
+
+def compute_cells(frame, num_cols, char_list, lut=None, dither=False, verbose=True):
+    cell_width, cell_height, num_cols, num_rows = calculate_grid(frame.shape, num_cols, verbose)
+    if lut is None:
+        lut = build_char_lut(len(char_list))
+    with profiler.stage("cell_average"):
+        sums, counts = cell_sums(frame, num_rows, num_cols, cell_width, cell_height)
+        avg_colors = (sums / (cell_height * cell_width)).astype(np.int32)
+    with profiler.stage("char_map"):
+        char_indices = map_brightness(sums.sum(axis=2) / (counts * 3), lut, dither)
+    return char_indices, avg_colors
+
+def process_frame(frame, num_cols, char_list, font, bg_color, atlas=None, lut=None, dither=False, verbose=True):
+    char_indices, avg_colors = compute_cells(frame, num_cols, char_list, lut, dither, verbose)
+    num_rows, num_cols = char_indices.shape
 
     char_width, char_height = font.getsize("A")
     out_width = char_width * num_cols
     out_height = 2 * char_height * num_rows
-    out_image = Image.new("RGB", (out_width, out_height), bg_color)
-    draw = ImageDraw.Draw(out_image)
-
-    num_chars = len(char_list)
-    for i in range(num_rows):
-        for j in range(num_cols):
-            partial_image = frame[int(i * cell_height):min(int((i + 1) * cell_height), height),
-                                  int(j * cell_width):min(int((j + 1) * cell_width), width), :]
-            partial_avg_color = np.sum(np.sum(partial_image, axis=0), axis=0) / (cell_height * cell_width)
-            partial_avg_color = tuple(partial_avg_color.astype(np.int32).tolist())
-            char = char_list[min(int(np.mean(partial_image) * num_chars / 255), num_chars - 1)]
-            draw.text((j * char_width, i * char_height), char, fill=partial_avg_color, font=font)
+
+    with profiler.stage("draw"):
+        if atlas is not None:
+            return atlas.render_color(char_indices, avg_colors, bg_color, (out_width, out_height))
+
+        out_image = Image.new("RGB", (out_width, out_height), bg_color)
+        draw = ImageDraw.Draw(out_image)
+        for i in range(num_rows):
+            for j in range(num_cols):
+                draw.text((j * char_width, i * char_height), char_list[char_indices[i, j]],
+                          fill=tuple(avg_colors[i, j].tolist()), font=font)
 
     return out_image
 
-def main():
-    opt = get_args()
-    char_list = get_char_list(opt.mode)
-    bg_color = get_background_color(opt.background)
-    font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=int(10 * opt.scale))
-    cap = cv2.VideoCapture(opt.input)
-    fps = calculate_fps(cap, opt.fps)
+def frame_to_ansi(frame, num_cols, char_list, lut=None, dither=False):
+    # 终端播放：每个字符带上所在单元格的 24 位前景色，帧是 BGR 顺序
+    char_indices, avg_colors = compute_cells(frame, num_cols, char_list, lut, dither, verbose=False)
+    chars = np.array(list(char_list))[char_indices]
+    return "\n".join(ansi_color_rows(chars, np.clip(avg_colors[:, :, ::-1], 0, 255)))
 
-    out = None
+# 固定尺寸视频流的逐帧转换：网格、单元格求和的角点下标、裁剪框和叠加位置在第一帧时算好，
+# 之后每帧都写入同一组预先分配的缓冲区，稳定状态下几乎不再分配内存。返回的帧在下一次调用时被覆盖
+class FrameProcessor:
+    def __init__(self, num_cols, char_list, font, bg_color, background, overlay_ratio, atlas=None, lut=None,
+                 dither=False):
+        self.num_cols, self.char_list, self.font = num_cols, char_list, font
+        self.bg_color, self.background, self.overlay_ratio = bg_color, background, overlay_ratio
+        self.atlas, self.dither = atlas, dither
+        self.lut = build_char_lut(len(char_list)) if lut is None else lut
+        self.shape = None
+        # 网格回退提示只打印一次；PIL 渲染时求裁剪框用的图集也只建一次
+        self.verbose = True
+        self.ink_atlas = None
+
+    def prepare(self, frame_shape):
+        height, width = frame_shape[:2]
+        cell_width, cell_height, num_cols, num_rows = calculate_grid(frame_shape, self.num_cols, self.verbose)
+        self.verbose = False
+        # 积分图用 int32 累加，像素太多可能溢出时改用 float64（整数求和同样精确）
+        if height * width * 255 < 2 ** 31:
+            self.depth, dtype = cv2.CV_32S, np.int32
+        else:
+            self.depth, dtype = cv2.CV_64F, np.float64
+        self.table = np.empty((height + 1, width + 1, 3), dtype=dtype)
+        row_bounds = cell_bounds(height, cell_height, num_rows)
+        col_bounds = cell_bounds(width, cell_width, num_cols)
+        # 四个角各自取到一个连续数组中，相减时 numpy 不需要为跨步的操作数分配缓冲区
+        corner_index = row_bounds[:, None] * (width + 1) + col_bounds[None, :]
+        self.corner_index = [np.ascontiguousarray(corner_index[rows, cols])
+                             for rows, cols in ((slice(1, None), slice(1, None)), (slice(None, -1), slice(1, None)),
+                                                (slice(1, None), slice(None, -1)), (slice(None, -1), slice(None, -1)))]
+        self.corners = [np.empty((num_rows, num_cols, 3), dtype=dtype) for _ in range(4)]
+        self.sums = np.empty((num_rows, num_cols, 3), dtype=dtype)
+        self.area = cell_height * cell_width
+        self.counts = np.outer(np.diff(row_bounds), np.diff(col_bounds)) * 3.0
+        self.sums_float = np.empty((num_rows, num_cols, 3))
+        self.averages = np.empty((num_rows, num_cols, 3))
+        self.colors_int = np.empty((num_rows, num_cols, 3), dtype=np.int32)
+        self.colors = np.empty((num_rows, num_cols, 3), dtype=np.uint8)
+        self.brightness = np.empty((num_rows, num_cols))
+        # 下标直接用 intp，np.take 不必再转换一次
+        self.levels = np.empty((num_rows, num_cols), dtype=np.intp)
+        self.lut_index = self.lut.astype(np.intp)
+        self.char_indices = np.empty((num_rows, num_cols), dtype=np.intp)
+        self.threshold = None
+        if self.dither:
+            step = 256 / len(np.unique(self.lut))
+            self.threshold = np.tile(BAYER_MATRIX, (num_rows // 4 + 1, num_cols // 4 + 1))[:num_rows, :num_cols] * step
+
+        # 裁剪框只取决于网格（所有字形可能覆盖的范围），每帧尺寸相同，VideoWriter 不会丢帧
+        char_width, char_height = self.font.getsize("A")
+        self.size = size = (char_width * num_cols, 2 * char_height * num_rows)
+        atlas = self.atlas.atlas if isinstance(self.atlas, DeltaRenderer) else self.atlas
+        self.renderer = None
+        offset_y = offset_x = 0
+        if isinstance(self.atlas, GlyphAtlas):
+            self.renderer = ColorGridRenderer(self.atlas, (num_rows, num_cols), self.bg_color, size)
+            offset_y, offset_x = self.renderer.offset
+        if atlas is None and self.ink_atlas is None:
+            self.ink_atlas = GlyphAtlas(self.char_list, self.font, "A")
+        left, top, right, bottom = grid_ink_box(atlas or self.ink_atlas, (num_rows, num_cols), size)
+        self.crop = (slice(offset_y + top, offset_y + bottom), slice(offset_x + left, offset_x + right))
+        self.out = np.empty((bottom - top, right - left, 3), dtype=np.uint8)
+        if self.overlay_ratio:
+            out_height, out_width = self.out.shape[:2]
+            overlay_width, overlay_height = int(out_width * self.overlay_ratio), int(out_height * self.overlay_ratio)
+            self.overlay = np.empty((overlay_height, overlay_width, 3), dtype=np.uint8)
+            self.overlay_region = self.out[out_height - overlay_height:, out_width - overlay_width:]
+        self.shape = frame_shape
+
+    def compute_cells(self, frame):
+        # 与 compute_cells 相同的结果：积分图四角相减得到单元格和，所有运算都写入预分配的数组；
+        # 单元格和先精确地转成 float64，避免 ufunc 混合类型运算时分配类型转换缓冲区
+        with profiler.stage("cell_average"):
+            cv2.integral(frame, sum=self.table, sdepth=self.depth)
+            table = self.table.reshape(-1, 3)
+            for corner, index in zip(self.corners, self.corner_index):
+                np.take(table, index, axis=0, out=corner, mode="clip")
+            np.subtract(self.corners[0], self.corners[1], out=self.sums)
+            np.subtract(self.sums, self.corners[2], out=self.sums)
+            np.add(self.sums, self.corners[3], out=self.sums)
+            np.copyto(self.sums_float, self.sums)
+            np.divide(self.sums_float, self.area, out=self.averages)
+            np.copyto(self.colors_int, self.averages, casting="unsafe")
+            np.clip(self.colors_int, 0, 255, out=self.colors_int)
+            np.copyto(self.colors, self.colors_int, casting="unsafe")
+        with profiler.stage("char_map"):
+            np.sum(self.sums_float, axis=2, out=self.brightness)
+            np.divide(self.brightness, self.counts, out=self.brightness)
+            if self.threshold is not None:
+                np.add(self.brightness, self.threshold, out=self.brightness)
+            np.clip(self.brightness, 0, 255, out=self.brightness)
+            np.copyto(self.levels, self.brightness, casting="unsafe")
+            np.take(self.lut_index, self.levels, out=self.char_indices, mode="clip")
+
+    def __call__(self, frame, num_cols=None):
+        # 实时模式每帧可能换一个列数，只有列数或帧尺寸变化时才重新分配缓冲区
+        if num_cols is not None and num_cols != self.num_cols:
+            self.num_cols = num_cols
+            self.shape = None
+        if frame.shape != self.shape:
+            self.prepare(frame.shape)
+        if self.renderer is not None:
+            self.compute_cells(frame)
+            with profiler.stage("draw"):
+                canvas = self.renderer.render(self.char_indices, self.colors)
+        elif isinstance(self.atlas, DeltaRenderer):
+            # 增量渲染只重绘变化的单元格，但仍然每帧生成新图像
+            self.compute_cells(frame)
+            with profiler.stage("draw"):
+                canvas = np.asarray(self.atlas.render_color(self.char_indices, self.colors, self.bg_color, self.size))
+        else:
+            # PIL 逐字绘制仍然每帧生成新图像，只复用裁剪和叠加
+            canvas = np.asarray(process_frame(frame, self.num_cols, self.char_list, self.font, self.bg_color,
+                                              self.atlas, self.lut, self.dither, verbose=False))
+        with profiler.stage("crop"):
+            np.copyto(self.out, canvas[self.crop])
+        if self.overlay_ratio:
+            with profiler.stage("overlay"):
+                cv2.resize(frame, (self.overlay.shape[1], self.overlay.shape[0]), dst=self.overlay)
+                np.copyto(self.overlay_region, self.overlay)
+        return self.out
+
+# 转换单帧；连续转换同尺寸的帧时用 FrameProcessor 复用缓冲区
+def convert_frame(frame, num_cols, char_list, font, bg_color, background, overlay_ratio, atlas=None, lut=None,
+                  dither=False):
+    return FrameProcessor(num_cols, char_list, font, bg_color, background, overlay_ratio, atlas, lut, dither)(frame)
+
+def save_container(cap, output_path, num_cols, char_list, font, background, fps, lut=None, dither=False,
+                   compression="zlib"):
+    # 只保存每帧的字符索引和单元格颜色（BGR），不渲染像素，返回保存的帧数
+    writer = None
+    frames = 0
     while cap.isOpened():
         flag, frame = cap.read()
         if not flag:
             break
+        char_indices, avg_colors = compute_cells(frame, num_cols, char_list, lut, dither, verbose=writer is None)
+        if writer is None:
+            writer = AsciiVideoWriter(output_path, char_list, char_indices.shape[0], char_indices.shape[1], fps,
+                                      color=True, compression=compression, font=font.path, font_size=font.size,
+                                      background=background, color_order="BGR")
+        writer.write(char_indices, avg_colors)
+        frames += 1
+    if writer:
+        writer.close()
+    return frames
 
-        out_image = process_frame(frame, opt.num_cols, char_list, font, bg_color)
+def save_animation(cap, output_path, num_cols, char_list, font, bg_color, background, overlay_ratio, fps, atlas=None,
+                   lut=None, dither=False):
+    # 写出 GIF/WebP 动画：增量渲染，每帧只保存字符或颜色变化的单元格所在的区域（加上叠加的原始帧），
+    # 颜色用固定调色板量化，返回写出的帧数
+    if not isinstance(atlas, DeltaRenderer):
+        atlas = DeltaRenderer(atlas or GlyphAtlas(char_list, font, "A"))
+    processor = FrameProcessor(num_cols, char_list, font, bg_color, background, overlay_ratio, atlas, lut, dither)
+    # 帧是 BGR 顺序，调色板是 RGB 顺序
+    palette = color_palette(bg_color[::-1])
+    writer = None
+    frames = 0
+    while cap.isOpened():
+        with profiler.stage("read"):
+            flag, frame = cap.read()
+        if not flag:
+            break
+        with profiler.frame():
+            out_image = processor(frame)
+            height, width = out_image.shape[:2]
+            box = atlas.changed
+            if box is not None:
+                # 变化区域从渲染画布换算到裁剪后的输出帧
+                top, left = processor.crop[0].start, processor.crop[1].start
+                box = (max(box[0] - left, 0), max(box[1] - top, 0), min(box[2] - left, width), min(box[3] - top, height))
+                if box[0] >= box[2] or box[1] >= box[3]:
+                    box = None
+            if overlay_ratio:
+                overlay_height, overlay_width = processor.overlay.shape[:2]
+                box = union_box(box, (width - overlay_width, height - overlay_height, width, height))
+            if writer is None:
+                writer = AnimationWriter(output_path, (width, height), fps, palette)
+            with profiler.stage("write"):
+                writer.write(out_image, box)
+        frames += 1
+    if writer:
+        writer.close()
+    return frames
 
-        if opt.background == "white":
-            cropped_image = ImageOps.invert(out_image).getbbox()
-        else:
-            cropped_image = out_image.getbbox()
+def process_video(input_path, output_path, num_cols, char_list, font, bg_color, background, overlay_ratio, fps,
+                  atlas=None, lut=None, dither=False, workers=0, compression="zlib", frame_range=None, out=None,
+                  cap=None):
+    # frame_range 为 (起始帧, 结束帧) 时只转换这一段，out 替代默认的 XVID 写入器，
+    # cap 为已打开的读取器（如 rawpipe.PipeCapture）时不再打开 input_path；返回转换的帧数
+    if cap is None:
+        cap = cv2.VideoCapture(input_path)
+    fps = calculate_fps(cap, fps)
+    if frame_range is not None:
+        cap = ShardCapture(cap, *frame_range)
+    if os.path.splitext(output_path)[1] == CONTAINER_EXTENSION:
+        frames = save_container(cap, output_path, num_cols, char_list, font, background, fps, lut, dither,
+                                compression)
+        cap.release()
+        return frames
+    if os.path.splitext(output_path)[1].lower() in ANIMATION_EXTENSIONS:
+        # 只存变化区域需要上一帧，按顺序在本进程中转换
+        frames = save_animation(cap, output_path, num_cols, char_list, font, bg_color, background, overlay_ratio, fps,
+                                atlas, lut, dither)
+        cap.release()
+        return frames
 
-        out_image = out_image.crop(cropped_image)
-        out_image = np.array(out_image)
+    frames = 0
 
+    def write(out_image):
+        nonlocal out
         if out is None:
-            out = cv2.VideoWriter(opt.output, cv2.VideoWriter_fourcc(*"XVID"), fps,
+            out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"XVID"), fps,
                                   (out_image.shape[1], out_image.shape[0]))
+        with profiler.stage("write"):
+            out.write(out_image)
 
-        if opt.overlay_ratio:
-            height, width, _ = out_image.shape
-            overlay = cv2.resize(frame, (int(width * opt.overlay_ratio), int(height * opt.overlay_ratio)))
-            out_image[height - int(height * opt.overlay_ratio):, width - int(width * opt.overlay_ratio):, :] = overlay
-
-        out.write(out_image)
+    # 每个 worker 进程各自得到一份 FrameProcessor，缓冲区在各自的第一帧时分配
+    processor = FrameProcessor(num_cols, char_list, font, bg_color, background, overlay_ratio, atlas, lut, dither)
+    if workers > 0:
+        frames = run_pipeline(cap, processor, (), lambda shape: max_frame_shape(shape, font, num_cols), write,
+                              workers)
+    else:
+        while cap.isOpened():
+            with profiler.stage("read"):
+                flag, frame = cap.read()
+            if not flag:
+                break
+            # 每帧延迟统计转换和写出两部分
+            with profiler.frame():
+                write(processor(frame))
+            frames += 1
 
     cap.release()
     if out:
         out.release()
+    return frames
+
+# 加载字符集、字体、背景颜色、字形图集和查找表
+def load_resources(opt):
+    char_list = get_char_list(opt.mode)
+    bg_color = get_background_color(opt.background)
+    font = ImageFont.truetype("fonts/DejaVuSansMono-Bold.ttf", size=int(10 * opt.scale))
+    atlas = GlyphAtlas(char_list, font, "A") if opt.renderer == "atlas" else None
+    if atlas is not None and opt.delta:
+        atlas = DeltaRenderer(atlas, opt.delta_threshold)
+    lut = build_char_lut(len(char_list), opt.gamma, opt.contrast)
+    return char_list, font, bg_color, atlas, lut
+
+# 把一个分片的帧转换成分段文件（见 shards.py），返回 (帧数, 每帧尺寸)
+def convert_shard(opt, segment_path, frame_range):
+    char_list, font, bg_color, atlas, lut = load_resources(opt)
+    out = None
+    if os.path.splitext(segment_path)[1] != CONTAINER_EXTENSION:
+        cap = cv2.VideoCapture(opt.input)
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        cap.release()
+        out = SegmentWriter(segment_path, opt.fps, max_frame_shape(frame_shape, font, opt.num_cols))
+    frames = process_video(opt.input, segment_path, opt.num_cols, char_list, font, bg_color, opt.background,
+                           opt.overlay_ratio, opt.fps, atlas, lut, opt.dither, opt.workers, opt.compression,
+                           frame_range, out)
+    return frames, out.sizes if out else None
+
+def main():
+    opt = get_args()
+    if opt.profile:
+        profiler.enable(opt.profile, opt.trace)
+    if opt.shard:
+        sys.exit(run_command(opt, os.path.abspath(__file__), convert_shard))
+    if opt.live:
+        # 实时模式：处理摄像头、管道或流的最新一帧，根据延迟预算自动调整列数
+        char_list, font, bg_color, atlas, lut = load_resources(opt)
+        processor = FrameProcessor(opt.num_cols, char_list, font, bg_color, opt.background, opt.overlay_ratio, atlas,
+                                   lut, opt.dither)
+        run_live_source(opt, lambda frame, num_cols: frame_to_ansi(frame, num_cols, char_list, lut, opt.dither),
+                        processor)
+        return
+    char_list = get_char_list(opt.mode)
+    if opt.play:
+        lut = build_char_lut(len(char_list), opt.gamma, opt.contrast)
+        play_video(opt.input, opt.fps, lambda frame: frame_to_ansi(frame, opt.num_cols, char_list, lut, opt.dither))
+        return
+    char_list, font, bg_color, atlas, lut = load_resources(opt)
+    # --input - / --output - 从标准输入读取、向标准输出写出 Y4M 或 rawvideo 帧
+    with pipe_io(opt, lambda shape: max_frame_shape(shape, font, opt.num_cols), bg_color) as (cap, out):
+        process_video(opt.input, opt.output, opt.num_cols, char_list, font, bg_color, opt.background,
+                      opt.overlay_ratio, opt.fps, atlas, lut, opt.dither, opt.workers, opt.compression, out=out,
+                      cap=cap)
+        # 多进程时每个 worker 各自保留上一帧，统计留在子进程中
+        if isinstance(atlas, DeltaRenderer) and not opt.workers:
+            print(atlas.summary())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()